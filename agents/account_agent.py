@@ -1,30 +1,52 @@
 from agents.base_agent import BaseAgent
+from utils.generative import get_generative_responder
+from utils.preprocessing import ProcessedMessage
 import logging
 import json
 import os
-from typing import Dict, Optional
+from typing import Dict, Optional, Union
 
 logger = logging.getLogger(__name__)
 
+# Built-in answers; tenants can override them in account_templates.json
+DEFAULT_ANSWERS = {
+    "balance": "Your current account balance is ₹1,250.00.",
+    "email": "Your registered email is user@example.com.",
+    "password_help": "To reset your password, click 'Forgot Password' on the login page and follow the instructions.",
+    "update": "You can update your account details from your profile settings.",
+    "generic": "I can help you with balance, email, password reset, or updating your account. Please tell me what you want to do."
+}
+
 class AccountAgent(BaseAgent):
     def __init__(self):
         super().__init__(name="Account Agent")
 
-    async def process(self, message: str, **kwargs) -> str:
+    async def process(self, message: Union[str, ProcessedMessage], **kwargs) -> str:
         """
-        Return mock responses for account-related queries.
+        Return mock responses for account-related queries, or a generated
+        answer when generative responses are enabled. A ``tenant`` with its
+        own account templates is answered from those.
         """
-        message = message.lower()
-        if "balance" in message:
-            return "Your current account balance is ₹1,250.00."
-        elif "email" in message:
-            return "Your registered email is user@example.com."
-        elif "reset password" in message or "change password" in message or "password" in message:
-            return "To reset your password, click 'Forgot Password' on the login page and follow the instructions."
-        elif "update" in message or "change" in message:
-            return "You can update your account details from your profile settings."
+        message = ProcessedMessage.of(message)
+        tenant = kwargs.get("tenant")
+        templates = (tenant.account_templates if tenant is not None else None) or {}
+        if self.responder and not templates:
+            answer = await self.responder.respond(message.text, kwargs.get("intent", "account"), "account")
+            if answer:
+                return answer
+        
+        folded = message.folded
+        if "balance" in folded:
+            key = "balance"
+        elif "email" in folded:
+            key = "email"
+        elif "password" in folded:
+            key = "password_help"
+        elif "update" in folded or "change" in folded:
+            key = "update"
         else:
-            return "I can help you with balance, email, password reset, or updating your account. Please tell me what you want to do."
+            key = "generic"
+        return templates.get(key) or DEFAULT_ANSWERS[key]
     
     def __init__(self):
         super().__init__(name="Account Agent")
@@ -33,6 +55,9 @@ class AccountAgent(BaseAgent):
         self.accounts = self._load_mock_accounts()
         self.response_templates = self._load_templates()
         
+        # Optional LLM-generated answers
+        self.responder = get_generative_responder()
+        
     def _load_mock_accounts(self) -> Dict[str, Dict]:
         """Load mock account data from file if available, otherwise use defaults"""
         try:
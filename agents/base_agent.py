@@ -1,4 +1,6 @@
 from abc import ABC, abstractmethod
+from typing import Union
+from utils.preprocessing import ProcessedMessage, text_of
 import logging
 
 logger = logging.getLogger(__name__)
@@ -8,7 +10,9 @@ class BaseAgent(ABC):
     Base class for all agents in the system.
     
     All specialized agents should inherit from this class
-    and implement the required abstract methods.
+    and implement the required abstract methods. Messages are passed
+    as a ``ProcessedMessage`` (raw strings are still accepted), so agents
+    read its folded text and tokens instead of recomputing them.
     """
     
     def __init__(self, name: str = "Base Agent"):
@@ -16,12 +20,12 @@ class BaseAgent(ABC):
         logger.info(f"Initialized {self.name}")
     
     @abstractmethod
-    async def process(self, message: str, **kwargs):
+    async def process(self, message: Union[str, ProcessedMessage], **kwargs):
         """
         Process the incoming message and return a response.
         
         Args:
-            message: The user's message
+            message: The user's message, raw or preprocessed
             **kwargs: Additional parameters specific to the agent
             
         Returns:
@@ -29,8 +33,9 @@ class BaseAgent(ABC):
         """
         pass
     
-    def _log_processing(self, message: str, context: dict = None):
+    def _log_processing(self, message: Union[str, ProcessedMessage], context: dict = None):
         """Log the processing of a message with context"""
+        message = text_of(message)
         if context:
             logger.info(f"{self.name} processing message: '{message}' with context: {context}")
         else:
@@ -1,8 +1,10 @@
 from agents.base_agent import BaseAgent
+from utils.generative import get_generative_responder
+from utils.preprocessing import ProcessedMessage
 import logging
 import json
 import os
-from typing import Dict
+from typing import Dict, Union
 
 logger = logging.getLogger(__name__)
 
@@ -17,6 +19,9 @@ class FAQAgent(BaseAgent):
         # Load FAQ data from file or use default
         self.faqs = self._load_faqs()
         
+        # Optional LLM-generated answers grounded in the FAQ data
+        self.responder = get_generative_responder()
+        
     def _load_faqs(self) -> Dict[str, str]:
         """Load FAQ data from file if available, otherwise use defaults"""
         try:
@@ -42,13 +47,26 @@ class FAQAgent(BaseAgent):
             "default": "I understand you have a question. Could you please provide more details?"
         }
 
-    async def process(self, message: str, **kwargs) -> str:
+    async def process(self, message: Union[str, ProcessedMessage], **kwargs) -> str:
         """
         Match keywords from message to known FAQs and return the answer.
+        
+        When generative responses are enabled, questions get a generated
+        answer grounded in the FAQs; greetings and farewells stay static.
+        A ``tenant`` with its own FAQs is answered from those only (the
+        generated answers are grounded in the global FAQs).
         """
-        message = message.lower()
-        for keyword, answer in self.faqs.items():
-            if keyword in message:
+        message = ProcessedMessage.of(message)
+        intent = kwargs.get("intent", "faq")
+        tenant = kwargs.get("tenant")
+        faqs = tenant.faqs if tenant is not None and tenant.faqs is not None else self.faqs
+        if self.responder and faqs is self.faqs and intent not in ("greeting", "farewell"):
+            answer = await self.responder.respond(message.text, intent, "faq")
+            if answer:
+                return answer
+        
+        for keyword, answer in faqs.items():
+            if keyword in message.folded:
                 return answer
-        return self.faqs.get("default", "Sorry, I couldn't find an answer for that.")
+        return faqs.get("default", "Sorry, I couldn't find an answer for that.")
 
@@ -1,23 +1,23 @@
 from agents.base_agent import BaseAgent
+from classifiers import CascadeClassifier, LLMIntentClassifier, RuleIntentClassifier, create_backend
+from utils.llm_gateway import get_llm_gateway
+from utils.preprocessing import ProcessedMessage
+from utils.tenants import TenantBundle
 import re
 import logging
 import json
 import os
-from typing import Dict, List, Pattern
+from typing import Dict, List, Optional, Pattern, Union
 from dotenv import load_dotenv
 
-# Try to import OpenAI for optional AI-powered classification
-try:
-    from openai import AsyncOpenAI
-    OPENAI_AVAILABLE = True
-except ImportError:
-    OPENAI_AVAILABLE = False
-
 # Load environment variables
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+# Broad intents that are not answered separately when a message has several
+NON_SPECIFIC_INTENTS = ("greeting", "farewell", "help", "faq", "other")
+
 class IntentClassifierAgent(BaseAgent):
     """
     Agent responsible for classifying the intent of user messages.
@@ -29,11 +29,10 @@ class IntentClassifierAgent(BaseAgent):
     def __init__(self):
         super().__init__(name="Intent Classifier Agent")
         
-        # Initialize OpenAI client if API key is available
-        self.openai_client = None
-        if OPENAI_AVAILABLE and os.getenv("OPENAI_API_KEY"):
-            self.openai_client = AsyncOpenAI()
-            logger.info("OpenAI client initialized for intent classification")
+        # Shared OpenAI gateway (None if no API key is configured)
+        self.llm_gateway = get_llm_gateway()
+        if self.llm_gateway:
+            logger.info("Using the LLM gateway for intent classification")
         
         # Define comprehensive intent patterns for rule-based classification
         self.intent_patterns: Dict[str, List[Pattern]] = {
@@ -100,35 +99,121 @@ class IntentClassifierAgent(BaseAgent):
                 re.compile(r"\?$")
             ]
         }
+        
+        self.rule_backend = RuleIntentClassifier(self.intent_patterns)
+        self.llm_backend = LLMIntentClassifier(self.llm_gateway, self.intent_patterns) if self.llm_gateway else None
+        self.cascade = self._build_cascade()
+    
+    def _build_cascade(self) -> CascadeClassifier:
+        """
+        Build the classifier cascade: rules, then the optional local model,
+        then the LLM. Each stage answers when its confidence reaches the
+        stage threshold; only ambiguous messages reach the LLM.
+        """
+        stages = [(self.rule_backend, float(os.getenv("CASCADE_RULE_THRESHOLD", "0.95")))]
+        
+        # Optional pluggable backend (e.g. "local" for the on-CPU model)
+        backend_name = os.getenv("INTENT_CLASSIFIER_BACKEND", "auto").lower()
+        if backend_name == "auto":
+            model_path = os.getenv("LOCAL_INTENT_MODEL", "data/intent_model.bin")
+            backend_name = "local" if os.path.exists(model_path) else "none"
+        if backend_name != "none":
+            try:
+                stages.append((create_backend(backend_name), float(os.getenv("CASCADE_LOCAL_THRESHOLD", "0.85"))))
+                logger.info(f"Using '{backend_name}' intent classifier backend")
+            except Exception as e:
+                logger.warning(f"Could not initialize '{backend_name}' classifier backend: {str(e)}. Skipping it.")
+        
+        if self.llm_backend:
+            stages.append((self.llm_backend, float(os.getenv("CASCADE_LLM_THRESHOLD", "0.5"))))
+        
+        return CascadeClassifier(stages)
+    
+    def _merged_patterns(self, tenant_patterns: Dict[str, List[Pattern]]) -> Dict[str, List[Pattern]]:
+        """
+        Global patterns with a tenant's rules replacing those of the same
+        intent; intents only the tenant defines are tried before the
+        catch-all "faq" rules.
+        """
+        added = {intent: patterns for intent, patterns in tenant_patterns.items() if intent not in self.intent_patterns}
+        merged = {}
+        for intent, patterns in self.intent_patterns.items():
+            if intent == "faq":
+                merged.update(added)
+            merged[intent] = tenant_patterns.get(intent, patterns)
+        merged.update(added)
+        return merged
+    
+    def _rules_for(self, tenant: Optional[TenantBundle]) -> RuleIntentClassifier:
+        """The rule backend for a tenant (the global one unless it defines rules)"""
+        if tenant is None or tenant.intent_patterns is None:
+            return self.rule_backend
+        return tenant.derive("rule_classifier", lambda bundle: RuleIntentClassifier(self._merged_patterns(bundle.intent_patterns)))
+    
+    def _cascade_for(self, tenant: Optional[TenantBundle]) -> CascadeClassifier:
+        """The cascade for a tenant: its rules, then the shared model and LLM stages"""
+        if tenant is None or tenant.intent_patterns is None:
+            return self.cascade
+        return tenant.derive("cascade", lambda bundle: CascadeClassifier(
+            [(self._rules_for(bundle), self.cascade.stages[0][1])] + self.cascade.stages[1:]
+        ))
 
-    async def process(self, message: str, **kwargs):
+    async def process(self, message: Union[str, ProcessedMessage], **kwargs):
         """
         Classify the intent of the user's message.
         
         Args:
             message: The user's message
+            **kwargs: ``tenant``, the tenant's ``TenantBundle``
             
         Returns:
             str: The classified intent
         """
         self._log_processing(message)
         
-        # Try AI classification if available
-        if self.openai_client:
-            try:
-                ai_intent = await self._classify_with_ai(message)
-                if ai_intent:
-                    logger.info(f"AI classified intent as: {ai_intent}")
-                    return ai_intent
-            except Exception as e:
-                logger.warning(f"Error using AI classification: {str(e)}. Falling back to rule-based.")
+        result = await self._cascade_for(kwargs.get("tenant")).classify(ProcessedMessage.of(message))
+        logger.info(f"Classified intent as: {result.intent} (by {result.backend}, confidence {result.confidence:.2f})")
+        return result.intent
+    
+    async def classify_multi(self, message: Union[str, ProcessedMessage], max_intents: int = None, tenant: Optional[TenantBundle] = None) -> List[str]:
+        """
+        Classify every intent present in a multi-topic message.
+        
+        The primary intent comes from the cascade; any other specific
+        intents matched by the rules (e.g. "order" and "account" in "my
+        order is broken and I can't log in") follow it.
+        
+        Args:
+            message: The user's message
+            max_intents: Maximum number of intents to return
+            tenant: The tenant whose rules apply
+            
+        Returns:
+            List[str]: The primary intent first, then secondary intents
+        """
+        max_intents = max_intents or int(os.getenv("MULTI_INTENT_MAX", "3"))
+        # The rule matches computed by the cascade are reused below
+        message = ProcessedMessage.of(message)
+        intents = [await self.process(message, tenant=tenant)]
+        for intent in self._rules_for(tenant).matches(message):
+            if len(intents) >= max_intents:
+                break
+            if intent not in intents and intent not in NON_SPECIFIC_INTENTS:
+                intents.append(intent)
+        
+        # A broad primary intent adds nothing next to specific ones
+        if len(intents) > 1 and intents[0] in NON_SPECIFIC_INTENTS:
+            intents = intents[1:]
         
-        # Fall back to rule-based classification
-        intent = self._classify_with_rules(message)
-        logger.info(f"Rule-based classified intent as: {intent}")
-        return intent
+        if len(intents) > 1:
+            logger.info(f"Message has multiple intents: {intents}")
+        return intents
+    
+    def cascade_stats(self) -> dict:
+        """Per-stage hit rates and latencies of the classifier cascade"""
+        return self.cascade.stats()
     
-    async def _classify_with_ai(self, message: str) -> str:
+    async def _classify_with_ai(self, message: Union[str, ProcessedMessage]) -> str:
         """
         Classify intent using OpenAI's API
         
@@ -138,58 +223,23 @@ class IntentClassifierAgent(BaseAgent):
         Returns:
             str: The classified intent or None if classification failed
         """
-        try:
-            response = await self.openai_client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": """
-                    You are an intent classifier for a customer support system.
-                    Classify the user message into exactly one of these categories:
-                    - greeting: General greetings
-                    - farewell: Saying goodbye
-                    - help: Asking for general help
-                    - account: Questions about user accounts, login, passwords
-                    - order: Order-related inquiries
-                    - product: Product-related inquiries
-                    - complaint: Customer complaints about products/service
-                    - urgent: Urgent issues requiring immediate attention
-                    - faq: General questions
-                    - other: None of the above
-                    
-                    Respond with ONLY the category name, nothing else.
-                    """},
-                    {"role": "user", "content": message}
-                ],
-                temperature=0.1
-            )
-            
-            intent = response.choices[0].message.content.strip().lower()
-            
-            # Validate the intent is one we recognize
-            if intent in self.intent_patterns or intent == "other":
-                return intent
-            
-            logger.warning(f"AI returned unrecognized intent: {intent}")
-            return None
-            
-        except Exception as e:
-            logger.error(f"Error in AI intent classification: {str(e)}")
+        if not self.llm_backend:
             return None
+        result = await self.llm_backend.classify(message)
+        return result.intent if result.confidence > 0 else None
     
-    def _classify_with_rules(self, message: str) -> str:
+    def _classify_with_rules(self, message: Union[str, ProcessedMessage], tenant: Optional[TenantBundle] = None) -> str:
         """
         Classify intent using rule-based approach with regex patterns
         
         Args:
             message: The user's message
+            tenant: The tenant whose rules apply
             
         Returns:
             str: The classified intent
         """
-        for intent, patterns in self.intent_patterns.items():
-            for pattern in patterns:
-                if pattern.search(message):
-                    return intent
+        matches = self._rules_for(tenant).matches(message)
         
         # Default intent if no patterns match
-        return "other"
+        return matches[0] if matches else "other"
@@ -1,7 +1,9 @@
 from agents.base_agent import BaseAgent
+from utils.notification_digest import NotificationCoalescer
 import logging
 import asyncio
-from typing import Dict, Any, Optional
+from collections import deque
+from typing import Dict, Any, Optional, Callable, List
 import os
 from datetime import datetime
 
@@ -12,18 +14,29 @@ class NotifyAgent(BaseAgent):
     Agent that handles notifications via various channels (email, SMS, etc.)
     
     For this demonstration, notifications are just logged rather than actually sent.
+    Non-urgent notifications are coalesced into per-recipient digests
+    (see ``NOTIFY_COALESCE_WINDOW``).
     """
     
     def __init__(self):
         super().__init__(name="Notify Agent")
         
-        # Track sent notifications
-        self.notifications = []
+        # Track recent notifications (bounded, so a long-running worker does not grow)
+        self.notifications = deque(maxlen=int(os.getenv("NOTIFY_HISTORY_SIZE", "1000")))
+        
+        # Where notifications go when the caller names no recipient
+        self.default_recipient = os.getenv("NOTIFY_RECIPIENT", "support@example.com")
+        
+        # Callbacks receiving each notification (e.g. to push it to dashboards)
+        self.listeners: List[Callable[[Dict[str, Any]], None]] = []
         
         # Check for notification API credentials
         self.email_enabled = os.getenv("EMAIL_API_KEY") is not None
         self.sms_enabled = os.getenv("SMS_API_KEY") is not None
         
+        # Digest batching of sends (None when disabled)
+        self.coalescer = NotificationCoalescer.from_env(self._deliver)
+        
     async def process(self, message: str, **kwargs):
         """
         Process a notification request.
@@ -36,25 +49,30 @@ class NotifyAgent(BaseAgent):
             bool: Whether the notification was sent successfully
         """
         notification_type = kwargs.get("notification_type", "info")
-        recipient = kwargs.get("recipient", "support@example.com")
+        recipient = kwargs.get("recipient", self.default_recipient)
         
         self._log_processing(message, {"type": notification_type, "recipient": recipient})
         
         # Send the notification
         return await self.send_notification(message, recipient, notification_type)
     
-    async def send_notification(self, message: str, recipient: str = "support@example.com", notification_type: str = "info") -> bool:
+    async def send_notification(self, message: str, recipient: Optional[str] = None, notification_type: str = "info") -> bool:
         """
         Send a notification.
         
+        Listeners see every notification at once; the email/SMS send may be
+        held back and merged into a digest with others of the same type.
+        
         Args:
             message: The notification message
-            recipient: The recipient address/number
+            recipient: The recipient address/number (defaults to NOTIFY_RECIPIENT)
             notification_type: The type of notification
             
         Returns:
             bool: Whether the notification was sent successfully
         """
+        recipient = recipient or self.default_recipient
+        
         # Record the notification
         notification = {
             "timestamp": datetime.now().isoformat(),
@@ -65,11 +83,34 @@ class NotifyAgent(BaseAgent):
         
         self.notifications.append(notification)
         
+        for listener in self.listeners:
+            try:
+                listener(notification)
+            except Exception as e:
+                logger.error(f"Notification listener failed: {str(e)}")
+        
         # Log the notification (in a real system, this would actually send it)
         logger.info(f"NOTIFICATION [{notification_type.upper()}] To: {recipient} - {message}")
         
+        if self.coalescer:
+            await self.coalescer.submit(recipient, notification_type, message)
+            return True
+        return await self._deliver(recipient, notification_type, message)
+    
+    async def _deliver(self, recipient: str, notification_type: str, message: str) -> bool:
+        """
+        Send one message (a single notification or a digest) over the channels for its type.
+        
+        Args:
+            recipient: The recipient address/number
+            notification_type: The type of notification
+            message: The text to send
+            
+        Returns:
+            bool: Whether the message was sent successfully
+        """
         # Simulate different notification channels based on type
-        if notification_type in ["urgent", "high"]:
+        if notification_type in ["urgent", "high", "sla_breach"]:
             # Simulate SMS and email for urgent messages
             if self.sms_enabled:
                 await self._mock_send_sms(recipient, message)
@@ -91,6 +132,26 @@ class NotifyAgent(BaseAgent):
         
         return True
     
+    async def stop(self):
+        """Send any notifications still held for a digest"""
+        if self.coalescer:
+            await self.coalescer.stop()
+    
+    def digest_stats(self) -> Dict[str, Any]:
+        """Sends saved by digest batching"""
+        if not self.coalescer:
+            return {"enabled": False}
+        return {"enabled": True, **self.coalescer.stats()}
+    
+    def add_listener(self, listener: Callable[[Dict[str, Any]], None]):
+        """
+        Register a callback invoked with every notification sent.
+        
+        Args:
+            listener: Callable receiving the notification record
+        """
+        self.listeners.append(listener)
+    
     async def _mock_send_email(self, recipient: str, message: str, priority: str) -> bool:
         """Mock sending an email (for demonstration)"""
         # In a real implementation, this would use SendGrid, AWS SES, etc.
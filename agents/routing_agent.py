@@ -2,7 +2,10 @@ from agents.base_agent import BaseAgent
 from agents.faq_agent import FAQAgent
 from agents.ticket_agent import TicketAgent
 from agents.account_agent import AccountAgent
+from utils.admission import INTENT_PRIORITIES, DEFAULT_PRIORITY
+from utils.preprocessing import ProcessedMessage
 import logging
+from typing import List, Tuple, Union
 
 logger = logging.getLogger(__name__)
 
@@ -34,7 +37,7 @@ class RoutingAgent(BaseAgent):
             "other": self.faq_agent
         }
     
-    async def process(self, message: str, **kwargs):
+    async def process(self, message: Union[str, ProcessedMessage], **kwargs):
         """
         Process the message by determining which agent should handle it.
         
@@ -50,7 +53,7 @@ class RoutingAgent(BaseAgent):
         
         return await self.route(intent, message)
     
-    async def route(self, intent: str, message: str):
+    async def route(self, intent: str, message: Union[str, ProcessedMessage]):
         """
         Route the message to the appropriate agent based on intent.
         
@@ -67,3 +70,28 @@ class RoutingAgent(BaseAgent):
         logger.info(f"Routing message with intent '{intent}' to {target_agent.name}")
         
         return target_agent
+    
+    async def route_multi(self, intents: List[str], message: Union[str, ProcessedMessage]) -> List[Tuple[str, BaseAgent]]:
+        """
+        Route a multi-intent message to every agent it needs.
+        
+        Intents handled by the same agent are merged, keeping the most
+        important one (e.g. "complaint" over "order" for the ticket agent)
+        so each agent runs once.
+        
+        Args:
+            intents: The classified intents, primary first
+            message: The original message
+            
+        Returns:
+            List[Tuple[str, BaseAgent]]: (intent, agent) pairs in intent order
+        """
+        routes = {}
+        for intent in intents:
+            agent = self.routing_map.get(intent, self.faq_agent)
+            current = routes.get(agent.name)
+            if current is None or INTENT_PRIORITIES.get(intent, DEFAULT_PRIORITY) < INTENT_PRIORITIES.get(current[0], DEFAULT_PRIORITY):
+                routes[agent.name] = (intent, agent)
+        
+        logger.info(f"Routing message with intents {intents} to {[agent.name for _, agent in routes.values()]}")
+        return list(routes.values())
@@ -1,5 +1,9 @@
 from agents.base_agent import BaseAgent
+from utils.preprocessing import ProcessedMessage
+import asyncio
 import logging
+import os
+from typing import List, Tuple, Union
 
 logger = logging.getLogger(__name__)
 
@@ -12,7 +16,7 @@ class SupportAgent(BaseAgent):
     def __init__(self):
         super().__init__(name="Support Agent")
     
-    async def process(self, message: str, **kwargs):
+    async def process(self, message: Union[str, ProcessedMessage], **kwargs):
         """
         Process the message through the appropriate specialized agent.
         
@@ -30,7 +34,7 @@ class SupportAgent(BaseAgent):
         
         if agent:
             # Generate response from the specialized agent
-            response = await agent.process(message, intent=intent)
+            response = await agent.process(message, intent=intent, tenant=kwargs.get("tenant"))
             
             # Post-process the response if needed
             response = self._format_response(response, intent)
@@ -40,7 +44,7 @@ class SupportAgent(BaseAgent):
             # Fallback response if no agent is specified
             return "I'm not sure how to help with that. Could you try rephrasing your question?"
     
-    async def generate_response(self, agent, message: str, intent: str):
+    async def generate_response(self, agent, message: Union[str, ProcessedMessage], intent: str, tenant=None):
         """
         Generate a response using the specified agent.
         
@@ -48,20 +52,61 @@ class SupportAgent(BaseAgent):
             agent: The specialized agent to use
             message: The user's message
             intent: The classified intent
+            tenant: The tenant's ``TenantBundle`` (None for the global content)
             
         Returns:
             str: The agent's response
         """
-        response = await agent.process(message, intent=intent)
+        response = await agent.process(message, intent=intent, tenant=tenant)
         return self._format_response(response, intent)
     
-    def _format_response(self, response: str, intent: str) -> str:
+    async def generate_multi_response(self, routes: List[Tuple[str, BaseAgent]], message: Union[str, ProcessedMessage], deadline: float = None, tenant=None) -> str:
+        """
+        Run several agents concurrently and merge their answers.
+        
+        Agents that fail or miss the deadline are left out, so a slow agent
+        cannot hold back the others.
+        
+        Args:
+            routes: (intent, agent) pairs, primary intent first
+            message: The user's message
+            deadline: Seconds to wait for the agents
+            tenant: The tenant's ``TenantBundle`` (None for the global content)
+            
+        Returns:
+            str: The merged response
+        """
+        if len(routes) == 1:
+            agent_intent, agent = routes[0]
+            return await self.generate_response(agent, message, agent_intent, tenant)
+        
+        deadline = deadline or float(os.getenv("MULTI_AGENT_DEADLINE", "5.0"))
+        # Every agent shares one preprocessing of the message
+        message = ProcessedMessage.of(message)
+        results = await asyncio.gather(
+            *(asyncio.wait_for(agent.process(message, intent=agent_intent, tenant=tenant), deadline) for agent_intent, agent in routes),
+            return_exceptions=True
+        )
+        
+        parts = []
+        for (agent_intent, agent), result in zip(routes, results):
+            if isinstance(result, BaseException):
+                logger.warning(f"{agent.name} gave no answer for '{agent_intent}': {type(result).__name__} {str(result)}")
+                continue
+            parts.append(self._format_response(result, agent_intent, closing=False))
+        
+        if not parts:
+            return "I'm not sure how to help with that. Could you try rephrasing your question?"
+        return self._add_closing("\n\n".join(parts), routes[0][0])
+    
+    def _format_response(self, response: str, intent: str, closing: bool = True) -> str:
         """
         Format and enhance the response based on the intent.
         
         Args:
             response: The raw response from the specialized agent
             intent: The intent of the user's message
+            closing: Whether to add the closing line
             
         Returns:
             str: The formatted response
@@ -70,20 +115,24 @@ class SupportAgent(BaseAgent):
         if intent == "greeting":
             # No need to modify greeting responses
             return response
-            
+        
+        lowered = response.lower()
         if intent == "urgent":
             # Ensure urgent responses convey appropriate concern
-            if "urgent" not in response.lower() and "priority" not in response.lower():
+            if "urgent" not in lowered and "priority" not in lowered:
                 return "I understand this is urgent. " + response
         
         if intent == "complaint":
             # Add empathy to complaint responses
-            if "sorry" not in response.lower() and "apologize" not in response.lower():
+            if "sorry" not in lowered and "apologize" not in lowered:
                 return "I'm sorry to hear about your experience. " + response
         
-        # Add a closing line for certain responses
+        return self._add_closing(response, intent, lowered) if closing else response
+    
+    def _add_closing(self, response: str, intent: str, lowered: str = None) -> str:
+        """Add a closing line for certain responses"""
         if len(response) > 50 and not (intent in ["greeting", "farewell"]):
-            if not response.endswith("?") and "anything else" not in response.lower():
+            if not response.endswith("?") and "anything else" not in (lowered or response.lower()):
                 response += " Is there anything else I can help you with?"
         
         return response
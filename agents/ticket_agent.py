@@ -1,7 +1,11 @@
 from agents.base_agent import BaseAgent
+from utils.generative import get_generative_responder
+from utils.preprocessing import ProcessedMessage
+from utils.minhash import MinHasher
+from utils.ticket_dedup import IncidentIndex
 import logging
 from datetime import datetime
-from typing import Dict, Optional, Any
+from typing import Dict, Optional, Any, Union
 import json
 import os
 
@@ -22,6 +26,16 @@ class TicketAgent(BaseAgent):
         # Load ticket templates for responses
         self.templates = self._load_templates()
         
+        # Near-identical complaints are attached to an open ticket instead of opening another
+        self.hasher = MinHasher(skip_identifiers=True)
+        self.duplicate_threshold = float(os.getenv("TICKET_DEDUP_THRESHOLD", "0.8"))
+        # Incidents close this long after their last report
+        self.incident_ttl = float(os.getenv("TICKET_INCIDENT_TTL", str(24 * 3600)))
+        self.incidents = self._new_incidents()
+        
+        # Optional LLM-written ticket subjects and descriptions
+        self.responder = get_generative_responder()
+        
     def _load_templates(self) -> Dict[str, str]:
         """Load response templates from file if available, otherwise use defaults"""
         try:
@@ -37,10 +51,11 @@ class TicketAgent(BaseAgent):
             "urgent": "I've created an URGENT support ticket for you. Your ticket number is #{ticket_id}. Our support team has been notified and will prioritize this issue.",
             "updated": "Your ticket #{ticket_id} has been updated with your new information.",
             "generic": "I'll need to create a support ticket to help with this issue. Could you briefly describe the problem you're experiencing?",
-            "confirmation": "Thank you for providing that information. I'll create a support ticket for this issue. Is there anything else you'd like to add?"
+            "confirmation": "Thank you for providing that information. I'll create a support ticket for this issue. Is there anything else you'd like to add?",
+            "duplicate": "This looks like the same issue as ticket #{ticket_id}, which our support team is already working on. I've added your report to it."
         }
     
-    async def process(self, message: str, **kwargs):
+    async def process(self, message: Union[str, ProcessedMessage], **kwargs):
         """
         Process ticket-related queries and create/update tickets.
         
@@ -53,20 +68,74 @@ class TicketAgent(BaseAgent):
         """
         intent = kwargs.get("intent", "")
         self._log_processing(message, {"intent": intent})
+        message = ProcessedMessage.of(message)
+        priority = "high" if intent == "urgent" else "medium"
+        tenant = kwargs.get("tenant")
+        templates = self.templates
+        incidents = self.incidents
+        if tenant is not None:
+            if tenant.ticket_templates:
+                templates = {**self.templates, **tenant.ticket_templates}
+            # Tenants' incidents are kept apart, and evicted with the tenant's bundle
+            incidents = tenant.derive(f"ticket_incidents:{id(self)}", lambda bundle: self._new_incidents())
+        
+        # During an outage many customers report the same problem
+        signature = self.hasher.signature(message)
+        identifiers = self.hasher.identifiers(message)
+        match = incidents.match(signature, identifiers)
+        if match:
+            ticket_id = match[0]
+            ticket = self.tickets[ticket_id]
+            # The report is kept with the ticket, it may name details the first one did not
+            updates = {"duplicates": ticket["duplicates"] + 1, "reports": ticket["reports"] + [message.text]}
+            if priority == "high":
+                updates["priority"] = priority
+            self._update_ticket(ticket_id, updates)
+            incidents.touch(ticket_id)
+            template = templates.get("duplicate", "Your report has been added to ticket #{ticket_id}.")
+            return template.replace("{ticket_id}", str(ticket_id))
         
         # For demonstration purposes, we'll create a ticket
         # In a real system, this would interact with the database
+        subject, description = await self._summarize(message.text, intent)
         ticket_id = self._create_ticket(
-            subject=f"Support request: {message[:30]}...",
-            description=message,
-            priority="high" if intent == "urgent" else "medium"
+            subject=subject,
+            description=description,
+            priority=priority
         )
+        incidents.add(ticket_id, signature, identifiers)
         
         # Return the appropriate response
         if intent == "urgent":
-            return self.templates["urgent"].replace("{ticket_id}", str(ticket_id))
+            return templates["urgent"].replace("{ticket_id}", str(ticket_id))
         else:
-            return self.templates["created"].replace("{ticket_id}", str(ticket_id))
+            return templates["created"].replace("{ticket_id}", str(ticket_id))
+    
+    def _new_incidents(self) -> IncidentIndex:
+        return IncidentIndex(self.duplicate_threshold, self.incident_ttl)
+    
+    async def _summarize(self, message: str, intent: str):
+        """
+        Get a ticket subject and description for a message.
+        
+        Uses the generated "Subject: / Description:" summary when generative
+        responses are enabled, falling back to the raw message.
+        
+        Returns:
+            Tuple[str, str]: The subject and description
+        """
+        subject, description = f"Support request: {message[:30]}...", message
+        if not self.responder:
+            return subject, description
+        
+        summary = await self.responder.respond(message, intent, "ticket")
+        if summary:
+            for line in summary.splitlines():
+                if line.lower().startswith("subject:"):
+                    subject = line.split(":", 1)[1].strip()[:50] or subject
+                elif line.lower().startswith("description:"):
+                    description = line.split(":", 1)[1].strip() or description
+        return subject, description
     
     def _create_ticket(self, subject: str, description: str, priority: str) -> int:
         """
@@ -90,7 +159,9 @@ class TicketAgent(BaseAgent):
             "status": "open",
             "priority": priority,
             "created_at": datetime.now().isoformat(),
-            "updated_at": None
+            "updated_at": None,
+            "duplicates": 0,
+            "reports": []
         }
         
         logger.info(f"Created ticket #{ticket_id}: {subject}")
@@ -0,0 +1,363 @@
+"""
+Offline batch mode for the multi-agent pipeline.
+
+Streams a JSONL file of messages, classifies them in chunks, routes and
+answers them through the agents in a process pool and writes results
+incrementally to JSONL or Parquet. Progress is checkpointed after every
+chunk so an interrupted run can be resumed.
+
+Usage:
+    python batch.py requests.jsonl results.jsonl --chunk-size 500 --workers 4
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from agents.intent_classifier_agent import IntentClassifierAgent
+from agents.routing_agent import RoutingAgent
+from agents.support_agent import SupportAgent
+from utils.preprocessing import preprocess
+
+# Parquet output is optional
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+TEXT_FIELDS = ("content", "message", "text", "body")
+ID_FIELDS = ("id", "request_id", "message_id")
+
+# Per-process agent state for pool workers
+_worker_agents = None
+
+
+def iter_records(path: str, skip_lines: int = 0) -> Iterator[Tuple[int, Optional[Dict]]]:
+    """
+    Stream records from a JSONL file.
+
+    Args:
+        path: The JSONL file to read
+        skip_lines: Number of leading lines to skip (for resuming)
+
+    Yields:
+        Tuple[int, Optional[Dict]]: 1-based line number and the parsed
+        record, or None for blank or malformed lines
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            if line_no <= skip_lines:
+                continue
+            line = line.strip()
+            if not line:
+                yield line_no, None
+                continue
+            try:
+                yield line_no, json.loads(line)
+            except json.JSONDecodeError as e:
+                logger.warning(f"Skipping malformed line {line_no}: {str(e)}")
+                yield line_no, None
+
+
+def _first_field(record: Dict, fields: Tuple[str, ...]):
+    for field in fields:
+        if record.get(field) is not None:
+            return record[field]
+    return None
+
+
+def _init_worker() -> None:
+    """Build the agents once per worker process"""
+    global _worker_agents
+    logging.getLogger().setLevel(logging.WARNING)
+
+    # The same cascade as the server (rules, then the local model) minus
+    # the LLM stage, which runs in the main process when configured
+    classifier = IntentClassifierAgent()
+    classifier.llm_gateway = classifier.llm_backend = None
+    classifier.cascade = classifier._build_cascade()
+    _worker_agents = (asyncio.new_event_loop(), classifier, RoutingAgent(), SupportAgent())
+
+
+def _process_record(text: str, intent: Optional[str]) -> Tuple[str, str, str]:
+    """
+    Classify (if needed), route and answer one message inside a worker.
+
+    Returns:
+        Tuple[str, str, str]: The intent, handling agent name and response
+    """
+    loop, classifier, router, support_agent = _worker_agents
+    message = preprocess(text)
+    if intent is None:
+        intent = loop.run_until_complete(classifier.classify_multi(message))[0]
+    agent = loop.run_until_complete(router.route(intent, message))
+    response = loop.run_until_complete(support_agent.generate_response(agent, message, intent))
+    return intent, agent.name, response
+
+
+class JSONLResultWriter:
+    """
+    Appends result rows to a JSONL file.
+    """
+
+    def __init__(self, path: str, resume_offset: Optional[int] = None):
+        self.path = path
+        resuming = resume_offset is not None
+        if resuming and (not os.path.exists(path) or os.path.getsize(path) < resume_offset):
+            # The checkpointed lines would be skipped with their results gone
+            raise RuntimeError(
+                f"Checkpoint expects {resume_offset} bytes of results in {path}, which is missing or "
+                f"shorter; rerun with --no-resume to start over"
+            )
+        self._file = open(path, "r+b" if resuming else "wb")
+        if resuming:
+            # Drop anything written after the last checkpoint
+            self._file.truncate(resume_offset)
+            self._file.seek(resume_offset)
+
+    def write_rows(self, rows: List[Dict]) -> None:
+        self._file.write("".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows).encode("utf-8"))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def tell(self) -> int:
+        return self._file.tell()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class ParquetResultWriter:
+    """
+    Writes result rows as a Parquet dataset: a directory with one part file
+    per chunk, readable as one table with ``pq.read_table(path)``.
+
+    Parquet files cannot be appended to, and an unclosed one is unreadable,
+    so each chunk's part is written completely before the checkpoint moves
+    past it. Parts are named after the chunk's first input line: a chunk
+    redone on resume replaces its part instead of duplicating its rows.
+    """
+
+    SCHEMA_FIELDS = [("line", "int64"), ("id", "string"), ("text", "string"),
+                     ("intent", "string"), ("agent", "string"), ("response", "string")]
+
+    def __init__(self, path: str, resume: bool = False):
+        if not PYARROW_AVAILABLE:
+            raise RuntimeError("pyarrow is required for Parquet output")
+        if resume and not os.path.isdir(path):
+            raise RuntimeError(f"Checkpoint exists but the results directory {path} is missing; rerun with --no-resume to start over")
+        os.makedirs(path, exist_ok=True)
+        if not resume:
+            for name in os.listdir(path):
+                if name.startswith("part-") and name.endswith(".parquet"):
+                    os.remove(os.path.join(path, name))
+        self.path = path
+        self._schema = pa.schema([(name, getattr(pa, kind)()) for name, kind in self.SCHEMA_FIELDS])
+        self._rows_written = 0
+
+    def write_rows(self, rows: List[Dict]) -> None:
+        for row in rows:
+            row["id"] = None if row["id"] is None else str(row["id"])
+        part_path = os.path.join(self.path, f"part-{rows[0]['line']:012d}.parquet")
+        tmp_path = f"{part_path}.tmp"
+        pq.write_table(pa.Table.from_pylist(rows, schema=self._schema), tmp_path)
+        os.replace(tmp_path, part_path)
+        self._rows_written += len(rows)
+
+    def tell(self) -> int:
+        return self._rows_written
+
+    def close(self) -> None:
+        pass
+
+
+class Checkpoint:
+    """
+    Tracks how far through the input a run has got.
+    """
+
+    def __init__(self, output_path: str):
+        self.path = f"{output_path}.checkpoint.json"
+
+    def load(self, input_path: str) -> Optional[Dict]:
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path, "r") as f:
+            state = json.load(f)
+        if state.get("input") != os.path.abspath(input_path):
+            logger.warning(f"Ignoring checkpoint {self.path}: it belongs to {state.get('input')}")
+            return None
+        return state
+
+    def save(self, input_path: str, lines: int, records: int, output_offset: int) -> None:
+        state = {
+            "input": os.path.abspath(input_path),
+            "lines": lines,
+            "records": records,
+            "output_offset": output_offset,
+            "updated_at": time.time(),
+        }
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.path)
+
+
+async def _classify_chunk(classifier: IntentClassifierAgent, texts: List[str], concurrency: int) -> List[str]:
+    """Classify a chunk of messages concurrently through the full cascade, LLM stage included"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def classify(text: str) -> str:
+        async with semaphore:
+            # The primary intent, as the chat endpoint records it
+            return (await classifier.classify_multi(preprocess(text)))[0]
+
+    return await asyncio.gather(*(classify(text) for text in texts))
+
+
+def run_batch(
+    input_path: str,
+    output_path: str,
+    output_format: str = "jsonl",
+    chunk_size: int = 500,
+    workers: Optional[int] = None,
+    resume: bool = True,
+    llm_concurrency: int = 8,
+) -> Dict[str, float]:
+    """
+    Process a JSONL file of messages through the agent pipeline.
+
+    Args:
+        input_path: JSONL file with one message record per line
+        output_path: Where to write the results
+        output_format: "jsonl" or "parquet"
+        chunk_size: Number of records per chunk
+        workers: Number of worker processes (defaults to CPU count)
+        resume: Whether to continue from an existing checkpoint
+        llm_concurrency: Concurrent LLM classification calls per chunk
+
+    Returns:
+        Dict: Summary with record count, elapsed time and throughput
+    """
+    checkpoint = Checkpoint(output_path)
+    state = checkpoint.load(input_path) if resume else None
+    skip_lines = state["lines"] if state else 0
+    records_done = state["records"] if state else 0
+    resume_offset = state["output_offset"] if state else None
+    if state:
+        logger.info(f"Resuming after line {skip_lines} ({records_done} records already processed)")
+
+    if output_format == "parquet":
+        writer = ParquetResultWriter(output_path, resume=state is not None)
+    else:
+        writer = JSONLResultWriter(output_path, resume_offset)
+
+    # LLM classification is network-bound, so it stays in this process
+    classifier = IntentClassifierAgent()
+    use_llm = classifier.llm_gateway is not None
+    loop = asyncio.new_event_loop()
+
+    pool_workers = workers or os.cpu_count() or 1
+    started = time.perf_counter()
+    processed = 0
+    last_line = skip_lines
+    records = iter_records(input_path, skip_lines)
+
+    try:
+        with ProcessPoolExecutor(max_workers=pool_workers, initializer=_init_worker) as pool:
+            while True:
+                chunk = list(islice(records, chunk_size))
+                if not chunk:
+                    break
+                chunk_started = time.perf_counter()
+                last_line = chunk[-1][0]
+
+                items = []
+                for line_no, record in chunk:
+                    if not isinstance(record, dict):
+                        continue
+                    text = _first_field(record, TEXT_FIELDS)
+                    if isinstance(text, str) and text.strip():
+                        items.append((line_no, _first_field(record, ID_FIELDS), text))
+
+                texts = [text for _, _, text in items]
+                if use_llm and texts:
+                    intents = loop.run_until_complete(_classify_chunk(classifier, texts, llm_concurrency))
+                else:
+                    intents = [None] * len(texts)
+
+                results = pool.map(_process_record, texts, intents,
+                                   chunksize=max(1, len(texts) // (pool_workers * 4)))
+
+                rows = [
+                    {"line": line_no, "id": record_id, "text": text,
+                     "intent": intent, "agent": agent_name, "response": response}
+                    for (line_no, record_id, text), (intent, agent_name, response) in zip(items, results)
+                ]
+                if rows:
+                    writer.write_rows(rows)
+
+                processed += len(rows)
+                checkpoint.save(input_path, last_line, records_done + processed, writer.tell())
+
+                chunk_elapsed = time.perf_counter() - chunk_started
+                total_elapsed = time.perf_counter() - started
+                logger.info(
+                    f"Processed {len(rows)} records up to line {last_line} in {chunk_elapsed:.2f}s "
+                    f"({len(rows) / chunk_elapsed if chunk_elapsed else 0:.0f} rec/s, "
+                    f"overall {processed / total_elapsed if total_elapsed else 0:.0f} rec/s)"
+                )
+    finally:
+        writer.close()
+        loop.close()
+
+    elapsed = time.perf_counter() - started
+    summary = {
+        "records": processed,
+        "total_records": records_done + processed,
+        "last_line": last_line,
+        "elapsed_seconds": round(elapsed, 3),
+        "records_per_second": round(processed / elapsed, 1) if elapsed else 0.0,
+    }
+    logger.info(f"Batch complete: {summary}")
+    return summary
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Run the agent pipeline over a JSONL file of messages")
+    parser.add_argument("input", help="Input JSONL file")
+    parser.add_argument("output", help="Output file for results")
+    parser.add_argument("--format", choices=["jsonl", "parquet"], default=None,
+                        help="Output format (defaults to the output file extension)")
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--llm-concurrency", type=int, default=8)
+    parser.add_argument("--no-resume", action="store_true", help="Ignore any existing checkpoint")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    output_format = args.format or ("parquet" if args.output.endswith(".parquet") else "jsonl")
+    summary = run_batch(
+        args.input,
+        args.output,
+        output_format=output_format,
+        chunk_size=args.chunk_size,
+        workers=args.workers,
+        resume=not args.no_resume,
+        llm_concurrency=args.llm_concurrency,
+    )
+    print(json.dumps(summary))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Memory and throughput of the streaming conversation export.
+
+Fills a scratch SQLite database with conversations and messages, then
+exports it the way ``GET /api/export/conversations`` does (server-side
+cursor, chunked encoding) and, for comparison, by loading every row
+first. Reports rows per second and the peak memory traced while each
+export runs.
+
+Usage:
+    python -m benchmarks.export_stream --conversations 20000 --messages 25
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+
+def _fill(engine, conversations: int, messages: int, rng: random.Random) -> int:
+    from models.chat import Conversation, Message
+
+    rows = 0
+    with engine.begin() as conn:
+        for start in range(0, conversations, 1000):
+            ids = range(start + 1, min(start + 1000, conversations) + 1)
+            conn.execute(Conversation.__table__.insert(), [{"id": conversation_id} for conversation_id in ids])
+            batch = [
+                {"conversation_id": conversation_id, "content": "lorem ipsum " * rng.randint(2, 40), "is_user": index % 2 == 0}
+                for conversation_id in ids
+                for index in range(rng.randint(0, 2 * messages))
+            ]
+            conn.execute(Message.__table__.insert(), batch)
+            rows += len(batch)
+    return rows
+
+
+def _measure(label: str, run, rows: int) -> None:
+    tracemalloc.start()
+    started = time.perf_counter()
+    size = run()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label}: {size / 2**20:.1f} MiB in {elapsed:.1f} s ({rows / elapsed:,.0f} rows/s), peak {peak / 2**20:.1f} MiB")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--conversations", type=int, default=20000, help="Conversations to export")
+    parser.add_argument("--messages", type=int, default=25, help="Average messages per conversation")
+    parser.add_argument("--format", choices=("ndjson", "csv"), default="ndjson", help="Export format")
+    args = parser.parse_args()
+
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+
+    from database import ensure_schema
+    from utils.export import conversation_query, export_conversations, stream_rows
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{os.path.join(directory, 'export.db')}")
+        ensure_schema(engine)
+        rows = _fill(engine, args.conversations, args.messages, random.Random(5))
+        session_factory = sessionmaker(bind=engine)
+        print(f"{args.conversations:,} conversations, {rows:,} messages, {args.format}")
+
+        def streamed() -> int:
+            rows = stream_rows([session_factory], conversation_query())
+            return sum(len(chunk) for chunk in export_conversations(rows, args.format))
+
+        def loaded() -> int:
+            with session_factory() as db:
+                rows = [dict(row) for row in db.execute(conversation_query()).mappings()]
+            return sum(len(chunk) for chunk in export_conversations(rows, args.format))
+
+        _measure("streamed", streamed, rows)
+        _measure("loaded first", loaded, rows)
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Event fan-out to many idle WebSocket subscribers.
+
+Each simulated connection is a task waiting on its subscription, the same
+shape as the ``/ws`` endpoints between events. Reports the time from
+``publish`` until every subscriber has received the event, and the memory
+held per idle subscriber.
+
+Usage:
+    python -m benchmarks.pubsub_fanout --subscribers 10000 --events 50
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+import tracemalloc
+
+
+async def _run(subscribers: int, events: int) -> None:
+    from utils.pubsub import EventBroker
+
+    broker = EventBroker(max_queue=16)
+    received = 0
+    all_received = asyncio.Event()
+
+    async def connection(subscription):
+        nonlocal received
+        async for _ in subscription:
+            received += 1
+            if received == subscribers:
+                all_received.set()
+
+    tracemalloc.start()
+    baseline = tracemalloc.take_snapshot()
+    subscriptions = [broker.subscribe("conversation:1") for _ in range(subscribers)]
+    tasks = [asyncio.create_task(connection(subscription)) for subscription in subscriptions]
+    # Let every task reach its first wait
+    await asyncio.sleep(0)
+    idle = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    idle_bytes = sum(stat.size_diff for stat in idle.compare_to(baseline, "filename"))
+
+    event = {"type": "message", "id": 1, "conversation_id": 1, "is_user": False, "content": "Your order has shipped."}
+    latencies = []
+    for _ in range(events):
+        received = 0
+        all_received.clear()
+        started = time.perf_counter()
+        broker.publish("conversation:1", event)
+        await all_received.wait()
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"subscribers: {subscribers}")
+    print(f"idle memory: {idle_bytes / 1024 / 1024:.1f} MiB ({idle_bytes / subscribers:.0f} bytes per subscriber)")
+    print(f"fan-out latency: p50 {statistics.median(latencies):.2f} ms, p99 {p99:.2f} ms, "
+          f"{subscribers / (statistics.median(latencies) / 1000):,.0f} deliveries/s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subscribers", type=int, default=10000, help="Idle subscribers on one topic")
+    parser.add_argument("--events", type=int, default=50, help="Events published")
+    args = parser.parse_args()
+    asyncio.run(_run(args.subscribers, args.events))
+
+
+if __name__ == "__main__":
+    main()
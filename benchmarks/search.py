@@ -0,0 +1,121 @@
+"""
+Full-text search latency on a large synthetic message table.
+
+Messages are bulk-inserted into a temporary database through the normal
+schema, so the FTS5 triggers index them as they are written. Each query is
+then run through ``SearchIndex.search`` (first page, BM25 ranked) and, for
+comparison, as the ``LIKE '%term%'`` scan it replaces. The LIKE scan returns
+the newest matches unranked, so it is only fast when a term is common
+enough to fill a page early.
+
+Usage:
+    python -m benchmarks.search --messages 2000000 --repeat 20
+"""
+
+import argparse
+import itertools
+import os
+import random
+import statistics
+import tempfile
+import time
+
+WORDS = (
+    "order delivery package refund return account password login billing invoice payment card "
+    "subscription cancel upgrade shipping tracking address email phone support ticket issue error "
+    "crash slow broken missing damaged late charge discount coupon warranty replacement exchange "
+    "help please thanks hello urgent manager complaint today yesterday week month still again never"
+).split()
+
+# Filler vocabulary; words are drawn with Zipf-like frequencies as in real text
+FILLER = [f"w{index}" for index in range(20000)]
+VOCABULARY = WORDS + FILLER
+CUM_WEIGHTS = list(itertools.accumulate(1.0 / (rank + 1) for rank in range(len(VOCABULARY))))
+
+QUERIES = {
+    "rare term": "xylophone",
+    "selective pair": "damaged warranty",
+    "common term": "order",
+    "stemmed": "refunds",
+    "three terms": "refund card late",
+}
+
+
+def _setup(path: str):
+    os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    # Importing the app creates the schema and the search index
+    import main
+    return main.engine, main.SessionLocal, main.search_index
+
+
+def _populate(engine, size: int, batch_size: int = 50000) -> float:
+    rng = random.Random(42)
+    started = time.perf_counter()
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute("INSERT INTO conversations (created_at) VALUES (CURRENT_TIMESTAMP)")
+        conversation_id = cursor.lastrowid
+        for start in range(0, size, batch_size):
+            rows = []
+            for index in range(start, min(start + batch_size, size)):
+                words = rng.choices(VOCABULARY, cum_weights=CUM_WEIGHTS, k=rng.randint(6, 20))
+                if index % 100000 == 0:
+                    words.append("xylophone")
+                rows.append((" ".join(words), index % 2 == 0, conversation_id))
+            cursor.executemany(
+                "INSERT INTO messages (content, is_user, conversation_id, timestamp) VALUES (?, ?, ?, CURRENT_TIMESTAMP)", rows
+            )
+            connection.commit()
+    finally:
+        connection.close()
+    return time.perf_counter() - started
+
+
+def _median_ms(function, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=2000000, help="Synthetic messages to index")
+    parser.add_argument("--repeat", type=int, default=20, help="Runs per query (median is reported)")
+    parser.add_argument("--like-repeat", type=int, default=3, help="Runs per LIKE scan")
+    args = parser.parse_args()
+
+    import logging
+    logging.disable(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.setdefault("ARCHIVE_DIR", os.path.join(tmp, "archive"))
+        engine, session_factory, search_index = _setup(os.path.join(tmp, "bench.db"))
+        elapsed = _populate(engine, args.messages)
+        print(f"indexed {args.messages:,} messages in {elapsed:.1f} s ({args.messages / elapsed:,.0f} rows/s)")
+        started = time.perf_counter()
+        search_index.optimize()
+        print(f"optimize: {time.perf_counter() - started:.1f} s")
+
+        from sqlalchemy import select
+        from models.chat import Message
+
+        print(f"{'query':>15} {'fts ms':>8} {'like ms':>9} {'speedup':>8}")
+        with session_factory() as db:
+            for name, query in QUERIES.items():
+                fts_ms = _median_ms(lambda: search_index.search(db, query, "messages", 20), args.repeat)
+                term = query.split()[0]
+                like_ms = _median_ms(
+                    lambda: db.execute(
+                        select(Message.id).where(Message.content.ilike(f"%{term}%")).order_by(Message.id.desc()).limit(21)
+                    ).all(),
+                    args.like_repeat,
+                )
+                print(f"{name:>15} {fts_ms:>8.2f} {like_ms:>9.2f} {like_ms / fts_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Conversation read cost: Pydantic models versus direct JSON encoding.
+
+For each history length a conversation is written to a temporary SQLite
+database and read back three ways:
+
+- pydantic: ORM objects -> MessageResponse/ConversationResponse ->
+  jsonable_encoder -> JSONResponse (the previous endpoint)
+- fast: column rows -> dicts -> one JSON encode (the current endpoint)
+- stream: the same rows encoded in chunks, as sent for long histories
+
+Usage:
+    python -m benchmarks.serialization --sizes 10 100 1000 10000 --repeat 20
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+
+def _setup(path: str):
+    os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    # Importing the app creates the schema
+    import main
+    return main.SessionLocal
+
+
+def _populate(session_factory, size: int) -> int:
+    from models.chat import Conversation, Message
+
+    with session_factory() as db:
+        conversation = Conversation()
+        db.add(conversation)
+        db.flush()
+        db.add_all(
+            Message(
+                content=f"Message {index}: my order #{index} has not arrived yet, can you check the delivery status?",
+                is_user=index % 2 == 0,
+                conversation_id=conversation.id,
+            )
+            for index in range(size)
+        )
+        db.commit()
+        return conversation.id
+
+
+def _pydantic(db, conversation_id: int) -> bytes:
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+    from models.chat import Conversation, Message
+    from schemas.chat import ConversationResponse, MessageResponse
+
+    conversation = db.query(Conversation).filter(Conversation.id == conversation_id).first()
+    messages = db.query(Message).filter(Message.conversation_id == conversation_id).all()
+    response = ConversationResponse(
+        id=conversation.id,
+        messages=[
+            MessageResponse(
+                id=msg.id,
+                content=msg.content,
+                conversation_id=msg.conversation_id,
+                timestamp=msg.timestamp,
+                is_user=msg.is_user,
+            ) for msg in messages
+        ],
+        created_at=conversation.created_at,
+    )
+    # FastAPI validates the returned model against response_model again
+    validated = ConversationResponse.model_validate(response.model_dump())
+    return JSONResponse(jsonable_encoder(validated)).body
+
+
+def _rows(db, conversation_id: int):
+    from sqlalchemy import select
+    from main import _MESSAGE_COLUMNS
+    from models.chat import Message
+
+    return db.execute(
+        select(*_MESSAGE_COLUMNS).where(Message.conversation_id == conversation_id).order_by(Message.id)
+    ).mappings()
+
+
+def _head(db, conversation_id: int) -> dict:
+    from models.chat import Conversation
+
+    conversation = db.get(Conversation, conversation_id)
+    return {"id": conversation.id, "created_at": conversation.created_at}
+
+
+def _fast(db, conversation_id: int) -> bytes:
+    from utils.serialization import FastJSONResponse
+
+    head = _head(db, conversation_id)
+    return FastJSONResponse({**head, "messages": [dict(row) for row in _rows(db, conversation_id)]}).body
+
+
+def _stream(db, conversation_id: int) -> bytes:
+    from utils.serialization import iter_json_object
+
+    head = _head(db, conversation_id)
+    return b"".join(iter_json_object(head, "messages", (dict(row) for row in _rows(db, conversation_id))))
+
+
+def _measure(session_factory, conversation_id: int, reader, repeat: int):
+    timings = []
+    payload = b""
+    for _ in range(repeat):
+        with session_factory() as db:
+            started = time.perf_counter()
+            payload = reader(db, conversation_id)
+            timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000, len(payload)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 10000], help="Messages per conversation")
+    parser.add_argument("--repeat", type=int, default=20, help="Reads per measurement (median is reported)")
+    args = parser.parse_args()
+
+    import logging
+    logging.disable(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.setdefault("ARCHIVE_DIR", os.path.join(tmp, "archive"))
+        session_factory = _setup(os.path.join(tmp, "bench.db"))
+        from utils.serialization import ORJSON_AVAILABLE
+        print(f"orjson: {ORJSON_AVAILABLE}")
+        print(f"{'messages':>8} {'mode':>9} {'median ms':>10} {'bytes':>10} {'speedup':>8}")
+        for size in args.sizes:
+            conversation_id = _populate(session_factory, size)
+            baseline_ms = None
+            for mode, reader in (("pydantic", _pydantic), ("fast", _fast), ("stream", _stream)):
+                elapsed_ms, size_bytes = _measure(session_factory, conversation_id, reader, args.repeat)
+                baseline_ms = baseline_ms or elapsed_ms
+                print(f"{size:>8} {mode:>9} {elapsed_ms:>10.2f} {size_bytes:>10} {baseline_ms / elapsed_ms:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
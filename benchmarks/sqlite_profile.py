@@ -0,0 +1,129 @@
+"""
+Concurrent chat throughput with the default and the tuned SQLite setup.
+
+Each mode runs in a fresh subprocess (the engine is configured at import
+time) against its own temporary database file. Simulated users post chat
+messages concurrently and periodically read their conversation back.
+
+Usage:
+    python -m benchmarks.sqlite_profile --users 64 --messages 20
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+MODES = {
+    # Default rollback journal, full fsync, each request writing on its own session
+    "baseline": {"SQLITE_TUNED": "false", "DB_WRITER_ENABLED": "false"},
+    # WAL + pragmas, all writes through the dedicated writer thread
+    "tuned": {"SQLITE_TUNED": "true", "DB_WRITER_ENABLED": "true"},
+}
+
+MESSAGES = [
+    "Hello there",
+    "What are your business hours?",
+    "I need help with my account",
+    "How do I reset my password?",
+    "My order hasn't arrived yet",
+    "What is your returns policy?",
+]
+
+
+async def _run_users(users: int, messages: int, read_every: int) -> dict:
+    import logging
+    import httpx
+    import main
+
+    logging.disable(logging.WARNING)
+    await main.app.router.startup()
+    latencies = []
+    errors = []
+
+    async def user(client: httpx.AsyncClient, index: int) -> None:
+        conversation_id = None
+        for turn in range(messages):
+            started = time.perf_counter()
+            response = await client.post("/api/chat", json={
+                "content": MESSAGES[(index + turn) % len(MESSAGES)],
+                "conversation_id": conversation_id,
+            })
+            if response.status_code != 200:
+                # e.g. "database is locked" once the busy timeout expires
+                errors.append(response.status_code)
+                continue
+            conversation_id = response.json()["conversation_id"]
+            if read_every and turn % read_every == read_every - 1:
+                read = await client.get(f"/api/conversations/{conversation_id}")
+                if read.status_code != 200:
+                    errors.append(read.status_code)
+            latencies.append(time.perf_counter() - started)
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(user(client, index) for index in range(users)))
+        elapsed = time.perf_counter() - started
+
+    await main.app.router.shutdown()
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "elapsed_seconds": round(elapsed, 3),
+        "chats_per_second": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 2),
+    }
+
+
+def _child(args) -> None:
+    result = asyncio.run(_run_users(args.users, args.messages, args.read_every))
+    print(json.dumps(result))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=64, help="Concurrent simulated users")
+    parser.add_argument("--messages", type=int, default=20, help="Messages per user")
+    parser.add_argument("--read-every", type=int, default=5, help="Read the conversation every N messages (0 disables)")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child(args)
+        return
+
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    results = {}
+    for mode, overrides in MODES.items():
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ)
+            env.update(overrides)
+            env.update({
+                "DATABASE_URL": f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+                "RATE_LIMIT_ENABLED": "false",
+                "ADMISSION_MAX_CONCURRENCY": "100000",
+                "OPENAI_API_KEY": "",
+                "ARCHIVE_DIR": os.path.join(tmp, "archive"),
+            })
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.sqlite_profile", "--child",
+                 "--users", str(args.users), "--messages", str(args.messages),
+                 "--read-every", str(args.read_every)],
+                cwd=repo_root, env=env, capture_output=True, text=True, check=True,
+            ).stdout
+            results[mode] = json.loads(output.strip().splitlines()[-1])
+            print(f"{mode:>8}: {results[mode]}")
+
+    speedup = results["tuned"]["chats_per_second"] / results["baseline"]["chats_per_second"]
+    print(f"speedup: {speedup:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
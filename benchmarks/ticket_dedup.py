@@ -0,0 +1,96 @@
+"""
+Near-duplicate ticket matching with MinHash LSH.
+
+Indexes a large set of unrelated active tickets, then replays an outage:
+a burst of reports that are rewordings of a few incidents. Each report
+is matched against the index the way ``POST /api/tickets`` does it, and
+a new ticket is indexed only when nothing similar is found. Reports how
+many tickets the burst opened, match latency, and how often unrelated
+reports were wrongly attached.
+
+Usage:
+    python -m benchmarks.ticket_dedup --tickets 100000 --reports 1000
+"""
+
+import argparse
+import random
+import statistics
+import time
+
+# Letters only: tokens with digits are identifiers and left out of signatures
+FILLER = ["w" + "".join(chr(ord("a") + int(digit)) for digit in str(index)) for index in range(5000)]
+
+INCIDENTS = [
+    "checkout page is not working, I get an error when I pay with my card",
+    "the mobile app crashes as soon as I open my order history",
+    "password reset email never arrives, I cannot log in to my account",
+]
+
+OPENERS = ["", "hi, ", "hello! ", "urgent: ", "help, ", "again ", "ugh "]
+CLOSERS = ["", " please fix", " since this morning", "!!", " what is going on?", " for the last hour"]
+
+
+def _reword(text: str, rng: random.Random) -> str:
+    words = text.split()
+    if rng.random() < 0.5:
+        words.pop(rng.randrange(len(words)))
+    if rng.random() < 0.3:
+        index = rng.randrange(len(words))
+        words[index] = words[index].upper()
+    return f"{rng.choice(OPENERS)}{' '.join(words)}{rng.choice(CLOSERS)}"
+
+
+def _unrelated(rng: random.Random) -> str:
+    return " ".join(rng.choices(FILLER, k=rng.randint(8, 30)))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tickets", type=int, default=100000, help="Unrelated active tickets already indexed")
+    parser.add_argument("--reports", type=int, default=1000, help="Outage reports in the burst")
+    parser.add_argument("--threshold", type=float, default=0.8, help="Similarity needed to attach a report")
+    args = parser.parse_args()
+
+    from utils.minhash import NUMPY_AVAILABLE, LSHIndex, MinHasher
+
+    rng = random.Random(3)
+    hasher = MinHasher(skip_identifiers=True)
+    index = LSHIndex()
+
+    started = time.perf_counter()
+    for ticket_id in range(args.tickets):
+        index.add(ticket_id, hasher.signature(_unrelated(rng)))
+    elapsed = time.perf_counter() - started
+    print(f"indexed {args.tickets:,} tickets in {elapsed:.1f} s (numpy: {NUMPY_AVAILABLE})")
+
+    reports = [(incident, _reword(INCIDENTS[incident], rng)) for incident in (rng.randrange(len(INCIDENTS)) for _ in range(args.reports))]
+    controls = [_unrelated(rng) for _ in range(args.reports)]
+
+    timings = []
+    opened = {}
+    wrong = 0
+    next_id = args.tickets
+    for incident, text in reports:
+        started = time.perf_counter()
+        signature = hasher.signature(text)
+        matches = index.query(signature, args.threshold)
+        timings.append(time.perf_counter() - started)
+        if matches:
+            if opened.get(matches[0][0]) != incident:
+                wrong += 1
+            continue
+        index.add(next_id, signature)
+        opened[next_id] = incident
+        next_id += 1
+
+    false_attach = sum(1 for text in controls if index.query(hasher.signature(text), args.threshold))
+
+    timings.sort()
+    print(f"{args.reports} reports of {len(INCIDENTS)} incidents opened {len(opened)} tickets "
+          f"({1 - len(opened) / args.reports:.1%} fewer writes and ticket notifications)")
+    print(f"reports attached to the wrong ticket: {wrong}; unrelated reports attached: {false_attach}/{len(controls)}")
+    print(f"match latency: p50 {statistics.median(timings) * 1e6:.0f} us, p99 {timings[int(len(timings) * 0.99)] * 1e6:.0f} us")
+
+
+if __name__ == "__main__":
+    main()
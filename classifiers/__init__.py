@@ -0,0 +1,5 @@
+from classifiers.base import ClassificationResult, ClassifierBackend, register_backend, create_backend, available_backends
+from classifiers.rules import RuleIntentClassifier
+from classifiers.local_model import LocalIntentClassifier, NaiveBayesIntentModel, train_naive_bayes
+from classifiers.llm import LLMIntentClassifier
+from classifiers.cascade import CascadeClassifier
@@ -0,0 +1,100 @@
+"""
+Plugin interface for intent classifier backends.
+"""
+
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, List, NamedTuple, Union
+
+from utils.preprocessing import ProcessedMessage
+
+logger = logging.getLogger(__name__)
+
+
+class ClassificationResult(NamedTuple):
+    """
+    An intent with a confidence score in ``[0, 1]``.
+    """
+    intent: str
+    confidence: float
+    backend: str
+
+
+class ClassifierBackend(ABC):
+    """
+    Base class for intent classifier backends.
+
+    Backends implement ``classify``; those that can score several messages
+    at once more cheaply than one by one should also override
+    ``classify_batch``. Messages may arrive as raw text or as a
+    ``ProcessedMessage``; backends that only need the text use ``text_of``.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    async def classify(self, message: Union[str, ProcessedMessage]) -> ClassificationResult:
+        """
+        Classify a single message.
+
+        Args:
+            message: The user's message, raw or preprocessed
+
+        Returns:
+            ClassificationResult: The predicted intent and its confidence
+        """
+        pass
+
+    async def classify_batch(self, messages: List[str]) -> List[ClassificationResult]:
+        """
+        Classify several messages.
+
+        Args:
+            messages: The user messages
+
+        Returns:
+            List[ClassificationResult]: One result per message, in order
+        """
+        return list(await asyncio.gather(*(self.classify(message) for message in messages)))
+
+
+_BACKENDS: Dict[str, Callable[..., ClassifierBackend]] = {}
+
+
+def register_backend(name: str):
+    """
+    Class decorator registering a backend factory under ``name``.
+
+    Args:
+        name: The name used to select the backend (e.g. via configuration)
+    """
+    def decorator(factory):
+        _BACKENDS[name] = factory
+        return factory
+    return decorator
+
+
+def create_backend(name: str, **kwargs) -> ClassifierBackend:
+    """
+    Instantiate a registered backend.
+
+    Args:
+        name: The registered backend name
+        **kwargs: Arguments passed to the backend's factory
+
+    Returns:
+        ClassifierBackend: The backend instance
+
+    Raises:
+        ValueError: If no backend is registered under ``name``
+    """
+    factory = _BACKENDS.get(name)
+    if factory is None:
+        raise ValueError(f"Unknown classifier backend '{name}'. Available: {sorted(_BACKENDS)}")
+    return factory(**kwargs)
+
+
+def available_backends() -> List[str]:
+    """List the names of registered backends"""
+    return sorted(_BACKENDS)
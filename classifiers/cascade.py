@@ -0,0 +1,87 @@
+"""
+Confidence-based cascade over classifier backends.
+"""
+
+import logging
+import time
+from collections import defaultdict
+from typing import Dict, List, Tuple, Union
+
+from classifiers.base import ClassificationResult, ClassifierBackend
+from utils.preprocessing import ProcessedMessage
+
+logger = logging.getLogger(__name__)
+
+
+class CascadeClassifier(ClassifierBackend):
+    """
+    Runs backends from cheapest to most expensive and stops at the first
+    result whose confidence reaches that stage's threshold.
+
+    If no stage is confident enough, the most confident result seen is
+    returned, so a failing final stage degrades to the best cheap answer.
+    """
+
+    name = "cascade"
+
+    def __init__(self, stages: List[Tuple[ClassifierBackend, float]]):
+        """
+        Args:
+            stages: (backend, threshold) pairs in the order they should run
+        """
+        self.stages = stages
+        self._stats: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+
+    def set_threshold(self, backend_name: str, threshold: float) -> None:
+        """Change the acceptance threshold of a stage at runtime"""
+        self.stages = [
+            (backend, threshold if backend.name == backend_name else current)
+            for backend, current in self.stages
+        ]
+
+    async def classify(self, message: Union[str, ProcessedMessage]) -> ClassificationResult:
+        best = None
+        for backend, threshold in self.stages:
+            stats = self._stats[backend.name]
+            started = time.perf_counter()
+            try:
+                result = await backend.classify(message)
+            except Exception as e:
+                stats["errors"] += 1
+                logger.warning(f"{backend.name} classifier failed: {str(e)}")
+                continue
+            finally:
+                stats["calls"] += 1
+                stats["latency_seconds_total"] += time.perf_counter() - started
+
+            if best is None or result.confidence > best.confidence:
+                best = result
+            if result.confidence >= threshold:
+                stats["accepted"] += 1
+                return result
+            stats["escalated"] += 1
+
+        return best or ClassificationResult("other", 0.0, self.name)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        Per-stage counters and hit rates.
+
+        Returns:
+            Dict: For each stage, calls, accepted/escalated counts, the
+            share of calls it answered and its mean latency in milliseconds
+        """
+        report = {}
+        for backend, threshold in self.stages:
+            counters = self._stats.get(backend.name, {})
+            calls = counters.get("calls", 0)
+            report[backend.name] = {
+                "threshold": threshold,
+                "calls": int(calls),
+                "accepted": int(counters.get("accepted", 0)),
+                "escalated": int(counters.get("escalated", 0)),
+                "errors": int(counters.get("errors", 0)),
+                "hit_rate": round(counters.get("accepted", 0) / calls, 4) if calls else 0.0,
+                "mean_latency_ms": round(counters.get("latency_seconds_total", 0) / calls * 1000, 3) if calls else 0.0,
+            }
+        return report
@@ -0,0 +1,51 @@
+"""
+LLM-backed classifier backend (OpenAI chat completions).
+"""
+
+import logging
+from typing import Iterable
+
+from classifiers.base import ClassificationResult, ClassifierBackend
+from utils.preprocessing import text_of
+from utils.prompt_templates import PromptTemplates
+
+logger = logging.getLogger(__name__)
+
+LLM_CONFIDENCE = 0.9
+
+
+class LLMIntentClassifier(ClassifierBackend):
+    """
+    Classifies messages with a chat completion model via the shared
+    ``LLMGateway``.
+
+    The model gives no usable probability, so a valid answer is reported
+    with a fixed confidence; an invalid answer or an API error yields
+    ``other`` with zero confidence so callers can fall back.
+    """
+
+    name = "llm"
+
+    def __init__(self, gateway, valid_intents: Iterable[str], model: str = "gpt-3.5-turbo"):
+        self.gateway = gateway
+        # Kept by reference so intents registered later are accepted too
+        self.valid_intents = valid_intents
+        self.model = model
+
+    async def classify(self, message: str) -> ClassificationResult:
+        try:
+            response = await self.gateway.chat_completion(
+                model=self.model,
+                messages=PromptTemplates.compiled("intent_classification").messages(message=text_of(message)),
+                temperature=0.1
+            )
+            intent = response.choices[0].message.content.strip().lower()
+        except Exception as e:
+            logger.error(f"Error in AI intent classification: {str(e)}")
+            return ClassificationResult("other", 0.0, self.name)
+
+        if intent in self.valid_intents or intent == "other":
+            return ClassificationResult(intent, LLM_CONFIDENCE, self.name)
+
+        logger.warning(f"AI returned unrecognized intent: {intent}")
+        return ClassificationResult("other", 0.0, self.name)
@@ -0,0 +1,284 @@
+"""
+Local CPU intent classifier: multinomial naive Bayes over hashed n-grams.
+
+Features are word unigrams, word bigrams and character trigrams hashed
+into a fixed number of buckets, so the model needs no vocabulary. The
+trained weights are stored as one ``float32`` matrix in a small binary file
+that is memory-mapped at load time, which keeps start-up fast and lets
+several worker processes share the same pages.
+
+File layout::
+
+    magic (8 bytes) | header length (uint32 LE) | JSON header | padding
+    | float32 weights [n_features, n_classes], C order, 64-byte aligned
+"""
+
+import json
+import logging
+import os
+import re
+import struct
+import zlib
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from classifiers.base import ClassificationResult, ClassifierBackend, register_backend
+from utils.preprocessing import ProcessedMessage
+
+# NumPy is only needed when the local backend is used
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+MODEL_MAGIC = b"INTNB\x00\x01\x00"
+DATA_ALIGNMENT = 64
+DEFAULT_N_FEATURES = 1 << 16
+
+_TOKEN_RE = re.compile(r"[a-z0-9']+")
+
+
+def extract_features(message: Union[str, ProcessedMessage], n_features: int) -> List[int]:
+    """
+    Hash a message into feature bucket indices.
+
+    Args:
+        message: The raw message text, or a preprocessed message (its folded text is reused)
+        n_features: Number of hash buckets
+
+    Returns:
+        List[int]: Bucket index per feature occurrence (repeats count twice)
+    """
+    # Raw text (e.g. training data) is folded like served messages (NFKC, casefold)
+    folded = ProcessedMessage.of(message).folded
+    tokens = _TOKEN_RE.findall(folded)
+    features = ["w:" + token for token in tokens]
+    features.extend(f"b:{left} {right}" for left, right in zip(tokens, tokens[1:]))
+    for token in tokens:
+        padded = f"^{token}$"
+        features.extend("c:" + padded[i:i + 3] for i in range(len(padded) - 2))
+    return [zlib.crc32(feature.encode("utf-8")) % n_features for feature in features]
+
+
+def _csr_features(messages: Sequence[str], n_features: int):
+    """Build flat feature indices and row pointers for a batch"""
+    indices: List[int] = []
+    indptr = [0]
+    for message in messages:
+        indices.extend(extract_features(message, n_features))
+        indptr.append(len(indices))
+    return np.asarray(indices, dtype=np.int64), np.asarray(indptr, dtype=np.int64)
+
+
+def _softmax(logits, temperature: float):
+    scaled = logits / temperature
+    scaled -= scaled.max(axis=1, keepdims=True)
+    np.exp(scaled, out=scaled)
+    scaled /= scaled.sum(axis=1, keepdims=True)
+    return scaled
+
+
+class NaiveBayesIntentModel:
+    """
+    Trained naive Bayes weights plus calibration temperature.
+    """
+
+    def __init__(self, classes: List[str], weights, class_log_prior, temperature: float = 1.0,
+                 n_features: int = DEFAULT_N_FEATURES):
+        self.classes = list(classes)
+        self.weights = weights
+        self.class_log_prior = np.asarray(class_log_prior, dtype=np.float32)
+        self.temperature = float(temperature)
+        self.n_features = n_features
+
+    def logits(self, messages: Sequence[str]):
+        """
+        Unnormalised class log-likelihoods for a batch of messages.
+
+        Returns:
+            ndarray: Array of shape ``(len(messages), n_classes)``
+        """
+        indices, indptr = _csr_features(messages, self.n_features)
+        scores = np.zeros((len(messages), len(self.classes)), dtype=np.float32)
+        if len(indices):
+            gathered = self.weights[indices]
+            starts = indptr[:-1]
+            non_empty = indptr[1:] > starts
+            # reduceat sums each row's slice of gathered feature weights
+            scores[non_empty] = np.add.reduceat(gathered, starts[non_empty], axis=0)
+        scores += self.class_log_prior
+        return scores
+
+    def predict_proba(self, messages: Sequence[str]):
+        """Calibrated class probabilities for a batch of messages"""
+        return _softmax(self.logits(messages), self.temperature)
+
+    def predict(self, messages: Sequence[str]) -> List[Tuple[str, float]]:
+        """
+        Predict the most likely intent for each message.
+
+        Returns:
+            List[Tuple[str, float]]: (intent, confidence) per message
+        """
+        if not messages:
+            return []
+        probabilities = self.predict_proba(messages)
+        best = probabilities.argmax(axis=1)
+        return [(self.classes[index], float(probabilities[row, index])) for row, index in enumerate(best)]
+
+    def save(self, path: str) -> None:
+        """
+        Write the model to ``path`` in the memory-mappable format.
+        """
+        header = json.dumps({
+            "format": "hashed-ngram-multinomial-nb",
+            "classes": self.classes,
+            "n_features": self.n_features,
+            "class_log_prior": [float(value) for value in self.class_log_prior],
+            "temperature": self.temperature,
+        }).encode("utf-8")
+        prefix_len = len(MODEL_MAGIC) + 4 + len(header)
+        padding = (-prefix_len) % DATA_ALIGNMENT
+
+        weights = np.ascontiguousarray(self.weights, dtype=np.float32)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(MODEL_MAGIC)
+            f.write(struct.pack("<I", len(header)))
+            f.write(header)
+            f.write(b"\x00" * padding)
+            f.write(weights.tobytes(order="C"))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "NaiveBayesIntentModel":
+        """
+        Memory-map a model written by ``save``.
+        """
+        with open(path, "rb") as f:
+            if f.read(len(MODEL_MAGIC)) != MODEL_MAGIC:
+                raise ValueError(f"{path} is not an intent model file")
+            (header_len,) = struct.unpack("<I", f.read(4))
+            header = json.loads(f.read(header_len))
+
+        prefix_len = len(MODEL_MAGIC) + 4 + header_len
+        offset = prefix_len + (-prefix_len) % DATA_ALIGNMENT
+        weights = np.memmap(
+            path, dtype=np.float32, mode="r", offset=offset,
+            shape=(header["n_features"], len(header["classes"])),
+        )
+        return cls(header["classes"], weights, header["class_log_prior"], header["temperature"], header["n_features"])
+
+
+def fit_temperature(logits, labels) -> float:
+    """
+    Find the softmax temperature minimising negative log-likelihood.
+
+    Naive Bayes is badly over-confident because it treats overlapping
+    n-grams as independent evidence, so raw posteriors are not usable as
+    cascade thresholds. A single temperature fitted on held-out data fixes
+    most of that without changing the predicted class.
+    """
+    best_temperature, best_nll = 1.0, float("inf")
+    rows = np.arange(len(labels))
+    for temperature in np.geomspace(0.25, 64.0, num=60):
+        probabilities = _softmax(logits.copy(), temperature)
+        nll = -np.log(np.clip(probabilities[rows, labels], 1e-12, None)).mean()
+        if nll < best_nll:
+            best_temperature, best_nll = float(temperature), nll
+    return best_temperature
+
+
+def train_naive_bayes(
+    messages: Sequence[str],
+    labels: Sequence[str],
+    n_features: int = DEFAULT_N_FEATURES,
+    alpha: float = 0.1,
+    holdout_messages: Optional[Sequence[str]] = None,
+    holdout_labels: Optional[Sequence[str]] = None,
+) -> NaiveBayesIntentModel:
+    """
+    Train a model from labelled messages.
+
+    Args:
+        messages: Training messages
+        labels: Intent label per message
+        n_features: Number of hash buckets
+        alpha: Additive (Lidstone) smoothing
+        holdout_messages: Optional held-out messages used for calibration
+        holdout_labels: Labels for the held-out messages
+
+    Returns:
+        NaiveBayesIntentModel: The trained model
+    """
+    if not NUMPY_AVAILABLE:
+        raise RuntimeError("numpy is required to train the local intent model")
+
+    classes = sorted(set(labels))
+    class_index = {intent: index for index, intent in enumerate(classes)}
+    label_ids = np.asarray([class_index[label] for label in labels], dtype=np.int64)
+
+    indices, indptr = _csr_features(messages, n_features)
+    row_ids = np.repeat(label_ids, np.diff(indptr))
+    counts = np.zeros((n_features, len(classes)), dtype=np.float64)
+    np.add.at(counts, (indices, row_ids), 1.0)
+
+    smoothed = counts + alpha
+    weights = np.log(smoothed / smoothed.sum(axis=0, keepdims=True)).astype(np.float32)
+    class_counts = np.bincount(label_ids, minlength=len(classes)).astype(np.float64)
+    class_log_prior = np.log(class_counts / class_counts.sum())
+
+    model = NaiveBayesIntentModel(classes, weights, class_log_prior, 1.0, n_features)
+    if holdout_messages:
+        known = [(message, class_index[label]) for message, label in zip(holdout_messages, holdout_labels)
+                 if label in class_index]
+        if known:
+            logits = model.logits([message for message, _ in known])
+            model.temperature = fit_temperature(logits, np.asarray([label for _, label in known]))
+    return model
+
+
+@register_backend("local")
+class LocalIntentClassifier(ClassifierBackend):
+    """
+    Classifier backend serving a memory-mapped naive Bayes model.
+    """
+
+    name = "local"
+
+    def __init__(self, model_path: Optional[str] = None, model: Optional[NaiveBayesIntentModel] = None):
+        if not NUMPY_AVAILABLE:
+            raise RuntimeError("numpy is required for the local intent classifier")
+        if model is None:
+            model_path = model_path or os.getenv("LOCAL_INTENT_MODEL", "data/intent_model.bin")
+            model = NaiveBayesIntentModel.load(model_path)
+            logger.info(f"Loaded local intent model from {model_path} ({len(model.classes)} intents)")
+        self.model = model
+
+    def classify_batch_sync(self, messages: Sequence[str]) -> List[ClassificationResult]:
+        """Vectorised classification without an event loop"""
+        return [ClassificationResult(intent, confidence, self.name)
+                for intent, confidence in self.model.predict(messages)]
+
+    async def classify(self, message: Union[str, ProcessedMessage]) -> ClassificationResult:
+        return self.classify_batch_sync([message])[0]
+
+    async def classify_batch(self, messages: List[str]) -> List[ClassificationResult]:
+        return self.classify_batch_sync(messages)
+
+
+def load_labelled_jsonl(path: str, text_field: str = "content", label_field: str = "intent") -> Iterable[Tuple[str, str]]:
+    """
+    Stream (message, intent) pairs from a JSONL log.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            text, label = record.get(text_field), record.get(label_field)
+            if isinstance(text, str) and text.strip() and label:
+                yield text, label
@@ -0,0 +1,76 @@
+"""
+Rule-based classifier backend with confidence scores.
+"""
+
+from typing import Dict, List, Pattern, Tuple, Union
+
+from classifiers.base import ClassificationResult, ClassifierBackend, register_backend
+from utils.preprocessing import ProcessedMessage
+
+ANCHORED_CONFIDENCE = 0.99
+SINGLE_MATCH_CONFIDENCE = 0.8
+MIN_AMBIGUOUS_CONFIDENCE = 0.3
+
+
+@register_backend("rules")
+class RuleIntentClassifier(ClassifierBackend):
+    """
+    Scores messages with the regex patterns of the intent classifier.
+
+    The predicted intent is the first matching intent in pattern order,
+    exactly like the plain rule-based classifier. Confidence reflects how
+    unambiguous the match is: an anchored pattern (``^hello``) that is the
+    only intent to match is treated as certain, a single unanchored match
+    as likely, and every additional matching intent lowers the score.
+    """
+
+    name = "rules"
+
+    def __init__(self, intent_patterns: Dict[str, List[Pattern]]):
+        # Shared with the owning agent, so patterns added later are picked up
+        self.intent_patterns = intent_patterns
+
+    def _scan(self, message: ProcessedMessage) -> Tuple[Tuple[str, bool], ...]:
+        matched = []
+        for intent, patterns in self.intent_patterns.items():
+            for pattern in patterns:
+                if pattern.search(message.normalized):
+                    matched.append((intent, pattern.pattern.startswith("^")))
+                    break
+        return tuple(matched)
+
+    def scan(self, message: Union[str, ProcessedMessage]) -> Tuple[Tuple[str, bool], ...]:
+        """
+        Run the patterns over a message once.
+
+        The result is memoized on a ``ProcessedMessage``, so the
+        pre-classification, the cascade and the multi-intent check share
+        one pass over the patterns.
+
+        Returns:
+            Tuple[Tuple[str, bool], ...]: (intent, first matching pattern is anchored) per matching intent, in pattern order
+        """
+        # Keyed by pattern set: tenants may have their own rules
+        return ProcessedMessage.of(message).derive(f"rule_matches:{id(self.intent_patterns)}", self._scan)
+
+    def matches(self, message: Union[str, ProcessedMessage]) -> List[str]:
+        """
+        All intents with at least one matching pattern, in pattern order.
+        """
+        return [intent for intent, _ in self.scan(message)]
+
+    def score(self, message: Union[str, ProcessedMessage]) -> ClassificationResult:
+        scanned = self.scan(message)
+        matched = [intent for intent, _ in scanned]
+        anchored = bool(scanned) and scanned[0][1]
+
+        if not matched:
+            return ClassificationResult("other", 0.0, self.name)
+        if len(matched) == 1:
+            return ClassificationResult(matched[0], ANCHORED_CONFIDENCE if anchored else SINGLE_MATCH_CONFIDENCE, self.name)
+
+        confidence = max(MIN_AMBIGUOUS_CONFIDENCE, SINGLE_MATCH_CONFIDENCE - 0.2 * (len(matched) - 1))
+        return ClassificationResult(matched[0], confidence, self.name)
+
+    async def classify(self, message: Union[str, ProcessedMessage]) -> ClassificationResult:
+        return self.score(message)
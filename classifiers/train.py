@@ -0,0 +1,61 @@
+"""
+Train the local intent model from labelled logs.
+
+Usage:
+    python -m classifiers.train labelled.jsonl data/intent_model.bin
+
+The input is JSONL with one labelled message per line, by default
+``{"content": "...", "intent": "..."}``. A random holdout split is used to
+report accuracy and to calibrate confidences.
+"""
+
+import argparse
+import json
+import logging
+import random
+from typing import List, Optional
+
+from classifiers.local_model import DEFAULT_N_FEATURES, load_labelled_jsonl, train_naive_bayes
+
+logger = logging.getLogger(__name__)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Train the local hashed n-gram intent classifier")
+    parser.add_argument("input", help="Labelled JSONL file")
+    parser.add_argument("output", help="Where to write the model file")
+    parser.add_argument("--text-field", default="content")
+    parser.add_argument("--label-field", default="intent")
+    parser.add_argument("--n-features", type=int, default=DEFAULT_N_FEATURES)
+    parser.add_argument("--alpha", type=float, default=0.1, help="Additive smoothing")
+    parser.add_argument("--holdout", type=float, default=0.1, help="Fraction held out for calibration")
+    parser.add_argument("--seed", type=int, default=13)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    examples = list(load_labelled_jsonl(args.input, args.text_field, args.label_field))
+    random.Random(args.seed).shuffle(examples)
+    split = int(len(examples) * (1 - args.holdout))
+    train, holdout = examples[:split], examples[split:]
+    logger.info(f"Training on {len(train)} examples, holding out {len(holdout)}")
+
+    model = train_naive_bayes(
+        [text for text, _ in train],
+        [label for _, label in train],
+        n_features=args.n_features,
+        alpha=args.alpha,
+        holdout_messages=[text for text, _ in holdout],
+        holdout_labels=[label for _, label in holdout],
+    )
+    model.save(args.output)
+
+    summary = {"classes": model.classes, "temperature": round(model.temperature, 3), "examples": len(examples)}
+    if holdout:
+        predictions = model.predict([text for text, _ in holdout])
+        correct = sum(1 for (predicted, _), (_, label) in zip(predictions, holdout) if predicted == label)
+        summary["holdout_accuracy"] = round(correct / len(holdout), 4)
+    print(json.dumps(summary))
+
+
+if __name__ == "__main__":
+    main()
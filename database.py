@@ -1,22 +1,224 @@
-from sqlalchemy import create_engine
+from sqlalchemy import MetaData, create_engine, event, inspect
+from sqlalchemy.schema import CreateTable
 from sqlalchemy.orm import declarative_base
 from sqlalchemy.orm import sessionmaker
+import asyncio
+import logging
 import os
+import queue
+import threading
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # Database URL (use environment variable or default to SQLite)
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./chat_support.db")
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
+
+# Tuned SQLite profile (WAL, relaxed fsync, mmap) unless explicitly disabled
+SQLITE_TUNED = IS_SQLITE and os.getenv("SQLITE_TUNED", "true").lower() not in ("0", "false", "no")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+def _engine_connect_args(url: str) -> dict:
+    if not url.startswith("sqlite"):
+        return {}
+    return {"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000}
+
+def apply_sqlite_profile(bind):
+    """
+    Apply the tuned SQLite pragmas to every new connection of an engine.
+
+    WAL lets readers proceed while a write is in progress, and
+    ``synchronous=NORMAL`` only fsyncs at checkpoints instead of on every
+    commit (still durable against application crashes in WAL mode).
+    """
+    @event.listens_for(bind, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.close()
 
 # Create SQLAlchemy engine
-engine = create_engine(
-    DATABASE_URL, connect_args={"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}
-)
+engine = create_engine(DATABASE_URL, connect_args=_engine_connect_args(DATABASE_URL))
+if SQLITE_TUNED:
+    apply_sqlite_profile(engine)
 
 # Create SessionLocal class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 # Create Base class
 Base = declarative_base()
+
+def _enable_autoincrement(bind, table):
+    """
+    Rebuild a SQLite table created without AUTOINCREMENT.
+
+    SQLite cannot add AUTOINCREMENT to an existing table, so the rows are
+    copied into a new table which then takes the old one's name. Indexes
+    are recreated by the caller.
+    """
+    staging = table.to_metadata(MetaData(), name=f"{table.name}__rebuild")
+    columns = ", ".join(column.name for column in table.columns)
+    with bind.begin() as conn:
+        conn.execute(CreateTable(staging))
+        conn.exec_driver_sql(f"INSERT INTO {staging.name} ({columns}) SELECT {columns} FROM {table.name}")
+        conn.exec_driver_sql(f"DROP TABLE {table.name}")
+        conn.exec_driver_sql(f"ALTER TABLE {staging.name} RENAME TO {table.name}")
+    logger.info(f"Rebuilt {table.name} with AUTOINCREMENT ids")
+
+def ensure_schema(bind=None):
+    """
+    Create missing tables, columns and indexes.
+
+    ``create_all`` only creates columns and indexes together with new tables,
+    so nullable columns and indexes added to existing models are created here
+    for databases that predate them. SQLite tables that now ask for
+    AUTOINCREMENT ids are rebuilt with it.
+    """
+    bind = bind or engine
+    Base.metadata.create_all(bind=bind)
+
+    if bind.dialect.name == "sqlite":
+        with bind.connect() as conn:
+            autoincrement = {row[0] for row in conn.exec_driver_sql(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND sql LIKE '%AUTOINCREMENT%'"
+            )}
+        for table in Base.metadata.sorted_tables:
+            if table.dialect_options["sqlite"]["autoincrement"] and table.name not in autoincrement:
+                _enable_autoincrement(bind, table)
+
+    inspector = inspect(bind)
+    for table in Base.metadata.sorted_tables:
+        columns = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in columns and column.nullable:
+                column_type = column.type.compile(dialect=bind.dialect)
+                with bind.begin() as conn:
+                    conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}")
+                logger.info(f"Added column {table.name}.{column.name}")
+
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(bind=bind)
+
+class DatabaseWriter:
+    """
+    Runs all write jobs on one dedicated thread and connection.
+
+    SQLite allows a single writer at a time, so funnelling writes through one
+    thread avoids lock contention between requests. Jobs that queue up while a
+    transaction is running are committed together (group commit). Reads keep
+    using ordinary sessions from ``SessionLocal``.
+
+    A job is a callable taking a session. It runs inside the writer's
+    transaction and should return plain values or ORM objects that have been
+    flushed and refreshed; returned objects are detached after the commit.
+    """
+
+    def __init__(self, bind, max_batch: int = 64, enabled: bool = True):
+        self.session_factory = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=bind)
+        self.max_batch = max_batch
+        self.enabled = enabled
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._worker, name="db-writer", daemon=True)
+                self._thread.start()
+
+    async def run(self, job):
+        """
+        Run a write job and wait for it to be committed.
+
+        Args:
+            job: Callable receiving the writer session
+
+        Returns:
+            The job's return value
+        """
+        loop = asyncio.get_running_loop()
+        if not self.enabled:
+            return await loop.run_in_executor(None, self._run_single, job)
+
+        future = loop.create_future()
+        self._ensure_started()
+        self._queue.put((job, loop, future))
+        return await future
+
+    def _run_single(self, job):
+        session = self.session_factory()
+        try:
+            result = job(session)
+            session.commit()
+            session.expunge_all()
+            return result
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    @staticmethod
+    def _resolve(loop, future, result=None, error=None):
+        def settle():
+            if future.done():
+                return
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+        loop.call_soon_threadsafe(settle)
+
+    def _worker(self):
+        session = self.session_factory()
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                results = [job(session) for job, _, _ in batch]
+                session.commit()
+                session.expunge_all()
+                for (_, loop, future), result in zip(batch, results):
+                    self._resolve(loop, future, result)
+                continue
+            except Exception as e:
+                session.rollback()
+                if len(batch) == 1:
+                    _, loop, future = batch[0]
+                    self._resolve(loop, future, error=e)
+                    continue
+
+            # Retry jobs one by one so a single failure does not fail the group
+            for job, loop, future in batch:
+                try:
+                    result = job(session)
+                    session.commit()
+                    session.expunge_all()
+                    self._resolve(loop, future, result)
+                except Exception as e:
+                    session.rollback()
+                    self._resolve(loop, future, error=e)
+
+# Single writer shared by all requests
+db_writer = DatabaseWriter(engine, enabled=os.getenv("DB_WRITER_ENABLED", "true").lower() not in ("0", "false", "no"))
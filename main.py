@@ -1,23 +1,59 @@
-from fastapi import FastAPI, Request, Form, Depends, HTTPException
-from fastapi.responses import HTMLResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi import FastAPI, Request, Response, Form, Depends, Header, HTTPException, Query, WebSocket
+from fastapi.responses import HTMLResponse, PlainTextResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
+from starlette.background import BackgroundTask
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
+import asyncio
+import os
 import uvicorn
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
 
-from database import SessionLocal, engine, Base
+from database import SessionLocal, engine, ensure_schema, db_writer
 from models.chat import Message, Conversation
-from models.ticket import Ticket
+from models.ticket import Ticket, TicketReport
+from sharding import ShardRouter
 from agents.intent_classifier_agent import IntentClassifierAgent
 from agents.routing_agent import RoutingAgent
 from agents.support_agent import SupportAgent
 from agents.notify_agent import NotifyAgent
-from schemas.chat import MessageCreate, MessageResponse, ConversationResponse
-from schemas.ticket import TicketCreate, TicketResponse
+from schemas.chat import MessageBase, MessageCreate, MessageResponse, ConversationResponse
+from schemas.ticket import TicketCreate, TicketReportResponse, TicketResponse, TicketUpdate, TicketClaim
+from utils.admission import AdmissionController, AdmissionRejected, DEGRADABLE_INTENTS
+from utils.rate_limit import RateLimiter, RateLimitExceeded
+from utils.archive import ConversationArchive, reserve_archived_ids
+from utils.llm_gateway import get_llm_gateway
+from utils.idempotency import IdempotencyStore, IdempotencyConflict
+from utils.serialization import FastJSONResponse, MESSAGE_FIELDS, iter_json_object, message_to_dict
+from utils.http_cache import CachedStaticFiles, CompressionMiddleware, conditional_headers, is_not_modified, static_url
+from utils.pubsub import EventBroker
+from utils.search import SearchIndex
+from utils.ticket_queue import TicketQueue
+from utils.ticket_dedup import TicketDeduplicator
+from utils.analytics import AnalyticsCollector
+from utils.preprocessing import preprocess
+from utils.tenants import TenantRegistry, UnknownTenant
+from utils.compat import to_thread
+from utils.prompt_templates import check_budgets
+from utils.profiling import MemoryTracker, ProfileStore, ProfilingMiddleware, admin_token_valid
+from utils.export import MEDIA_TYPES as EXPORT_MEDIA_TYPES, ExportLimiter, conversation_query, export_conversations, export_tickets, release_after, stream_rows, ticket_query
 import logging
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+# Create database tables and indexes
+ensure_schema(engine)
+
+# Full-text indexes over messages and tickets, kept in sync by triggers
+search_index = SearchIndex(engine)
+search_index.ensure()
+
+# Conversation storage, spread over SHARD_URLS when set
+shards = ShardRouter.from_env()
+shards.ensure_schema()
+shard_search_indexes = [search_index if shard.engine is engine else SearchIndex(shard.engine) for shard in shards.shards]
+for shard_index in shard_search_indexes:
+    if shard_index is not search_index:
+        shard_index.ensure()
 
 # Initialize FastAPI app
 app = FastAPI(title="AI Multi-Agent Chat Support System")
@@ -26,11 +62,34 @@ app = FastAPI(title="AI Multi-Agent Chat Support System")
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Mount static files
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# Compress large text responses (brotli or gzip)
+app.add_middleware(CompressionMiddleware)
+
+# Request profiling; the middleware is only installed when enabled
+profile_store = ProfileStore()
+memory_tracker = MemoryTracker()
+if os.getenv("PROFILING_ENABLED", "false").lower() == "true":
+    app.add_middleware(ProfilingMiddleware, store=profile_store)
+
+# Bulk exports hold a connection while they stream, so only a few run at once
+export_limiter = ExportLimiter()
+
+# Mount static files; fingerprinted URLs are cached long-term
+app.mount("/static", CachedStaticFiles(directory="static"), name="static")
 
 # Configure templates
 templates = Jinja2Templates(directory="templates")
+templates.env.globals["static_url"] = static_url
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """
+    Admin and support-agent endpoints exist only when ADMIN_TOKEN is set
+    and the request carries it
+    """
+    if not os.getenv("ADMIN_TOKEN"):
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not admin_token_valid(x_admin_token):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
 
 # Dependency to get DB session
 def get_db():
@@ -46,127 +105,686 @@ router = RoutingAgent()
 support_agent = SupportAgent()
 notify_agent = NotifyAgent()
 
+# Per-brand content, compiled on first use and kept in a size-bounded LRU
+tenant_registry = TenantRegistry()
+
+# Admission control in front of the agent pipeline
+admission_controller = AdmissionController(
+    static_responses={intent: router.faq_agent.faqs.get(intent) for intent in DEGRADABLE_INTENTS}
+)
+
+# Per-IP and per-conversation rate limiting (None when disabled)
+rate_limiter = RateLimiter.from_env()
+
+# Histories longer than this are streamed as chunked JSON
+CONVERSATION_STREAM_THRESHOLD = int(os.getenv("CONVERSATION_STREAM_THRESHOLD", "1000"))
+
+# Duplicate request suppression (None when disabled)
+idempotency_store = IdempotencyStore.from_env()
+
+# Cold storage for conversations moved out of the hot tables
+conversation_archive = ConversationArchive()
+reserve_archived_ids(engine, conversation_archive)
+
+# Real-time events pushed to WebSocket clients
+event_broker = EventBroker.from_env()
+notify_agent.add_listener(lambda notification: event_broker.publish("notifications", {"type": "notification", "notification": notification}))
+
+# Per-minute and per-hour counts of intents, agents and notifications
+analytics = AnalyticsCollector(db_writer)
+notify_agent.add_listener(lambda notification: analytics.record("notification", notification["type"]))
+
+@app.on_event("startup")
+async def start_analytics():
+    await analytics.start()
+
+@app.on_event("shutdown")
+async def stop_analytics():
+    await analytics.stop()
+
+@app.on_event("startup")
+async def start_event_broker():
+    await event_broker.start()
+
+@app.on_event("shutdown")
+async def stop_event_broker():
+    await event_broker.stop()
+
+async def _on_sla_breach(db_ticket: Ticket):
+    """Alert support leads when a ticket misses its SLA"""
+    _publish_ticket("ticket_sla_breach", db_ticket)
+    await notify_agent.send_notification(
+        f"SLA breached for ticket #{db_ticket.id}: {db_ticket.subject}",
+        "support-leads",
+        "sla_breach"
+    )
+
+@app.on_event("shutdown")
+async def flush_notifications():
+    """Send notifications still held for a digest"""
+    await notify_agent.stop()
+
+# Work queue of open tickets with periodic SLA checks
+ticket_queue = TicketQueue(db_writer, SessionLocal, on_breach=_on_sla_breach)
+
+@app.on_event("startup")
+async def start_ticket_queue():
+    await ticket_queue.start()
+
+@app.on_event("shutdown")
+async def stop_ticket_queue():
+    await ticket_queue.stop()
+
+# Near-identical reports are attached to an active ticket (None when disabled)
+ticket_dedup = TicketDeduplicator.from_env(db_writer, SessionLocal)
+
+@app.on_event("startup")
+async def load_ticket_dedup():
+    if ticket_dedup:
+        await ticket_dedup.load()
+
+@app.on_event("startup")
+async def check_prompt_budgets():
+    """Warn about bloated prompt prefixes (the tokenizer may load files, so off the loop)"""
+    await to_thread(check_budgets)
+
+@app.on_event("shutdown")
+async def close_llm_gateway():
+    """Close pooled upstream connections"""
+    gateway = get_llm_gateway()
+    if gateway:
+        await gateway.aclose()
+
+def _add_message(session: Session, conversation_id: int, content: str, is_user: bool, **columns) -> Message:
+    db_message = Message(id=shards.new_id(), content=content, is_user=is_user, conversation_id=conversation_id, **columns)
+    session.add(db_message)
+    session.flush()
+    session.refresh(db_message)
+    return db_message
+
+async def _store_user_message(conversation_id: Optional[int], content: str) -> Tuple[int, Message]:
+    """Save the user's message on its conversation's shard, creating the conversation if needed"""
+    if conversation_id:
+        def append(session: Session) -> Optional[Message]:
+            if session.get(Conversation, conversation_id) is None:
+                return None
+            return _add_message(session, conversation_id, content, True)
+        
+        db_message = await shards.run_for_conversation(conversation_id, append)
+        if db_message is not None:
+            return conversation_id, db_message
+    
+    new_id = shards.new_id()
+    def create(session: Session) -> Tuple[int, Message]:
+        conversation = Conversation(id=new_id)
+        session.add(conversation)
+        session.flush()
+        return conversation.id, _add_message(session, conversation.id, content, True)
+    
+    shard = shards.owner(new_id) if new_id else shards.shards[0]
+    return await shard.writer.run(create)
+
+def _publish_message(db_message: Message) -> dict:
+    """Push a stored message to the conversation's subscribers"""
+    data = message_to_dict(db_message)
+    event_broker.publish(f"conversation:{db_message.conversation_id}", {"type": "message", **data})
+    return data
+
+async def _store_agent_message(conversation_id: int, content: str, intent: Optional[str] = None, agent: Optional[str] = None) -> Optional[Message]:
+    """Save an agent response with the intent and agent that produced it (None if the conversation does not exist)"""
+    def job(session: Session) -> Optional[Message]:
+        if session.get(Conversation, conversation_id) is None:
+            return None
+        return _add_message(session, conversation_id, content, False, intent=intent, agent=agent)
+    return await shards.run_for_conversation(conversation_id, job)
+
 @app.get("/", response_class=HTMLResponse)
 async def index(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
 
-@app.post("/api/chat")
-async def chat_endpoint(message: MessageCreate, db: Session = Depends(get_db)):
+@app.post("/api/chat", response_model=MessageResponse)
+async def chat_endpoint(
+    message: MessageCreate,
+    request: Request,
+    idempotency_key: Optional[str] = Header(None)
+):
+    """
+    Process chat messages, answering retried and double-submitted requests
+    (same Idempotency-Key, or same message content in an existing
+    conversation within a few seconds) with the stored response instead of
+    running the pipeline again
+    """
+    if not idempotency_store:
+        return FastJSONResponse(await _handle_chat(message, request))
+    
+    key, fingerprint, ttl = idempotency_store.key_for(
+        idempotency_key,
+        request.client.host if request.client else None,
+        message.conversation_id,
+        message.content,
+        message.tenant
+    )
+    if key is None:
+        return FastJSONResponse(await _handle_chat(message, request))
+    
+    try:
+        result, replayed = await idempotency_store.run(key, fingerprint, ttl, lambda: _handle_chat(message, request))
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return FastJSONResponse(result, headers={"Idempotent-Replayed": "true"} if replayed else None)
+
+async def _handle_chat(message: MessageCreate, request: Request):
     """
     Process chat messages through the multi-agent system
     
-    1. Classify the intent of the message
-    2. Route to the appropriate agent
-    3. Generate a response
+    1. Classify the intents of the message
+    2. Route to the appropriate agents
+    3. Generate a response, merging answers for multi-topic messages
     4. Notify if needed
     5. Return the response
     """
+    if rate_limiter:
+        try:
+            await rate_limiter.acheck(
+                client_ip=rate_limiter.client_ip(request.client.host if request.client else None, request.headers.get("x-forwarded-for")),
+                conversation_id=message.conversation_id
+            )
+        except RateLimitExceeded as e:
+            logger.warning(f"Rate limit exceeded ({e.scope}) for conversation {message.conversation_id}")
+            raise HTTPException(
+                status_code=429,
+                detail="Too many messages. Please slow down.",
+                headers={"Retry-After": e.retry_after_header}
+            )
+    
+    tenant = None
+    if message.tenant:
+        try:
+            tenant = await tenant_registry.aget(message.tenant)
+        except UnknownTenant:
+            raise HTTPException(status_code=404, detail=f"Unknown tenant '{message.tenant}'")
+        except ValueError as e:
+            logger.error(str(e))
+            raise HTTPException(status_code=503, detail=f"Content for tenant '{message.tenant}' is unavailable")
+    
     try:
         logger.info(f"Received message: {message.content}")
         
-        # Create or get conversation
-        conversation = db.query(Conversation).filter(
-            Conversation.id == message.conversation_id
-        ).first() if message.conversation_id else None
+        # Normalized, folded and tokenized once for every agent below
+        processed = preprocess(message.content)
         
-        if not conversation:
-            conversation = Conversation()
-            db.add(conversation)
-            db.commit()
-            db.refresh(conversation)
-        
-        # Save user message
-        user_message = Message(
-            content=message.content,
-            is_user=True,
-            conversation_id=conversation.id
-        )
-        db.add(user_message)
-        db.commit()
+        # Cheap pre-classification drives admission priority
+        pre_intent = intent_classifier._classify_with_rules(processed, tenant)
         
-        # Process with agent system
-        intent = await intent_classifier.process(message.content)
-        logger.info(f"Classified intent: {intent}")
+        # Under saturation, answer low-value intents from the static cache
+        cached_response = admission_controller.degraded_response(pre_intent)
+        if cached_response is not None and tenant is not None and tenant.faqs is not None:
+            cached_response = tenant.faqs.get(pre_intent, cached_response)
+        if cached_response is not None:
+            logger.info(f"Pipeline saturated, serving cached '{pre_intent}' response")
+            conversation_id, user_message = await _store_user_message(message.conversation_id, message.content)
+            _publish_message(user_message)
+            agent_message = await _store_agent_message(conversation_id, cached_response, pre_intent, "Static Cache")
+            analytics.record("intent", pre_intent)
+            analytics.record("agent", "Static Cache")
+            return _publish_message(agent_message)
         
-        target_agent = await router.route(intent, message.content)
-        logger.info(f"Routed to agent: {target_agent.__class__.__name__}")
+        async with admission_controller.admit(pre_intent):
+            # Create or get conversation and save the user message
+            conversation_id, user_message = await _store_user_message(message.conversation_id, message.content)
+            _publish_message(user_message)
+            
+            # Process with agent system
+            intents = await intent_classifier.classify_multi(processed, tenant=tenant)
+            intent = intents[0]
+            logger.info(f"Classified intents: {intents}")
+            
+            # Multi-topic messages fan out to several agents concurrently
+            routes = await router.route_multi(intents, processed)
+            logger.info(f"Routed to agents: {[agent.__class__.__name__ for _, agent in routes]}")
+            
+            response_content = await support_agent.generate_multi_response(routes, processed, tenant=tenant)
+            logger.info(f"Generated response: {response_content}")
+            
+            # Save agent response
+            agent_names = [agent.name for _, agent in routes]
+            agent_message = await _store_agent_message(conversation_id, response_content, intent, ",".join(agent_names)[:100])
+            for turn_intent in intents:
+                analytics.record("intent", turn_intent)
+            for agent_name in agent_names:
+                analytics.record("agent", agent_name)
+            
+            # Notify if needed (asynchronously without waiting)
+            notify_intent = next((i for i in intents if i in ["complaint", "urgent"]), None)
+            if notify_intent:
+                await notify_agent.send_notification(
+                    message.content,
+                    notification_type=notify_intent
+                )
         
-        response_content = await support_agent.generate_response(target_agent, message.content, intent)
-        logger.info(f"Generated response: {response_content}")
-        
-        # Save agent response
-        agent_message = Message(
-            content=response_content,
-            is_user=False,
-            conversation_id=conversation.id
-        )
-        db.add(agent_message)
-        db.commit()
-        db.refresh(agent_message)
-        
-        # Notify if needed (asynchronously without waiting)
-        if intent in ["complaint", "urgent"]:
-            await notify_agent.send_notification(
-                message.content, 
-                response_content,
-                intent
-            )
-        
-        return MessageResponse(
-            id=agent_message.id,
-            content=agent_message.content,
-            conversation_id=conversation.id,
-            timestamp=agent_message.timestamp,
-            is_user=False
-        )
+        return _publish_message(agent_message)
     
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=503,
+            detail="The support system is busy. Please try again shortly.",
+            headers={"Retry-After": str(e.retry_after)}
+        )
     except Exception as e:
         logger.error(f"Error processing message: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Error processing message: {str(e)}")
 
+def _publish_ticket(event_type: str, db_ticket: Ticket):
+    """Push a ticket change to the ticket dashboards"""
+    event_broker.publish("tickets", {
+        "type": event_type,
+        "ticket": TicketResponse.model_validate(db_ticket, from_attributes=True).model_dump(mode="json")
+    })
+
 @app.post("/api/tickets", response_model=TicketResponse)
-async def create_ticket(ticket: TicketCreate, db: Session = Depends(get_db)):
-    """Create a new support ticket"""
-    db_ticket = Ticket(
-        subject=ticket.subject,
-        description=ticket.description,
-        priority=ticket.priority,
-        status="open"
-    )
-    db.add(db_ticket)
-    db.commit()
-    db.refresh(db_ticket)
+async def create_ticket(ticket: TicketCreate):
+    """Create a new support ticket, or attach the report to a near-identical active one"""
+    signature = identifiers = None
+    if ticket_dedup:
+        signature = ticket_dedup.signature(ticket.subject, ticket.description)
+        identifiers = ticket_dedup.identifiers(ticket.subject, ticket.description)
+        attached = await ticket_dedup.attach(ticket, signature, identifiers)
+        if attached:
+            db_ticket, _ = attached
+            # Requeue in case the report raised its priority
+            ticket_queue.discard(db_ticket.id)
+            ticket_queue.add(db_ticket)
+            _publish_ticket("ticket_duplicate", db_ticket)
+            return db_ticket
+    
+    def job(session: Session) -> Ticket:
+        db_ticket = Ticket(
+            subject=ticket.subject,
+            description=ticket.description,
+            priority=ticket.priority,
+            status="open"
+        )
+        session.add(db_ticket)
+        session.flush()
+        if signature is not None:
+            session.add(ticket_dedup.signature_row(db_ticket.id, signature, identifiers))
+            session.flush()
+        session.refresh(db_ticket)
+        return db_ticket
+    
+    db_ticket = await db_writer.run(job)
+    ticket_queue.add(db_ticket)
+    if ticket_dedup:
+        ticket_dedup.track(db_ticket, signature, identifiers)
+    _publish_ticket("ticket_created", db_ticket)
     
     # Notify about new ticket
     await notify_agent.send_notification(
-        f"New ticket created: {ticket.subject}",
-        ticket.description,
-        "ticket_created"
+        f"New ticket #{db_ticket.id}: {ticket.subject}",
+        notification_type="ticket_created"
     )
     
     return db_ticket
 
+@app.patch("/api/tickets/{ticket_id}", response_model=TicketResponse, dependencies=[Depends(require_admin)])
+async def update_ticket(ticket_id: int, update: TicketUpdate):
+    """Change a ticket's status"""
+    def job(session: Session) -> Optional[Ticket]:
+        db_ticket = session.get(Ticket, ticket_id)
+        if db_ticket is None:
+            return None
+        db_ticket.status = update.status
+        if update.status == "open":
+            # Reopened tickets go back to the queue
+            db_ticket.assigned_to = None
+            db_ticket.claimed_at = None
+        session.flush()
+        session.refresh(db_ticket)
+        return db_ticket
+    
+    db_ticket = await db_writer.run(job)
+    if db_ticket is None:
+        raise HTTPException(status_code=404, detail="Ticket not found")
+    ticket_queue.add(db_ticket)
+    if ticket_dedup:
+        ticket_dedup.track(db_ticket)
+    _publish_ticket("ticket_status", db_ticket)
+    return db_ticket
+
+@app.get("/api/tickets/{ticket_id}/reports", response_model=List[TicketReportResponse], dependencies=[Depends(require_admin)])
+def ticket_reports(ticket_id: int, db: Session = Depends(get_db)):
+    """Reports attached to a ticket as near-duplicates, oldest first"""
+    if db.get(Ticket, ticket_id) is None:
+        raise HTTPException(status_code=404, detail="Ticket not found")
+    return db.query(TicketReport).filter(TicketReport.ticket_id == ticket_id).order_by(TicketReport.id).all()
+
+@app.post("/api/tickets/claim", response_model=TicketResponse, responses={204: {"description": "No open tickets"}}, dependencies=[Depends(require_admin)])
+async def claim_ticket(claim: TicketClaim):
+    """Assign the next ticket in the queue to a support agent"""
+    db_ticket = await ticket_queue.claim_next(claim.worker)
+    if db_ticket is None:
+        return Response(status_code=204)
+    _publish_ticket("ticket_status", db_ticket)
+    return db_ticket
+
+@app.get("/api/tickets/queue", dependencies=[Depends(require_admin)])
+def ticket_queue_view(limit: int = Query(20, ge=1, le=100), db: Session = Depends(get_db)):
+    """Next tickets to be claimed, in order, with scheduler counters"""
+    ticket_ids = ticket_queue.peek(limit)
+    tickets = {ticket.id: ticket for ticket in db.query(Ticket).filter(Ticket.id.in_(ticket_ids))}
+    return {
+        "tickets": [TicketResponse.model_validate(tickets[ticket_id]) for ticket_id in ticket_ids if ticket_id in tickets],
+        **ticket_queue.stats(),
+        "dedup": ticket_dedup.stats() if ticket_dedup else None
+    }
+
+@app.post("/api/conversations/{conversation_id}/messages", response_model=MessageResponse, dependencies=[Depends(require_admin)])
+async def post_agent_reply(conversation_id: int, reply: MessageBase):
+    """Add a reply from a human support agent and push it to the customer"""
+    agent_message = await _store_agent_message(conversation_id, reply.content, agent="Human Agent")
+    if agent_message is None:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    analytics.record("agent", "Human Agent")
+    return FastJSONResponse(_publish_message(agent_message))
+
+async def _forward_events(websocket: WebSocket, topics: Tuple[str, ...]):
+    """Send events on the given topics to a WebSocket until it disconnects"""
+    await websocket.accept()
+    subscriptions = [event_broker.subscribe(topic) for topic in topics]
+    
+    async def pump(subscription):
+        async for payload in subscription:
+            await websocket.send_text(payload)
+    
+    pumps = [asyncio.create_task(pump(subscription)) for subscription in subscriptions]
+    try:
+        # Clients only listen; reading is how a disconnect is noticed
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+    finally:
+        for task in pumps:
+            task.cancel()
+        for subscription in subscriptions:
+            subscription.close()
+
+@app.websocket("/ws/conversations/{conversation_id}")
+async def conversation_events(websocket: WebSocket, conversation_id: int):
+    """New messages in a conversation"""
+    await _forward_events(websocket, (f"conversation:{conversation_id}",))
+
+@app.websocket("/ws/tickets")
+async def ticket_events(websocket: WebSocket, token: Optional[str] = None):
+    """
+    Ticket changes and notifications, for support dashboards
+    
+    Carries customer messages, so the admin token is required, in the
+    X-Admin-Token header or (for browsers) the ``token`` query parameter.
+    """
+    if not admin_token_valid(websocket.headers.get("x-admin-token") or token):
+        # Closing before accept rejects the handshake with 403
+        await websocket.close(code=1008)
+        return
+    await _forward_events(websocket, ("tickets", "notifications"))
+
+def _search_shards(q: str, limit: int, offset: int) -> dict:
+    """Search messages on every shard and merge the ranked results"""
+    def search_shard(shard):
+        with shard.session_factory() as shard_db:
+            return shard_search_indexes[shard.index].search(shard_db, q, "messages", offset + limit, 0)
+    
+    pages = shards.scatter(search_shard)
+    results = sorted((result for page in pages for result in page["results"]), key=lambda result: result.get("score", 0))
+    return {
+        "results": results[offset:offset + limit],
+        "has_more": len(results) > offset + limit or any(page["has_more"] for page in pages),
+        "truncated": any(page["truncated"] for page in pages)
+    }
+
+@app.get("/api/search", dependencies=[Depends(require_admin)])
+def search(
+    q: str = Query(..., min_length=1, max_length=200),
+    type: str = Query("messages", pattern="^(messages|tickets)$"),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0, le=10000),
+    db: Session = Depends(get_db)
+):
+    """
+    Search messages or tickets by content, best matches first
+    
+    Only the newest SEARCH_RANK_WINDOW matches are ranked and paged;
+    ``truncated`` is true when older matches exist beyond them.
+    """
+    if type == "messages" and shards.sharded:
+        page = _search_shards(q, limit, offset)
+    else:
+        page = search_index.search(db, q, type, limit, offset)
+    return FastJSONResponse({"query": q, "type": type, "limit": limit, "offset": offset, **page})
+
+@app.get("/api/analytics", dependencies=[Depends(require_admin)])
+def analytics_view(
+    granularity: str = Query("hour", pattern="^(minute|hour)$"),
+    hours: int = Query(24, ge=1, le=24 * 90),
+    dimension: Optional[str] = Query(None, pattern="^(intent|agent|notification)$"),
+    db: Session = Depends(get_db)
+):
+    """Counts of intents, agents and notifications per time bucket, read from the rollups"""
+    until = datetime.utcnow()
+    since = until - timedelta(hours=hours)
+    return FastJSONResponse(analytics.query(db, granularity, since, until, dimension))
+
+@app.get("/api/admin/shards", dependencies=[Depends(require_admin)])
+def shard_overview(limit: int = Query(20, ge=1, le=100)):
+    """Per-shard counts and the newest conversations across all shards"""
+    return FastJSONResponse({
+        "shards": shards.stats(),
+        "recent_conversations": shards.recent_conversations(limit)
+    })
+
+@app.get("/api/admin/admission", dependencies=[Depends(require_admin)])
+async def admission_stats():
+    """Chat pipeline load, queue length and per-intent admission counters"""
+    return admission_controller.stats()
+
+@app.get("/api/admin/profiles", dependencies=[Depends(require_admin)])
+def list_profiles():
+    """Recently stored request and worker profiles"""
+    return {"profiles": profile_store.summaries()}
+
+@app.get("/api/admin/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+def get_profile(profile_id: int):
+    """A profile's stacks in flamegraph folded format"""
+    profile = profile_store.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(profile["folded"] + "\n")
+
+@app.post("/api/admin/profile", dependencies=[Depends(require_admin)])
+async def profile_worker(seconds: float = Query(5, gt=0, le=60)):
+    """Sample every thread of this worker for a few seconds"""
+    sampler = profile_store.begin()
+    if sampler is None:
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        profile = profile_store.end(sampler, method="WORKER", path="*", duration_ms=seconds * 1000)
+    return {key: value for key, value in profile.items() if key != "folded"}
+
+@app.post("/api/admin/memory/snapshot", dependencies=[Depends(require_admin)])
+def memory_snapshot():
+    """Take a tracemalloc snapshot (tracing starts with the first one)"""
+    return memory_tracker.snapshot()
+
+@app.get("/api/admin/memory/diff", dependencies=[Depends(require_admin)])
+def memory_diff(
+    limit: int = Query(20, ge=1, le=200),
+    group_by: str = Query("lineno", pattern="^(lineno|filename|traceback)$")
+):
+    """Allocation growth between the last two snapshots"""
+    return {"stats": memory_tracker.diff(limit, group_by)}
+
+@app.delete("/api/admin/memory", dependencies=[Depends(require_admin)])
+def memory_stop():
+    """Stop tracemalloc and drop the snapshots"""
+    memory_tracker.stop()
+    return {"tracing": False}
+
+@app.get("/api/notifications/stats", dependencies=[Depends(require_admin)])
+async def notification_stats():
+    """Notifications received and sends saved by digest batching"""
+    return notify_agent.digest_stats()
+
+@app.get("/api/tenants/stats", dependencies=[Depends(require_admin)])
+async def tenant_stats():
+    """Tenant content cache usage"""
+    return tenant_registry.stats()
+
+@app.get("/api/classifier/stats", dependencies=[Depends(require_admin)])
+async def classifier_stats():
+    """Per-stage hit rates of the intent classifier cascade"""
+    return intent_classifier.cascade_stats()
+
+def _export_response(kind: str, format: str, chunks, release) -> StreamingResponse:
+    """
+    Stream an export as a download.
+
+    The slot is released when the stream ends, fails or is abandoned; the
+    background task covers a client that disconnects before the first chunk.
+    """
+    filename = f"{kind}-{datetime.utcnow():%Y%m%dT%H%M%SZ}.{format}"
+    return StreamingResponse(
+        release_after(chunks, release),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+        background=BackgroundTask(release)
+    )
+
+def _export_slot():
+    release = export_limiter.acquire()
+    if release is None:
+        raise HTTPException(status_code=429, detail="Too many exports running", headers={"Retry-After": "30"})
+    return release
+
+@app.get("/api/export/conversations", dependencies=[Depends(require_admin)])
+async def export_conversation_data(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    since: Optional[datetime] = Query(None, description="Only conversations created at or after this time"),
+    until: Optional[datetime] = Query(None, description="Only conversations created before this time")
+):
+    """
+    Stream conversations with their messages, from every shard.
+    
+    NDJSON has one conversation per line with its messages nested; CSV has
+    one row per message. Rows are read through server-side cursors and
+    encoded in the threadpool chunk by chunk, so memory stays flat however
+    large the export is. Responses are compressed when the client accepts it.
+    """
+    release = _export_slot()
+    rows = stream_rows([shard.session_factory for shard in shards.shards], conversation_query(since, until))
+    return _export_response("conversations", format, export_conversations(rows, format), release)
+
+@app.get("/api/export/tickets", dependencies=[Depends(require_admin)])
+async def export_ticket_data(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    since: Optional[datetime] = Query(None, description="Only tickets created at or after this time"),
+    until: Optional[datetime] = Query(None, description="Only tickets created before this time"),
+    status: Optional[str] = Query(None, pattern="^(open|in_progress|resolved|closed)$")
+):
+    """Stream tickets, one per line (NDJSON) or row (CSV), oldest first"""
+    release = _export_slot()
+    rows = stream_rows([SessionLocal], ticket_query(since, until, status))
+    return _export_response("tickets", format, export_tickets(rows, format), release)
+
+@app.get("/api/export/stats", dependencies=[Depends(require_admin)])
+async def export_stats():
+    """Exports running, started and turned away"""
+    return export_limiter.stats()
+
+# Message columns selected for conversation reads (no ORM objects built)
+_MESSAGE_COLUMNS = (Message.id, Message.content, Message.conversation_id, Message.timestamp, Message.is_user)
+
+def _stream_conversation_messages(bind, conversation_id: int, last_message_id: int):
+    """Yield a long history's messages in batches from a dedicated session"""
+    db = Session(bind=bind)
+    try:
+        result = db.execute(
+            select(*_MESSAGE_COLUMNS)
+            .where(Message.conversation_id == conversation_id, Message.id <= last_message_id)
+            .order_by(Message.id)
+            .execution_options(yield_per=500)
+        )
+        for row in result.mappings():
+            yield dict(row)
+    finally:
+        db.close()
+
+def get_conversation_db(conversation_id: int):
+    """Session on the shard holding a conversation (the primary if no shard has it)"""
+    shard = shards.locate(conversation_id) if shards.sharded else None
+    db = shard.session_factory() if shard else SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
 @app.get("/api/conversations/{conversation_id}", response_model=ConversationResponse)
-async def get_conversation(conversation_id: int, db: Session = Depends(get_db)):
-    """Get all messages in a conversation"""
+def get_conversation(conversation_id: int, request: Request, db: Session = Depends(get_conversation_db)):
+    """
+    Get all messages in a conversation
+    
+    Declared sync so the blocking reads run in the threadpool rather than
+    stalling the event loop while waiting for a pooled connection. Rows are
+    encoded straight to JSON, and long histories are streamed.
+    
+    Messages are only ever appended, so the message count and last message
+    id identify the history's version: they make up the ETag, and conditional
+    requests for an unchanged conversation get 304 Not Modified without
+    reading any rows. Snowflake ids from different nodes are not strictly
+    increasing, so the id alone could miss a new message.
+    """
     conversation = db.query(Conversation).filter(Conversation.id == conversation_id).first()
     if not conversation:
-        raise HTTPException(status_code=404, detail="Conversation not found")
+        # Fall back to the archive for conversations moved out of the hot tables
+        archived = conversation_archive.get(conversation_id)
+        if archived is None:
+            raise HTTPException(status_code=404, detail="Conversation not found")
+        messages = archived["messages"]
+        etag = f'"a{archived["id"]}-{messages[-1]["id"] if messages else 0}"'
+        last_modified = datetime.fromisoformat(messages[-1]["timestamp"] if messages else archived["created_at"])
+        headers = conditional_headers(etag, last_modified)
+        if is_not_modified(request.headers, etag, last_modified):
+            return Response(status_code=304, headers=headers)
+        return FastJSONResponse({
+            "id": archived["id"],
+            "messages": [{field: msg[field] for field in MESSAGE_FIELDS} for msg in messages],
+            "created_at": archived["created_at"]
+        }, headers=headers)
     
-    messages = db.query(Message).filter(Message.conversation_id == conversation_id).all()
-    return ConversationResponse(
-        id=conversation.id,
-        messages=[
-            MessageResponse(
-                id=msg.id,
-                content=msg.content,
-                conversation_id=msg.conversation_id,
-                timestamp=msg.timestamp,
-                is_user=msg.is_user
-            ) for msg in messages
-        ],
-        created_at=conversation.created_at
-    )
+    message_count, last_message_id, last_timestamp = db.execute(
+        select(func.count(), func.max(Message.id), func.max(Message.timestamp))
+        .where(Message.conversation_id == conversation_id)
+    ).one()
+    etag = f'"c{conversation.id}-{message_count}-{last_message_id or 0}"'
+    last_modified = last_timestamp or conversation.created_at
+    headers = conditional_headers(etag, last_modified)
+    if is_not_modified(request.headers, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+    
+    head = {"id": conversation.id, "created_at": conversation.created_at}
+    if message_count > CONVERSATION_STREAM_THRESHOLD:
+        return StreamingResponse(
+            iter_json_object(head, "messages", _stream_conversation_messages(db.get_bind(), conversation_id, last_message_id)),
+            media_type="application/json",
+            headers=headers
+        )
+    
+    # Bounded by the last id so the body matches the ETag
+    rows = db.execute(
+        select(*_MESSAGE_COLUMNS)
+        .where(Message.conversation_id == conversation_id, Message.id <= (last_message_id or 0))
+        .order_by(Message.id)
+    ).mappings()
+    return FastJSONResponse({**head, "messages": [dict(row) for row in rows]}, headers=headers)
 
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
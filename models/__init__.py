@@ -1,2 +1,3 @@
 from models.chat import Conversation, Message
-from models.ticket import Ticket
+from models.ticket import Ticket, TicketReport, TicketSignature
+from models.analytics import AnalyticsRollup
@@ -0,0 +1,15 @@
+from sqlalchemy import Column, Integer, String, DateTime
+from database import Base
+
+class AnalyticsRollup(Base):
+    __tablename__ = "analytics_rollups"
+    
+    # One counter per time bucket, e.g. ("hour", 2024-05-01 13:00, "intent", "faq")
+    granularity = Column(String(10), primary_key=True)
+    bucket_start = Column(DateTime, primary_key=True)
+    dimension = Column(String(20), primary_key=True)
+    key = Column(String(100), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f"<AnalyticsRollup({self.granularity} {self.bucket_start} {self.dimension}={self.key}: {self.count})>"
@@ -12,6 +12,9 @@ class Conversation(Base):
     
     messages = relationship("Message", back_populates="conversation", cascade="all, delete-orphan")
     
+    # Never reuse the id of a deleted (archived) conversation on SQLite
+    __table_args__ = {"sqlite_autoincrement": True}
+    
     def __repr__(self):
         return f"<Conversation(id={self.id})>"
 
@@ -22,7 +25,10 @@ class Message(Base):
     content = Column(Text, nullable=False)
     is_user = Column(Boolean, default=True)  # True for user, False for AI
     timestamp = Column(DateTime(timezone=True), server_default=func.now())
-    conversation_id = Column(Integer, ForeignKey("conversations.id"))
+    conversation_id = Column(Integer, ForeignKey("conversations.id"), index=True)
+    # Classified intent and handling agent(s), recorded on agent responses
+    intent = Column(String(50), nullable=True)
+    agent = Column(String(100), nullable=True)
     
     conversation = relationship("Conversation", back_populates="messages")
     
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Enum
+from sqlalchemy import Column, Integer, String, Text, DateTime, Enum, Index, ForeignKey, LargeBinary
 from sqlalchemy.sql import func
 from database import Base
 
@@ -12,6 +12,36 @@ class Ticket(Base):
     priority = Column(Enum("low", "medium", "high", "urgent", name="ticket_priority"), default="medium")
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    assigned_to = Column(String(100), nullable=True)
+    claimed_at = Column(DateTime(timezone=True), nullable=True)
+    sla_breached_at = Column(DateTime(timezone=True), nullable=True)
+    # Near-identical reports attached to this ticket instead of opening new ones
+    duplicate_count = Column(Integer, nullable=True, default=0)
+    
+    __table_args__ = (
+        # Open tickets by priority, oldest first, without scanning the table
+        Index("ix_tickets_status_priority_created", "status", "priority", "created_at"),
+    )
     
     def __repr__(self):
         return f"<Ticket(id={self.id}, subject='{self.subject}', status='{self.status}')>"
+
+class TicketSignature(Base):
+    """MinHash signature of a ticket's text, for near-duplicate detection"""
+    __tablename__ = "ticket_signatures"
+    
+    ticket_id = Column(Integer, ForeignKey("tickets.id", ondelete="CASCADE"), primary_key=True)
+    signature = Column(LargeBinary, nullable=False)
+    # Space-separated identifier tokens (order numbers, ids), left out of the signature
+    identifiers = Column(Text, nullable=True)
+
+class TicketReport(Base):
+    """A near-identical report attached to an existing ticket, kept as submitted"""
+    __tablename__ = "ticket_reports"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    ticket_id = Column(Integer, ForeignKey("tickets.id", ondelete="CASCADE"), nullable=False, index=True)
+    subject = Column(String(100), nullable=False)
+    description = Column(Text, nullable=False)
+    priority = Column(Enum("low", "medium", "high", "urgent", name="ticket_priority"), default="medium")
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
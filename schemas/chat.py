@@ -1,12 +1,15 @@
 from pydantic import BaseModel, Field
 from typing import List, Optional
 from datetime import datetime
+from utils.tenants import TENANT_KEY_PATTERN
 
 class MessageBase(BaseModel):
     content: str = Field(..., min_length=1)
 
 class MessageCreate(MessageBase):
     conversation_id: Optional[int] = None
+    # Brand whose FAQs, templates and rules apply (None for the global content)
+    tenant: Optional[str] = Field(None, pattern=TENANT_KEY_PATTERN)
 
 class MessageResponse(MessageBase):
     id: int
@@ -10,11 +10,32 @@ class TicketBase(BaseModel):
 class TicketCreate(TicketBase):
     pass
 
+class TicketUpdate(BaseModel):
+    status: str = Field(..., pattern="^(open|in_progress|resolved|closed)$")
+
+class TicketClaim(BaseModel):
+    worker: str = Field(..., min_length=1, max_length=100)
+
 class TicketResponse(TicketBase):
     id: int
     status: str
     created_at: datetime
     updated_at: Optional[datetime] = None
+    assigned_to: Optional[str] = None
+    claimed_at: Optional[datetime] = None
+    sla_breached_at: Optional[datetime] = None
+    duplicate_count: Optional[int] = 0
+    
+    class Config:
+        from_attributes = True
+
+class TicketReportResponse(BaseModel):
+    id: int
+    ticket_id: int
+    subject: str
+    description: str
+    priority: str
+    created_at: datetime
     
     class Config:
         from_attributes = True
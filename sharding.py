@@ -0,0 +1,411 @@
+"""
+Horizontal sharding of conversation storage.
+
+Conversations and their messages are spread over several databases
+(``SHARD_URLS``, comma separated) by consistent hashing of the
+conversation id, so adding a shard only moves about 1/N of the
+conversations. Tickets, the ticket queue and analytics stay on the
+primary database (``DATABASE_URL``). Without ``SHARD_URLS`` there is a
+single shard, the primary, and ids are assigned by the database as
+before.
+
+With several shards, conversation and message ids are allocated by a
+global generator so they stay unique when conversations move between
+shards. ``SHARD_NODE_ID`` (0-63) must then be set, to a different value
+for each worker process; startup fails without it.
+
+To add a shard, restart the app with the new ``SHARD_URLS`` and then run
+``rebalance``. The app looks a conversation up on the other shards when
+it is not where the ring says, so existing conversations stay readable
+and writable while each one is copied to its new shard and then deleted
+from the old one.
+
+Usage:
+    python -m sharding rebalance --from sqlite:///s0.db,sqlite:///s1.db \\
+        --to sqlite:///s0.db,sqlite:///s1.db,sqlite:///s2.db
+    python -m sharding stats
+"""
+
+import argparse
+import bisect
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from sqlalchemy import create_engine, delete, exists, func, select
+from sqlalchemy.orm import Session, sessionmaker
+
+from database import (
+    DATABASE_URL, SQLITE_TUNED, DatabaseWriter, _engine_connect_args, apply_sqlite_profile,
+    db_writer, engine, ensure_schema,
+)
+from models.chat import Conversation, Message
+from utils.compat import to_thread
+
+logger = logging.getLogger(__name__)
+
+# 2024-01-01T00:00:00Z in milliseconds
+ID_EPOCH_MS = 1704067200000
+NODE_BITS = 6
+SEQUENCE_BITS = 6
+
+
+class HashRing:
+    """
+    Consistent hash ring with virtual nodes.
+    """
+
+    def __init__(self, nodes: Sequence[str], vnodes: int = 128):
+        self.nodes = list(nodes)
+        self._ring = sorted(
+            (self._hash(f"{node}#{replica}"), index)
+            for index, node in enumerate(self.nodes)
+            for replica in range(vnodes)
+        )
+        self._points = [point for point, _ in self._ring]
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        return int.from_bytes(hashlib.md5(value.encode("utf-8")).digest()[:8], "big")
+
+    def index_for(self, key: int) -> int:
+        """Index of the node owning a key"""
+        if len(self.nodes) == 1:
+            return 0
+        position = bisect.bisect(self._points, self._hash(str(key))) % len(self._ring)
+        return self._ring[position][1]
+
+
+class IdGenerator:
+    """
+    Time-ordered 53-bit ids (milliseconds, node, sequence).
+
+    53 bits keeps ids exact as JavaScript numbers in the chat page.
+    """
+
+    def __init__(self, node_id: int):
+        if not 0 <= node_id < (1 << NODE_BITS):
+            raise ValueError(f"Node id {node_id} is outside 0-{(1 << NODE_BITS) - 1}")
+        self.node_id = node_id
+        self._last_ms = 0
+        self._sequence = 0
+        self._lock = threading.Lock()
+
+    def next_id(self) -> int:
+        with self._lock:
+            now_ms = int(time.time() * 1000) - ID_EPOCH_MS
+            if now_ms <= self._last_ms:
+                now_ms = self._last_ms
+                self._sequence = (self._sequence + 1) % (1 << SEQUENCE_BITS)
+                if self._sequence == 0:
+                    # Sequence exhausted for this millisecond
+                    now_ms += 1
+            else:
+                self._sequence = 0
+            self._last_ms = now_ms
+            return (now_ms << (NODE_BITS + SEQUENCE_BITS)) | (self.node_id << SEQUENCE_BITS) | self._sequence
+
+
+class Shard:
+    """One conversation database with its sessions and writer."""
+
+    def __init__(self, index: int, url: str):
+        self.index = index
+        self.url = url
+        if url == DATABASE_URL:
+            # The primary shares the app's engine and writer
+            self.engine = engine
+            self.writer = db_writer
+        else:
+            self.engine = create_engine(url, connect_args=_engine_connect_args(url))
+            if SQLITE_TUNED and url.startswith("sqlite"):
+                apply_sqlite_profile(self.engine)
+            self.writer = DatabaseWriter(self.engine, enabled=db_writer.enabled)
+        self.session_factory = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+
+
+class ShardRouter:
+    """
+    Routes conversation reads and writes to shards.
+
+    Args:
+        urls: Database URL of each shard, in ring order
+        node_id: This process's id for the global id generator (default
+            ``SHARD_NODE_ID``, required with several shards)
+        location_cache_size: Conversations remembered as living off their ring shard
+    """
+
+    def __init__(self, urls: Sequence[str], node_id: Optional[int] = None, location_cache_size: int = 10000):
+        if node_id is None:
+            node_id = os.getenv("SHARD_NODE_ID")
+            if node_id is None and len(urls) > 1:
+                # A derived id (e.g. from the pid) can repeat across workers and collide primary keys
+                raise RuntimeError("SHARD_NODE_ID must be set to a value unique to this worker (0-63) when SHARD_URLS lists several shards")
+        self.ids = IdGenerator(int(node_id or 0))
+        self.shards = [Shard(index, url) for index, url in enumerate(urls)]
+        self.ring = HashRing(urls)
+        self.sharded = len(self.shards) > 1
+        self.location_cache_size = location_cache_size
+        # conversation id -> shard index, for conversations found off their ring shard
+        self._locations: "OrderedDict[int, int]" = OrderedDict()
+        self._locations_lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max(len(self.shards), 1), thread_name_prefix="shard")
+
+    @classmethod
+    def from_env(cls, node_id: Optional[int] = None) -> "ShardRouter":
+        """
+        Build a router from SHARD_URLS, defaulting to the primary database alone.
+
+        Raises:
+            RuntimeError: If several shards are configured without SHARD_NODE_ID
+        """
+        urls = [url.strip() for url in os.getenv("SHARD_URLS", "").split(",") if url.strip()]
+        return cls(urls or [DATABASE_URL], node_id)
+
+    def ensure_schema(self) -> None:
+        """Create tables on every shard besides the primary"""
+        for shard in self.shards:
+            if shard.engine is not engine:
+                ensure_schema(shard.engine)
+
+    def new_id(self) -> Optional[int]:
+        """A globally unique id, or None to let a single database assign it"""
+        return self.ids.next_id() if self.sharded else None
+
+    def owner(self, conversation_id: int) -> Shard:
+        """The shard a conversation belongs to according to the ring"""
+        return self.shards[self.ring.index_for(conversation_id)]
+
+    def _candidates(self, conversation_id: int) -> List[Shard]:
+        """Shards to try for a conversation, most likely first"""
+        with self._locations_lock:
+            index = self._locations.get(conversation_id)
+        first = self.shards[index if index is not None else self.ring.index_for(conversation_id)]
+        return [first] + [shard for shard in self.shards if shard is not first]
+
+    def _remember(self, conversation_id: int, shard: Shard) -> None:
+        with self._locations_lock:
+            if shard is self.owner(conversation_id):
+                self._locations.pop(conversation_id, None)
+                return
+            self._locations[conversation_id] = shard.index
+            self._locations.move_to_end(conversation_id)
+            while len(self._locations) > self.location_cache_size:
+                self._locations.popitem(last=False)
+
+    def locate(self, conversation_id: int) -> Optional[Shard]:
+        """
+        Find the shard holding a conversation.
+
+        Returns:
+            Optional[Shard]: The shard, or None if no shard has it
+        """
+        for shard in self._candidates(conversation_id):
+            with shard.session_factory() as db:
+                if db.get(Conversation, conversation_id) is not None:
+                    self._remember(conversation_id, shard)
+                    return shard
+        return None
+
+    async def run_for_conversation(self, conversation_id: int, job: Callable[[Session], Any]) -> Any:
+        """
+        Run a write job on the shard holding a conversation.
+
+        The job must return None when the conversation is not in its
+        session; it is then retried on the other shards (the conversation
+        may be moving).
+
+        Returns:
+            The job's result, or None if no shard has the conversation
+        """
+        for shard in self._candidates(conversation_id):
+            result = await shard.writer.run(job)
+            if result is not None:
+                self._remember(conversation_id, shard)
+                return result
+            if not self.sharded:
+                break
+        return None
+
+    def scatter(self, function: Callable[[Shard], Any]) -> List[Any]:
+        """Run a function on every shard concurrently and return the results in shard order"""
+        if len(self.shards) == 1:
+            return [function(self.shards[0])]
+        return list(self._pool.map(function, self.shards))
+
+    async def ascatter(self, function: Callable[[Shard], Any]) -> List[Any]:
+        """``scatter`` without blocking the event loop"""
+        return await to_thread(self.scatter, function)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Conversation and message counts per shard"""
+        def count(shard: Shard) -> Dict[str, Any]:
+            with shard.session_factory() as db:
+                return {
+                    "shard": shard.index,
+                    "conversations": db.scalar(select(func.count()).select_from(Conversation)),
+                    "messages": db.scalar(select(func.count()).select_from(Message)),
+                }
+        return self.scatter(count)
+
+    def recent_conversations(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Newest conversations across all shards"""
+        def newest(shard: Shard) -> List[Dict[str, Any]]:
+            with shard.session_factory() as db:
+                rows = db.execute(
+                    select(Conversation.id, Conversation.created_at).order_by(Conversation.created_at.desc()).limit(limit)
+                ).mappings()
+                return [{**row, "shard": shard.index} for row in rows]
+        rows = [row for rows in self.scatter(newest) for row in rows]
+        rows.sort(key=lambda row: row["created_at"] or 0, reverse=True)
+        return rows[:limit]
+
+
+def _copy_messages(conversation_id: int, source, target, batch_size: int = 1000) -> int:
+    """
+    Move a conversation's messages that are still on the source, in batches.
+
+    Returns:
+        int: Messages moved
+    """
+    message_table = Message.__table__
+    moved = 0
+    while True:
+        with source.connect() as conn:
+            messages = [dict(row) for row in conn.execute(
+                select(message_table)
+                .where(message_table.c.conversation_id == conversation_id)
+                .order_by(message_table.c.id)
+                .limit(batch_size)
+            ).mappings()]
+        if not messages:
+            return moved
+        ids = [message["id"] for message in messages]
+        with target.begin() as conn:
+            existing = {row[0] for row in conn.execute(select(message_table.c.id).where(message_table.c.id.in_(ids)))}
+            new_messages = [message for message in messages if message["id"] not in existing]
+            if new_messages:
+                conn.execute(message_table.insert(), new_messages)
+        with source.begin() as conn:
+            conn.execute(delete(message_table).where(message_table.c.id.in_(ids)))
+        moved += len(messages)
+
+
+def _move_conversation(conversation_id: int, source, target) -> int:
+    """
+    Move one conversation and its messages from one engine to another.
+
+    Messages appended to the source while copying are picked up by the
+    next round; the conversation row is only deleted by a statement that
+    also checks no messages are left. Readers on the new shard may briefly
+    see a partial history while the messages are copied.
+
+    Returns:
+        int: Messages moved
+    """
+    conversation_table = Conversation.__table__
+    message_table = Message.__table__
+    with source.connect() as conn:
+        conversation = conn.execute(
+            select(conversation_table).where(conversation_table.c.id == conversation_id)
+        ).mappings().first()
+    if conversation is None:
+        return 0
+    with target.begin() as conn:
+        if conn.execute(select(conversation_table.c.id).where(conversation_table.c.id == conversation_id)).first() is None:
+            conn.execute(conversation_table.insert(), [dict(conversation)])
+
+    moved = 0
+    while True:
+        moved += _copy_messages(conversation_id, source, target)
+        with source.begin() as conn:
+            # Only succeeds once every message has been moved
+            deleted = conn.execute(delete(conversation_table).where(
+                conversation_table.c.id == conversation_id,
+                ~exists().where(message_table.c.conversation_id == conversation_id),
+            )).rowcount
+        if deleted:
+            return moved
+
+
+def rebalance(old_urls: Sequence[str], new_urls: Sequence[str], batch_size: int = 500, dry_run: bool = False) -> Dict[str, int]:
+    """
+    Move conversations to their shard under a new ring.
+
+    Args:
+        old_urls: Shard URLs the data is currently laid out for
+        new_urls: Shard URLs to lay it out for
+        batch_size: Conversation ids read per batch
+        dry_run: Only count what would move
+
+    Returns:
+        Dict[str, int]: Conversations and messages moved
+    """
+    new_ring = HashRing(new_urls)
+    engines = {}
+    for url in set(old_urls) | set(new_urls):
+        engines[url] = engine if url == DATABASE_URL else create_engine(url, connect_args=_engine_connect_args(url))
+        ensure_schema(engines[url])
+    from utils.search import SearchIndex
+    for url in new_urls:
+        SearchIndex(engines[url]).ensure()
+
+    totals = {"conversations": 0, "messages": 0}
+    for url in old_urls:
+        source = engines[url]
+        last_id = 0
+        while True:
+            with source.connect() as conn:
+                ids = [row[0] for row in conn.execute(
+                    select(Conversation.id).where(Conversation.id > last_id).order_by(Conversation.id).limit(batch_size)
+                )]
+            if not ids:
+                break
+            last_id = ids[-1]
+            moved = []
+            for conversation_id in ids:
+                target_url = new_urls[new_ring.index_for(conversation_id)]
+                if target_url == url:
+                    continue
+                totals["conversations"] += 1
+                if not dry_run:
+                    totals["messages"] += _move_conversation(conversation_id, source, engines[target_url])
+                    moved.append((conversation_id, engines[target_url]))
+            # A write that checked for its conversation just before the move
+            # finished can still land on the source; sweep those over too
+            for conversation_id, target in moved:
+                totals["messages"] += _copy_messages(conversation_id, source, target)
+        logger.info(f"Rebalanced {url}: {totals['conversations']} conversations moved so far")
+    return totals
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Shard maintenance")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    move = subcommands.add_parser("rebalance", help="Move conversations after changing the shard list")
+    move.add_argument("--from", dest="old", required=True, help="Current comma-separated shard URLs")
+    move.add_argument("--to", dest="new", required=True, help="New comma-separated shard URLs")
+    move.add_argument("--batch-size", type=int, default=500)
+    move.add_argument("--dry-run", action="store_true", help="Only count what would move")
+    subcommands.add_parser("stats", help="Conversation and message counts per shard (SHARD_URLS)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "stats":
+        # Read-only, so no id generator node is needed
+        for row in ShardRouter.from_env(node_id=0).stats():
+            print(row)
+        return
+    split = lambda value: [url.strip() for url in value.split(",") if url.strip()]
+    totals = rebalance(split(args.old), split(args.new), args.batch_size, args.dry_run)
+    verb = "Would move" if args.dry_run else "Moved"
+    logger.info(f"{verb} {totals['conversations']} conversations ({totals['messages']} messages)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,9 @@
+import os
+import sys
+import tempfile
+
+# Tests import the application modules from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Keep the primary database out of the working tree
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='chat-support-tests-'), 'primary.db')}")
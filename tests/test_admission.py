@@ -0,0 +1,87 @@
+"""
+Admission control under load: queue accounting and the urgent reserve.
+"""
+
+import asyncio
+import time
+
+import pytest
+
+from utils.admission import AdmissionController, AdmissionRejected
+
+
+async def _hold(controller: AdmissionController, intent: str, release: asyncio.Event) -> None:
+    async with controller.admit(intent):
+        # Bounded, so a failing test does not hang on held slots
+        await asyncio.wait_for(release.wait(), timeout=10)
+
+
+def test_abandoned_waiters_do_not_count_against_the_queue():
+    async def scenario():
+        controller = AdmissionController(max_concurrency=2, urgent_reserved=1, max_queue=2, queue_timeout=5.0)
+        release = asyncio.Event()
+        holder = asyncio.create_task(_hold(controller, "other", release))
+        await asyncio.sleep(0)
+        waiting = asyncio.create_task(_hold(controller, "faq", release))
+        abandoned = asyncio.create_task(_hold(controller, "faq", release))
+        await asyncio.sleep(0)
+
+        # The client goes away; its entry stays in the heap until popped
+        abandoned.cancel()
+        await asyncio.gather(abandoned, return_exceptions=True)
+        assert controller.stats()["queued"] == 1
+
+        # A new request of the same priority queues instead of being shed as if the queue were full
+        latest = asyncio.create_task(_hold(controller, "faq", release))
+        await asyncio.sleep(0)
+        assert controller.stats()["queued"] == 2
+        release.set()
+        await asyncio.gather(holder, waiting, latest)
+        assert controller.stats()["in_flight"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_urgent_requests_get_in_while_the_queue_is_full():
+    async def scenario():
+        controller = AdmissionController(max_concurrency=8, urgent_reserved=2, max_queue=16, queue_timeout=5.0)
+        release = asyncio.Event()
+        load = [asyncio.create_task(_hold(controller, intent, release)) for intent in ("other", "faq", "greeting") * 20]
+        await asyncio.sleep(0.01)
+        stats = controller.stats()
+        assert stats["in_flight"] == 6
+        assert stats["queued"] == 16
+
+        latencies = []
+        for _ in range(2):
+            started = time.perf_counter()
+            async with controller.admit("urgent"):
+                latencies.append(time.perf_counter() - started)
+        assert max(latencies) < 0.01
+        assert controller.stats()["intents"]["urgent"]["admitted"] == 2
+
+        release.set()
+        results = await asyncio.gather(*load, return_exceptions=True)
+        shed = [result for result in results if isinstance(result, AdmissionRejected)]
+        # Everything beyond the running slots and the queue was shed, lowest priority first
+        assert len(shed) == len(load) - 6 - 16
+        assert controller.stats()["in_flight"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_full_queue_sheds_the_lowest_priority_waiter():
+    async def scenario():
+        controller = AdmissionController(max_concurrency=2, urgent_reserved=1, max_queue=1, queue_timeout=5.0)
+        release = asyncio.Event()
+        holder = asyncio.create_task(_hold(controller, "other", release))
+        greeting = asyncio.create_task(_hold(controller, "greeting", release))
+        await asyncio.sleep(0)
+        complaint = asyncio.create_task(_hold(controller, "complaint", release))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected):
+            await greeting
+        release.set()
+        await asyncio.gather(holder, complaint)
+
+    asyncio.run(scenario())
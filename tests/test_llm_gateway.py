@@ -0,0 +1,162 @@
+"""
+LLMGateway against an in-process mock of the OpenAI API.
+"""
+
+import asyncio
+import json
+import random
+
+import pytest
+
+from utils.llm_gateway import OPENAI_AVAILABLE, LLMGateway
+
+if not OPENAI_AVAILABLE:
+    pytest.skip("openai is not installed", allow_module_level=True)
+
+import httpx
+from openai import APIStatusError
+
+MESSAGES = [{"role": "user", "content": "hello"}]
+
+
+def _completion(content: str = "hi") -> dict:
+    return {
+        "id": "chatcmpl-test",
+        "object": "chat.completion",
+        "created": 0,
+        "model": "test-model",
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+    }
+
+
+def _gateway(handler, **kwargs) -> LLMGateway:
+    kwargs.setdefault("backoff_base", 0.001)
+    kwargs.setdefault("backoff_max", 0.01)
+    return LLMGateway(api_key="test", base_url="http://mock.local/v1", transport=httpx.MockTransport(handler), **kwargs)
+
+
+def test_retries_transient_failures():
+    statuses = [503, 429]
+
+    def handler(request):
+        if statuses:
+            return httpx.Response(statuses.pop(0), headers={"retry-after": "0"}, json={"error": {"message": "busy"}})
+        return httpx.Response(200, json=_completion("recovered"))
+
+    async def run():
+        gateway = _gateway(handler)
+        response = await gateway.chat_completion("test-model", MESSAGES)
+        await gateway.aclose()
+        return gateway, response
+
+    gateway, response = asyncio.run(run())
+    assert response.choices[0].message.content == "recovered"
+    stats = gateway.stats()["test-model"]
+    assert stats["requests"] == 3
+    assert stats["retries"] == 2
+    assert stats["errors"] == 0
+
+
+def test_client_errors_are_not_retried():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(400, json={"error": {"message": "bad request"}})
+
+    async def run():
+        gateway = _gateway(handler)
+        try:
+            with pytest.raises(APIStatusError):
+                await gateway.chat_completion("test-model", MESSAGES)
+        finally:
+            await gateway.aclose()
+        return gateway
+
+    gateway = asyncio.run(run())
+    assert len(calls) == 1
+    assert gateway.stats()["test-model"]["errors"] == 1
+
+
+def test_gives_up_after_max_retries():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(502, json={"error": {"message": "bad gateway"}})
+
+    async def run():
+        gateway = _gateway(handler, max_retries=2)
+        try:
+            with pytest.raises(APIStatusError):
+                await gateway.chat_completion("test-model", MESSAGES)
+        finally:
+            await gateway.aclose()
+
+    asyncio.run(run())
+    assert len(calls) == 3
+
+
+def test_model_concurrency_is_capped():
+    in_flight = 0
+    peak = 0
+
+    async def handler(request):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return httpx.Response(200, json=_completion())
+
+    async def run():
+        gateway = _gateway(handler, model_concurrency={"test-model": 2})
+        await asyncio.gather(*(gateway.chat_completion("test-model", MESSAGES) for _ in range(10)))
+        await gateway.aclose()
+        return gateway
+
+    gateway = asyncio.run(run())
+    assert peak == 2
+    assert gateway.stats()["test-model"]["in_flight"] == 0
+
+
+def test_calls_share_one_pooled_client():
+    async def run():
+        gateway = _gateway(lambda request: httpx.Response(200, json=_completion()))
+        first = gateway.client
+        await asyncio.gather(*(gateway.chat_completion("test-model", MESSAGES) for _ in range(5)))
+        shared = gateway.client is first and gateway._http_client is not None
+        await gateway.aclose()
+        return shared
+
+    assert asyncio.run(run())
+
+
+def test_backoff_uses_full_jitter():
+    gateway = _gateway(lambda request: httpx.Response(200), backoff_base=0.5, backoff_max=8.0)
+    random.seed(7)
+    delays = [gateway._backoff(3, Exception()) for _ in range(200)]
+    assert all(0 <= delay <= 4.0 for delay in delays)
+    assert len(set(delays)) > 100
+    assert max(gateway._backoff(10, Exception()) for _ in range(200)) <= 8.0
+
+
+def test_streams_content_deltas():
+    def chunk(content):
+        body = {
+            "id": "chatcmpl-test", "object": "chat.completion.chunk", "created": 0, "model": "test-model",
+            "choices": [{"index": 0, "delta": {"content": content}, "finish_reason": None}],
+        }
+        return f"data: {json.dumps(body)}\n\n"
+
+    def handler(request):
+        stream = chunk("Hel") + chunk("lo") + "data: [DONE]\n\n"
+        return httpx.Response(200, headers={"content-type": "text/event-stream"}, content=stream.encode())
+
+    async def run():
+        gateway = _gateway(handler)
+        parts = [part async for part in gateway.stream_chat_completion("test-model", MESSAGES)]
+        await gateway.aclose()
+        return parts
+
+    assert asyncio.run(run()) == ["Hel", "lo"]
@@ -0,0 +1,123 @@
+"""
+Digest batching of notifications, delivered to a local fake email/SMS sink.
+"""
+
+import asyncio
+
+import pytest
+
+from agents.notify_agent import NotifyAgent
+
+
+class FakeNotificationSink:
+    """Stands in for the SMTP and SMS providers, recording every send"""
+
+    def __init__(self):
+        self.sends = []
+
+    def attach(self, agent: NotifyAgent) -> None:
+        """Route an agent's email and SMS sends here"""
+        async def send_email(recipient: str, message: str, priority: str) -> bool:
+            self.sends.append(("email", recipient, message))
+            return True
+
+        async def send_sms(recipient: str, message: str) -> bool:
+            self.sends.append(("sms", recipient, message))
+            return True
+
+        agent.email_enabled = agent.sms_enabled = True
+        agent._mock_send_email = send_email
+        agent._mock_send_sms = send_sms
+
+    def channel(self, name: str):
+        return [send for send in self.sends if send[0] == name]
+
+
+def _agent(monkeypatch, window: float, **env):
+    monkeypatch.setenv("NOTIFY_COALESCE_WINDOW", str(window))
+    for name, value in env.items():
+        monkeypatch.setenv(name, value)
+    agent = NotifyAgent()
+    sink = FakeNotificationSink()
+    sink.attach(agent)
+    return agent, sink
+
+
+def test_burst_is_sent_as_one_digest_per_recipient_and_type(monkeypatch):
+    agent, sink = _agent(monkeypatch, 0.05)
+
+    async def scenario():
+        await asyncio.gather(
+            *(agent.send_notification(f"Complaint {index}: damaged", notification_type="complaint") for index in range(20)),
+            *(agent.send_notification(f"New ticket #{index}", notification_type="ticket_created") for index in range(10)),
+            agent.send_notification("Complaint from ops", recipient="ops@example.com", notification_type="complaint"),
+        )
+        assert sink.sends == []
+        await asyncio.sleep(0.2)
+
+    asyncio.run(scenario())
+    emails = sink.channel("email")
+    assert len(emails) == 3
+    messages = {(recipient, message.split("\n")[0]) for _, recipient, message in emails}
+    assert ("support@example.com", "New complaint: 20 complaint notifications:") in messages
+    assert ("ops@example.com", "New complaint: Complaint from ops") in messages
+    collapsed = next(message for _, _, message in emails if "ticket_created" in message)
+    assert collapsed.startswith("New ticket_created: 10 ticket_created notifications (latest: New ticket #7; New ticket #8; New ticket #9)")
+
+    stats = agent.digest_stats()
+    assert stats["received"] == 31
+    assert stats["delivered"] == 3
+    assert stats["pending"] == 0
+
+
+@pytest.mark.parametrize("notification_type", ["urgent", "sla_breach"])
+def test_alerts_bypass_the_window(monkeypatch, notification_type):
+    agent, sink = _agent(monkeypatch, 60)
+
+    async def scenario():
+        await agent.send_notification("Ticket #4 breached its SLA", notification_type=notification_type)
+        # Delivered before the window could have elapsed, by SMS and email
+        assert {channel for channel, _, _ in sink.sends} == {"sms", "email"}
+        await agent.stop()
+
+    asyncio.run(scenario())
+    assert len(sink.sends) == 2
+
+
+def test_full_group_is_sent_before_the_window_ends(monkeypatch):
+    agent, sink = _agent(monkeypatch, 60, NOTIFY_DIGEST_MAX="5")
+
+    async def scenario():
+        for index in range(12):
+            await agent.send_notification(f"Complaint {index}", notification_type="complaint")
+        assert len(sink.sends) == 2
+        await agent.stop()
+
+    asyncio.run(scenario())
+    assert len(sink.sends) == 3
+    assert sink.sends[-1][2].startswith("New complaint: 2 complaint notifications:")
+
+
+def test_stop_delivers_pending_groups(monkeypatch):
+    agent, sink = _agent(monkeypatch, 60)
+
+    async def scenario():
+        await agent.send_notification("Complaint 1", notification_type="complaint")
+        await agent.send_notification("Complaint 2", notification_type="complaint")
+        await agent.stop()
+
+    asyncio.run(scenario())
+    assert len(sink.sends) == 1
+    assert agent.digest_stats()["pending"] == 0
+
+
+def test_without_a_window_every_notification_is_sent(monkeypatch):
+    agent, sink = _agent(monkeypatch, 0)
+
+    async def scenario():
+        for index in range(5):
+            await agent.send_notification(f"Complaint {index}", notification_type="complaint")
+
+    asyncio.run(scenario())
+    assert len(sink.sends) == 5
+    assert agent.digest_stats() == {"enabled": False}
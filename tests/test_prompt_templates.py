@@ -0,0 +1,31 @@
+"""
+Token budgets of the compiled prompt prefixes.
+"""
+
+import pytest
+
+from utils.prompt_templates import PROMPTS, CompiledPrompt, check_budgets
+
+
+@pytest.mark.parametrize("name", sorted(PROMPTS))
+def test_prefix_within_budget(name):
+    prompt = PROMPTS[name]
+    assert prompt.max_prefix_tokens is not None, f"prompt '{name}' has no token budget"
+    assert prompt.prefix_tokens <= prompt.max_prefix_tokens, (
+        f"prompt '{name}' prefix is {prompt.prefix_tokens} tokens, over its budget of {prompt.max_prefix_tokens}"
+    )
+
+
+def test_prefix_is_static():
+    # Request values belong in the suffix, or the cacheable prefix changes per request
+    for name, prompt in PROMPTS.items():
+        assert "{" not in prompt.prefix, f"prompt '{name}' has a placeholder in its prefix"
+
+
+def test_check_budgets_reports_bloat():
+    bloated = CompiledPrompt("bloated", prefix="word " * 50, suffix="{message}", max_prefix_tokens=10)
+    PROMPTS["bloated"] = bloated
+    try:
+        assert check_budgets() == [bloated]
+    finally:
+        del PROMPTS["bloated"]
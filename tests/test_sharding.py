@@ -0,0 +1,143 @@
+"""
+Sharded conversation storage over several local SQLite files.
+"""
+
+import asyncio
+from collections import Counter
+
+import pytest
+from sqlalchemy import create_engine, func, select
+
+from database import ensure_schema
+from models.chat import Conversation, Message
+from sharding import HashRing, IdGenerator, ShardRouter, rebalance
+
+
+@pytest.fixture
+def shard_urls(tmp_path):
+    return [f"sqlite:///{tmp_path / f'shard{index}.db'}" for index in range(3)]
+
+
+@pytest.fixture
+def router(shard_urls):
+    router = ShardRouter(shard_urls, node_id=1)
+    router.ensure_schema()
+    yield router
+    for shard in router.shards:
+        shard.engine.dispose()
+
+
+def _create_conversation(router: ShardRouter, messages: int = 2) -> int:
+    conversation_id = router.new_id()
+    with router.owner(conversation_id).session_factory() as db:
+        db.add(Conversation(id=conversation_id))
+        for index in range(messages):
+            db.add(Message(id=router.new_id(), conversation_id=conversation_id, content=f"message {index}"))
+        db.commit()
+    return conversation_id
+
+
+def _counts(url: str):
+    engine = create_engine(url)
+    with engine.connect() as conn:
+        counts = (
+            conn.execute(select(func.count()).select_from(Conversation)).scalar(),
+            conn.execute(select(func.count()).select_from(Message)).scalar(),
+        )
+    engine.dispose()
+    return counts
+
+
+def test_ring_spreads_keys_and_moves_few_on_growth():
+    nodes = ["a", "b", "c"]
+    ring = HashRing(nodes)
+    owners = Counter(ring.index_for(key) for key in range(30000))
+    assert all(8000 < owners[index] < 12000 for index in range(3))
+
+    grown = HashRing(nodes + ["d"])
+    moved = sum(1 for key in range(30000) if nodes[ring.index_for(key)] != (nodes + ["d"])[grown.index_for(key)])
+    assert moved < 30000 * 0.35
+
+
+def test_ids_are_unique_and_increasing():
+    generator = IdGenerator(5)
+    ids = [generator.next_id() for _ in range(20000)]
+    assert len(set(ids)) == len(ids)
+    assert ids == sorted(ids)
+    assert max(ids) < 2 ** 53
+
+
+def test_ids_differ_between_nodes():
+    first, second = IdGenerator(1), IdGenerator(2)
+    assert not {first.next_id() for _ in range(1000)} & {second.next_id() for _ in range(1000)}
+
+
+@pytest.mark.parametrize("node_id", [-1, 64, 4096])
+def test_node_id_out_of_range_is_rejected(node_id):
+    with pytest.raises(ValueError):
+        IdGenerator(node_id)
+
+
+def test_several_shards_require_a_node_id(shard_urls, monkeypatch):
+    monkeypatch.delenv("SHARD_NODE_ID", raising=False)
+    with pytest.raises(RuntimeError, match="SHARD_NODE_ID"):
+        ShardRouter(shard_urls)
+    monkeypatch.setenv("SHARD_NODE_ID", "7")
+    assert ShardRouter(shard_urls).ids.node_id == 7
+
+
+def test_conversations_are_stored_on_their_ring_shard(router, shard_urls):
+    ids = [_create_conversation(router) for _ in range(60)]
+    for conversation_id in ids:
+        assert router.locate(conversation_id) is router.owner(conversation_id)
+    assert sum(_counts(url)[0] for url in shard_urls) == 60
+    assert all(_counts(url)[0] > 0 for url in shard_urls)
+    assert sum(row["messages"] for row in router.stats()) == 120
+
+
+def test_writes_find_a_conversation_off_its_ring_shard(router):
+    conversation_id = router.new_id()
+    stray = next(shard for shard in router.shards if shard is not router.owner(conversation_id))
+    with stray.session_factory() as db:
+        db.add(Conversation(id=conversation_id))
+        db.commit()
+
+    def append_to(target_id):
+        def append(db):
+            if db.get(Conversation, target_id) is None:
+                return None
+            message = Message(id=router.new_id(), conversation_id=target_id, content="late reply")
+            db.add(message)
+            db.flush()
+            return message.id
+        return append
+
+    assert asyncio.run(router.run_for_conversation(conversation_id, append_to(conversation_id))) is not None
+    assert router.locate(conversation_id) is stray
+    missing = router.new_id()
+    assert asyncio.run(router.run_for_conversation(missing, append_to(missing))) is None
+
+
+def test_rebalance_moves_conversations_to_the_new_ring(tmp_path, shard_urls):
+    old_urls = shard_urls[:2]
+    router = ShardRouter(old_urls, node_id=2)
+    router.ensure_schema()
+    ids = [_create_conversation(router, messages=3) for _ in range(90)]
+    for shard in router.shards:
+        shard.engine.dispose()
+    ensure_schema(create_engine(shard_urls[2]))
+
+    totals = rebalance(old_urls, shard_urls)
+    assert totals["conversations"] > 0
+    assert totals["messages"] == totals["conversations"] * 3
+
+    grown = ShardRouter(shard_urls, node_id=2)
+    for conversation_id in ids:
+        shard = grown.locate(conversation_id)
+        assert shard is grown.owner(conversation_id)
+        with shard.session_factory() as db:
+            assert db.scalar(select(func.count()).where(Message.conversation_id == conversation_id)) == 3
+    assert sum(_counts(url)[0] for url in shard_urls) == 90
+    assert sum(_counts(url)[1] for url in shard_urls) == 270
+    for shard in grown.shards:
+        shard.engine.dispose()
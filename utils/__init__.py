@@ -1,2 +1,20 @@
 from utils.prompt_templates import PromptTemplates
 from utils.error_handling import ErrorHandler, async_error_handler, sync_error_handler
+from utils.admission import AdmissionController, AdmissionRejected
+from utils.rate_limit import RateLimiter, RateLimitExceeded
+from utils.llm_gateway import LLMGateway, get_llm_gateway
+from utils.generative import GenerativeResponder, get_generative_responder
+from utils.tokenizer import count_tokens, count_message_tokens
+from utils.idempotency import IdempotencyStore, IdempotencyConflict
+from utils.serialization import FastJSONResponse, dumps
+from utils.http_cache import CompressionMiddleware, CachedStaticFiles, static_url
+from utils.pubsub import EventBroker
+from utils.ticket_queue import TicketQueue
+from utils.analytics import AnalyticsCollector
+from utils.profiling import ProfilingMiddleware, ProfileStore, MemoryTracker, StackSampler
+from utils.preprocessing import ProcessedMessage, preprocess
+from utils.notification_digest import NotificationCoalescer
+from utils.minhash import MinHasher, LSHIndex
+from utils.ticket_dedup import TicketDeduplicator
+from utils.tenants import TenantRegistry, TenantBundle
+from utils.export import ExportLimiter, export_conversations, export_tickets
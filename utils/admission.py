@@ -0,0 +1,246 @@
+"""
+Admission control and priority scheduling for the chat pipeline.
+
+Requests are pre-classified with the cheap rule-based classifier and
+admitted in priority order. A slice of the concurrency budget is reserved
+for urgent traffic so it never queues behind low-value requests, and when
+the pipeline is saturated greetings/farewells are answered from a static
+cache instead of consuming a slot.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import os
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Scheduling priority per intent (lower value is served first)
+INTENT_PRIORITIES: Dict[str, int] = {
+    "urgent": 0,
+    "complaint": 1,
+    "account": 2,
+    "order": 2,
+    "product": 3,
+    "help": 3,
+    "faq": 3,
+    "other": 4,
+    "farewell": 5,
+    "greeting": 5,
+}
+
+# Intents that can be answered from a static cache when saturated
+DEGRADABLE_INTENTS = ("greeting", "farewell")
+
+DEFAULT_PRIORITY = INTENT_PRIORITIES["other"]
+
+
+class AdmissionRejected(Exception):
+    """
+    Raised when a request is shed because the pipeline is overloaded.
+    """
+
+    def __init__(self, intent: str, retry_after: int):
+        super().__init__(f"Request with intent '{intent}' was shed under load")
+        self.intent = intent
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Concurrency limiter with per-intent priority queues.
+
+    At most ``max_concurrency`` requests run the agent pipeline at once.
+    The last ``urgent_reserved`` slots can only be taken by urgent requests.
+    Requests that cannot be admitted wait in a priority queue for up to
+    ``queue_timeout`` seconds; when the queue is full the lowest-priority
+    waiter is shed.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: Optional[int] = None,
+        urgent_reserved: Optional[int] = None,
+        max_queue: Optional[int] = None,
+        queue_timeout: Optional[float] = None,
+        static_responses: Optional[Dict[str, str]] = None,
+    ):
+        self.max_concurrency = max_concurrency or int(os.getenv("ADMISSION_MAX_CONCURRENCY", "32"))
+        reserved = urgent_reserved if urgent_reserved is not None else int(os.getenv("ADMISSION_URGENT_RESERVED", "4"))
+        self.urgent_reserved = min(reserved, self.max_concurrency - 1)
+        self.max_queue = max_queue or int(os.getenv("ADMISSION_MAX_QUEUE", "128"))
+        self.queue_timeout = queue_timeout or float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "2.0"))
+        self.static_responses = {
+            intent: response
+            for intent, response in (static_responses or {}).items()
+            if intent in DEGRADABLE_INTENTS and response
+        }
+
+        self.in_flight = 0
+        self._queue = []  # heap of (priority, seq, future, intent)
+        # Waiters still queued; timed-out and cancelled entries stay in the heap until popped
+        self._waiting = 0
+        self._seq = itertools.count()
+        self._stats: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+
+    @staticmethod
+    def priority_for(intent: str) -> int:
+        """Return the scheduling priority for an intent"""
+        return INTENT_PRIORITIES.get(intent, DEFAULT_PRIORITY)
+
+    def _capacity_for(self, intent: str) -> int:
+        if intent == "urgent":
+            return self.max_concurrency
+        return self.max_concurrency - self.urgent_reserved
+
+    @property
+    def saturated(self) -> bool:
+        """Whether non-urgent traffic has used up its share of the pipeline"""
+        return self.in_flight >= self.max_concurrency - self.urgent_reserved
+
+    def degraded_response(self, intent: str) -> Optional[str]:
+        """
+        Get a static response for the intent if the pipeline is saturated.
+
+        Args:
+            intent: The pre-classified intent
+
+        Returns:
+            Optional[str]: The cached response, or None if the request
+            should go through the full pipeline
+        """
+        if not self.saturated:
+            return None
+        response = self.static_responses.get(intent)
+        if response is not None:
+            self._stats[intent]["degraded"] += 1
+        return response
+
+    @asynccontextmanager
+    async def admit(self, intent: str):
+        """
+        Hold a pipeline slot for the duration of the block.
+
+        Args:
+            intent: The pre-classified intent used for prioritisation
+
+        Raises:
+            AdmissionRejected: If the request was shed
+        """
+        await self._acquire(intent)
+        try:
+            yield
+        finally:
+            self._release()
+
+    async def _acquire(self, intent: str) -> None:
+        priority = self.priority_for(intent)
+        stats = self._stats[intent]
+
+        self._drop_done()
+        queue_blocked = bool(self._queue) and self._queue[0][0] <= priority
+        if self.in_flight < self._capacity_for(intent) and not queue_blocked:
+            self.in_flight += 1
+            stats["admitted"] += 1
+            return
+
+        if self._waiting >= self.max_queue and not self._evict_lower_than(priority):
+            stats["shed"] += 1
+            raise AdmissionRejected(intent, self._retry_after())
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (priority, next(self._seq), future, intent))
+        self._waiting += 1
+        started = time.perf_counter()
+        stats["queued"] += 1
+
+        try:
+            await asyncio.wait_for(future, timeout=self.queue_timeout)
+        except (asyncio.TimeoutError, AdmissionRejected):
+            stats["shed"] += 1
+            logger.warning(f"Shedding '{intent}' request after waiting {time.perf_counter() - started:.3f}s")
+            raise AdmissionRejected(intent, self._retry_after())
+        except asyncio.CancelledError:
+            # The slot may have been granted just before the client went away
+            if future.done() and not future.cancelled() and future.exception() is None:
+                self._release()
+            raise
+        finally:
+            if future.cancelled():
+                # Timed out or abandoned before being admitted or shed
+                self._waiting -= 1
+
+        waited = time.perf_counter() - started
+        stats["admitted"] += 1
+        stats["wait_seconds_total"] += waited
+        stats["wait_seconds_max"] = max(stats["wait_seconds_max"], waited)
+
+    def _drop_done(self) -> None:
+        """Pop timed-out and cancelled waiters off the front of the queue"""
+        while self._queue and self._queue[0][2].done():
+            heapq.heappop(self._queue)
+
+    def _evict_lower_than(self, priority: int) -> bool:
+        """Shed the worst queued waiter if it ranks below ``priority``"""
+        worst_index = None
+        for index, entry in enumerate(self._queue):
+            if entry[2].done():
+                continue
+            if worst_index is None or entry[:2] > self._queue[worst_index][:2]:
+                worst_index = index
+
+        if worst_index is None:
+            self._queue.clear()
+            return True
+        worst_priority, _, future, intent = self._queue[worst_index]
+        if worst_priority <= priority:
+            return False
+
+        future.set_exception(AdmissionRejected(intent, self._retry_after()))
+        self._waiting -= 1
+        self._queue[worst_index] = self._queue[-1]
+        self._queue.pop()
+        heapq.heapify(self._queue)
+        return True
+
+    def _release(self) -> None:
+        self.in_flight -= 1
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        """Hand freed slots to the highest-priority waiters"""
+        while self._queue:
+            _, _, future, intent = self._queue[0]
+            if future.done():
+                heapq.heappop(self._queue)
+                continue
+            if self.in_flight >= self._capacity_for(intent):
+                break
+            heapq.heappop(self._queue)
+            self.in_flight += 1
+            self._waiting -= 1
+            future.set_result(True)
+
+    def _retry_after(self) -> int:
+        return max(1, math.ceil(self.queue_timeout))
+
+    def stats(self) -> Dict[str, object]:
+        """
+        Get admission statistics.
+
+        Returns:
+            Dict: Current load and per-intent counters
+        """
+        return {
+            "in_flight": self.in_flight,
+            "queued": self._waiting,
+            "max_concurrency": self.max_concurrency,
+            "urgent_reserved": self.urgent_reserved,
+            "intents": {intent: dict(counters) for intent, counters in self._stats.items()},
+        }
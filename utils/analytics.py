@@ -0,0 +1,212 @@
+"""
+Incrementally maintained analytics rollups.
+
+Events (a classified intent, the agent that answered, a notification
+sent) are counted in memory per minute and per hour and added to the
+``analytics_rollups`` table in batches with an upsert. Dashboards read
+only the rollups, so their cost depends on the time range shown and not
+on how many messages have been stored. Per-minute buckets are pruned
+after a retention period; hourly buckets are kept.
+"""
+
+import asyncio
+import logging
+import os
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+from sqlalchemy import delete, select
+
+from models.analytics import AnalyticsRollup
+
+logger = logging.getLogger(__name__)
+
+GRANULARITIES = {"minute": timedelta(minutes=1), "hour": timedelta(hours=1)}
+
+DIMENSIONS = ("intent", "agent", "notification")
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def bucket_start(when: datetime, granularity: str) -> datetime:
+    """Start of the minute or hour containing ``when``"""
+    if granularity == "hour":
+        return when.replace(minute=0, second=0, microsecond=0)
+    return when.replace(second=0, microsecond=0)
+
+
+def _upsert(session, rows) -> None:
+    """Add counts to existing buckets, creating missing ones"""
+    dialect = session.bind.dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        statement = insert(AnalyticsRollup).values(rows)
+        session.execute(statement.on_conflict_do_update(
+            index_elements=["granularity", "bucket_start", "dimension", "key"],
+            set_={"count": AnalyticsRollup.count + statement.excluded.count},
+        ))
+        return
+    for row in rows:
+        existing = session.get(AnalyticsRollup, (row["granularity"], row["bucket_start"], row["dimension"], row["key"]))
+        if existing is None:
+            session.add(AnalyticsRollup(**row))
+        else:
+            existing.count += row["count"]
+
+
+class AnalyticsCollector:
+    """
+    In-memory counters flushed to the rollup table on a timer.
+
+    Args:
+        writer: The ``DatabaseWriter`` used for flushes
+        flush_interval: Seconds between flushes
+        minute_retention_hours: How long per-minute buckets are kept
+    """
+
+    def __init__(self, writer, flush_interval: Optional[float] = None, minute_retention_hours: Optional[float] = None):
+        self.writer = writer
+        self.flush_interval = flush_interval or float(os.getenv("ANALYTICS_FLUSH_INTERVAL", "5"))
+        self.minute_retention = timedelta(hours=minute_retention_hours or float(os.getenv("ANALYTICS_MINUTE_RETENTION_HOURS", "48")))
+        # (granularity, bucket start, dimension, key) -> count not yet written
+        self._pending: Counter = Counter()
+        self._timer = None
+        self._last_prune = None
+
+    def record(self, dimension: str, key: Optional[str], when: Optional[datetime] = None) -> None:
+        """
+        Count one event.
+
+        Args:
+            dimension: "intent", "agent" or "notification"
+            key: The intent, agent name or notification type
+            when: Event time in UTC (defaults to now)
+        """
+        if not key:
+            return
+        when = when or _utcnow()
+        for granularity in GRANULARITIES:
+            self._pending[(granularity, bucket_start(when, granularity), dimension, key[:100])] += 1
+
+    def _flush_job(self, pending: Counter, prune_before: Optional[datetime]):
+        """Write job: add pending counts and drop expired minute buckets"""
+        def job(session) -> None:
+            if pending:
+                _upsert(session, [
+                    {"granularity": granularity, "bucket_start": start, "dimension": dimension, "key": key, "count": count}
+                    for (granularity, start, dimension, key), count in pending.items()
+                ])
+            if prune_before is not None:
+                session.execute(delete(AnalyticsRollup).where(
+                    AnalyticsRollup.granularity == "minute",
+                    AnalyticsRollup.bucket_start < prune_before,
+                ))
+        return job
+
+    async def flush(self) -> int:
+        """
+        Write pending counts to the rollup table.
+
+        Returns:
+            int: Number of buckets updated
+        """
+        pending, self._pending = self._pending, Counter()
+        now = _utcnow()
+        prune_before = None
+        if self._last_prune is None or now - self._last_prune > timedelta(hours=1):
+            prune_before = now - self.minute_retention
+        if not pending and prune_before is None:
+            return 0
+        try:
+            await self.writer.run(self._flush_job(pending, prune_before))
+        except Exception:
+            # Keep the counts for the next attempt
+            self._pending.update(pending)
+            raise
+        if prune_before is not None:
+            self._last_prune = now
+        return len(pending)
+
+    def query(
+        self,
+        db,
+        granularity: str = "hour",
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        dimension: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Read counts per bucket from the rollups, including unflushed counts.
+
+        Args:
+            db: A database session
+            granularity: "minute" or "hour"
+            since: First bucket to include (UTC)
+            until: Buckets starting before this time are included (UTC)
+            dimension: Only this dimension, or all of them
+
+        Returns:
+            Dict[str, Any]: ``series`` of {dimension: {key: [{bucket, count}]}} and ``totals``
+        """
+        until = until or _utcnow()
+        since = bucket_start(since or until - timedelta(hours=24), granularity)
+        statement = select(
+            AnalyticsRollup.bucket_start, AnalyticsRollup.dimension, AnalyticsRollup.key, AnalyticsRollup.count
+        ).where(
+            AnalyticsRollup.granularity == granularity,
+            AnalyticsRollup.bucket_start >= since,
+            AnalyticsRollup.bucket_start < until,
+        )
+        if dimension:
+            statement = statement.where(AnalyticsRollup.dimension == dimension)
+
+        counts: Counter = Counter()
+        for start, row_dimension, key, count in db.execute(statement):
+            counts[(start, row_dimension, key)] += count
+        # Copied in one step: endpoints may call this from a worker thread
+        for (pending_granularity, start, row_dimension, key), count in list(self._pending.items()):
+            if pending_granularity == granularity and since <= start < until and (not dimension or row_dimension == dimension):
+                counts[(start, row_dimension, key)] += count
+
+        series: Dict[str, Dict[str, list]] = {}
+        totals: Dict[str, Counter] = {}
+        for (start, row_dimension, key), count in sorted(counts.items()):
+            series.setdefault(row_dimension, {}).setdefault(key, []).append({"bucket": start, "count": count})
+            totals.setdefault(row_dimension, Counter())[key] += count
+        return {
+            "granularity": granularity,
+            "since": since,
+            "until": until,
+            "series": series,
+            "totals": {name: dict(counter.most_common()) for name, counter in totals.items()},
+        }
+
+    async def _run_timer(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Analytics flush failed: {str(e)}")
+
+    async def start(self) -> None:
+        """Start flushing on a timer"""
+        if self._timer is None:
+            self._timer = asyncio.create_task(self._run_timer())
+
+    async def stop(self) -> None:
+        """Stop the timer and write what is left"""
+        if self._timer is not None:
+            self._timer.cancel()
+            try:
+                await self._timer
+            except asyncio.CancelledError:
+                pass
+            self._timer = None
+        await self.flush()
@@ -0,0 +1,341 @@
+"""
+Retention tiering for conversations.
+
+Conversations with no activity for a configurable number of days are moved
+out of the hot ``conversations``/``messages`` tables into append-only,
+compressed archive segments. Each conversation is written as its own
+compressed frame, and a sidecar index maps conversation ids to
+``(segment, offset, length)`` so a single conversation can be read back
+without decompressing the whole segment. With ``SHARD_URLS`` every shard
+is archived in turn.
+
+Usage:
+    python -m utils.archive --days 90 --batch-size 500
+"""
+
+import argparse
+import gzip
+import json
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import func, select
+
+from models.chat import Conversation, Message
+
+# zstd gives better ratios and speed, gzip is always available
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SEGMENT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def _isoformat(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value else None
+
+
+class ConversationArchive:
+    """
+    Append-only store of archived conversations.
+    """
+
+    INDEX_FILE = "index.jsonl"
+
+    def __init__(self, directory: Optional[str] = None, segment_max_bytes: int = DEFAULT_SEGMENT_MAX_BYTES):
+        self.directory = directory or os.getenv("ARCHIVE_DIR", "./archive")
+        self.segment_max_bytes = segment_max_bytes
+        self.extension = ".jsonl.zst" if ZSTD_AVAILABLE else ".jsonl.gz"
+        self._index: Dict[int, Dict] = {}
+        self._index_size = 0
+        self._lock = threading.Lock()
+
+    @property
+    def index_path(self) -> str:
+        return os.path.join(self.directory, self.INDEX_FILE)
+
+    def _compress(self, data: bytes) -> bytes:
+        if self.extension.endswith(".zst"):
+            return zstandard.ZstdCompressor(level=10).compress(data)
+        return gzip.compress(data, compresslevel=6)
+
+    @staticmethod
+    def _decompress(segment: str, data: bytes) -> bytes:
+        if segment.endswith(".zst"):
+            if not ZSTD_AVAILABLE:
+                raise RuntimeError(f"zstandard is required to read archive segment {segment}")
+            return zstandard.ZstdDecompressor().decompress(data)
+        return gzip.decompress(data)
+
+    def _refresh_index(self) -> None:
+        """Load index entries appended since the last read (possibly by another process)"""
+        try:
+            size = os.path.getsize(self.index_path)
+        except OSError:
+            return
+        if size == self._index_size:
+            return
+
+        with open(self.index_path, "rb") as f:
+            f.seek(self._index_size)
+            data = f.read(size - self._index_size)
+
+        # Only consume complete lines; a partial trailing line is picked up next time
+        complete = data[: data.rfind(b"\n") + 1]
+        for line in complete.splitlines():
+            if line.strip():
+                entry = json.loads(line)
+                self._index[entry["conversation_id"]] = entry
+        self._index_size += len(complete)
+
+    def _current_segment(self) -> str:
+        segments = sorted(
+            name for name in os.listdir(self.directory)
+            if name.startswith("segment-") and name.endswith(self.extension)
+        )
+        if segments:
+            latest = segments[-1]
+            if os.path.getsize(os.path.join(self.directory, latest)) < self.segment_max_bytes:
+                return latest
+            number = int(latest[len("segment-"):].split(".")[0]) + 1
+        else:
+            number = 1
+        return f"segment-{number:06d}{self.extension}"
+
+    def append(self, records: Iterable[Dict]) -> int:
+        """
+        Append archived conversation records.
+
+        The segment data is fsynced before the index entries are written,
+        so an index entry never points at data that is not on disk.
+
+        Args:
+            records: Conversation dicts with an ``id`` and ``messages``
+
+        Returns:
+            int: Number of conversations archived
+        """
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            segment = self._current_segment()
+            entries = []
+
+            with open(os.path.join(self.directory, segment), "ab") as f:
+                offset = f.tell()
+                for record in records:
+                    frame = self._compress(json.dumps(record, ensure_ascii=False).encode("utf-8"))
+                    f.write(frame)
+                    entries.append({
+                        "conversation_id": record["id"],
+                        "segment": segment,
+                        "offset": offset,
+                        "length": len(frame),
+                        "archived_at": record.get("archived_at"),
+                    })
+                    offset += len(frame)
+                f.flush()
+                os.fsync(f.fileno())
+
+            with open(self.index_path, "ab") as f:
+                f.write("".join(json.dumps(entry) + "\n" for entry in entries).encode("utf-8"))
+                f.flush()
+                os.fsync(f.fileno())
+
+            return len(entries)
+
+    def max_conversation_id(self) -> Optional[int]:
+        """Highest archived conversation id, or None if nothing is archived"""
+        with self._lock:
+            self._refresh_index()
+            return max(self._index, default=None)
+
+    def get(self, conversation_id: int) -> Optional[Dict]:
+        """
+        Retrieve an archived conversation.
+
+        Args:
+            conversation_id: The conversation id
+
+        Returns:
+            Optional[Dict]: The archived record, or None if it was never archived
+        """
+        with self._lock:
+            entry = self._index.get(conversation_id)
+            if entry is None:
+                self._refresh_index()
+                entry = self._index.get(conversation_id)
+        if entry is None:
+            return None
+
+        with open(os.path.join(self.directory, entry["segment"]), "rb") as f:
+            f.seek(entry["offset"])
+            frame = f.read(entry["length"])
+        return json.loads(self._decompress(entry["segment"], frame))
+
+
+def _serialize_conversation(conversation: Conversation, messages: List[Message], archived_at: str) -> Dict:
+    return {
+        "id": conversation.id,
+        "created_at": _isoformat(conversation.created_at),
+        "updated_at": _isoformat(conversation.updated_at),
+        "archived_at": archived_at,
+        "messages": [
+            {
+                "id": msg.id,
+                "content": msg.content,
+                "is_user": msg.is_user,
+                "timestamp": _isoformat(msg.timestamp),
+                "conversation_id": msg.conversation_id,
+                "intent": msg.intent,
+                "agent": msg.agent,
+            }
+            for msg in messages
+        ],
+    }
+
+
+def reserve_archived_ids(bind, archive: ConversationArchive) -> None:
+    """
+    Keep new conversations from taking an archived conversation's id.
+
+    On SQLite the conversations table uses AUTOINCREMENT, so ids deleted by
+    archiving are not handed out again. Conversations archived before the
+    table had it can still sit above the sequence; this moves the sequence
+    past them.
+    """
+    if bind.dialect.name != "sqlite":
+        return
+    highest = archive.max_conversation_id()
+    if highest is None:
+        return
+    with bind.begin() as conn:
+        row = conn.exec_driver_sql("SELECT seq FROM sqlite_sequence WHERE name = 'conversations'").first()
+        if row is None:
+            conn.exec_driver_sql("INSERT INTO sqlite_sequence (name, seq) VALUES ('conversations', ?)", (highest,))
+        elif row[0] < highest:
+            conn.exec_driver_sql("UPDATE sqlite_sequence SET seq = ? WHERE name = 'conversations'", (highest,))
+
+
+def _lock_batch(db, ids: List[int]) -> None:
+    """Start a transaction in which no message can be added to the batch's conversations"""
+    if db.get_bind().dialect.name == "sqlite":
+        # No row locks: take the database write lock before re-reading
+        db.connection().exec_driver_sql("BEGIN IMMEDIATE")
+    else:
+        # Adding a message locks its conversation row (foreign key check), which this waits for and then blocks
+        db.execute(select(Conversation.id).where(Conversation.id.in_(ids)).with_for_update())
+
+
+def archive_inactive_conversations(session_factory, archive: ConversationArchive, days: int, batch_size: int = 500) -> int:
+    """
+    Move conversations inactive for ``days`` days into the archive.
+
+    Each batch is written to the archive first and only then deleted from
+    the hot tables, so an interrupted run never loses data (at worst a
+    batch is archived twice, and the later index entry wins). The delete
+    runs in a transaction that holds off new messages and re-counts each
+    conversation's messages; a conversation that gained one since it was
+    archived stays in the hot tables.
+
+    Args:
+        session_factory: Callable returning a new DB session
+        archive: The archive to write to
+        days: Inactivity threshold in days
+        batch_size: Conversations moved per transaction
+
+    Returns:
+        int: Number of conversations archived
+    """
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    last_activity = func.coalesce(func.max(Message.timestamp), Conversation.created_at)
+    total = 0
+    last_id = 0
+
+    while True:
+        db = session_factory()
+        try:
+            ids = [
+                row[0] for row in db.query(Conversation.id)
+                .outerjoin(Message, Message.conversation_id == Conversation.id)
+                .filter(Conversation.id > last_id)
+                .group_by(Conversation.id)
+                .having(last_activity < cutoff)
+                .order_by(Conversation.id)
+                .limit(batch_size)
+                .all()
+            ]
+            if not ids:
+                break
+
+            conversations = db.query(Conversation).filter(Conversation.id.in_(ids)).order_by(Conversation.id).all()
+            messages_by_conversation: Dict[int, List[Message]] = {conversation_id: [] for conversation_id in ids}
+            for msg in db.query(Message).filter(Message.conversation_id.in_(ids)).order_by(Message.id):
+                messages_by_conversation[msg.conversation_id].append(msg)
+
+            archived_at = datetime.utcnow().isoformat()
+            archive.append(
+                _serialize_conversation(conversation, messages_by_conversation[conversation.id], archived_at)
+                for conversation in conversations
+            )
+            db.commit()
+
+            _lock_batch(db, ids)
+            counts = dict(
+                db.query(Message.conversation_id, func.count())
+                .filter(Message.conversation_id.in_(ids))
+                .group_by(Message.conversation_id)
+                .all()
+            )
+            unchanged = [
+                conversation_id for conversation_id in ids
+                if counts.get(conversation_id, 0) == len(messages_by_conversation[conversation_id])
+            ]
+            if unchanged:
+                db.query(Message).filter(Message.conversation_id.in_(unchanged)).delete(synchronize_session=False)
+                db.query(Conversation).filter(Conversation.id.in_(unchanged)).delete(synchronize_session=False)
+            db.commit()
+
+            total += len(unchanged)
+            last_id = ids[-1]
+            logger.info(f"Archived {len(unchanged)} conversations (total {total})")
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    return total
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    from sharding import ShardRouter
+
+    parser = argparse.ArgumentParser(description="Archive inactive conversations out of the hot tables")
+    parser.add_argument("--days", type=int, default=int(os.getenv("RETENTION_DAYS", "90")),
+                        help="Archive conversations with no activity for this many days")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--archive-dir", default=None)
+    parser.add_argument("--vacuum", action="store_true", help="Reclaim free space afterwards (SQLite only)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    archive = ConversationArchive(args.archive_dir)
+    # Every shard in SHARD_URLS (the primary alone without it); no ids are allocated
+    for shard in ShardRouter.from_env(node_id=0).shards:
+        total = archive_inactive_conversations(shard.session_factory, archive, args.days, args.batch_size)
+        logger.info(f"Archived {total} conversations older than {args.days} days from shard {shard.index} into {archive.directory}")
+
+        if args.vacuum and shard.engine.dialect.name == "sqlite":
+            with shard.engine.connect() as conn:
+                conn.exec_driver_sql("VACUUM")
+
+
+if __name__ == "__main__":
+    main()
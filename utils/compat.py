@@ -0,0 +1,34 @@
+"""
+Fallbacks for standard library helpers newer than the supported Python.
+
+The app supports Python 3.8+; ``contextlib.aclosing`` arrived in 3.10 and
+``asyncio.to_thread`` in 3.9.
+"""
+
+import asyncio
+import contextvars
+import functools
+
+try:
+    from contextlib import aclosing
+except ImportError:  # Python < 3.10
+    class aclosing:
+        """Async context manager calling ``aclose()`` on the wrapped object on exit"""
+
+        def __init__(self, thing):
+            self.thing = thing
+
+        async def __aenter__(self):
+            return self.thing
+
+        async def __aexit__(self, *exc_info):
+            await self.thing.aclose()
+
+try:
+    from asyncio import to_thread
+except ImportError:  # Python < 3.9
+    async def to_thread(func, *args, **kwargs):
+        """Run ``func`` in the default executor, keeping the caller's context variables"""
+        loop = asyncio.get_running_loop()
+        call = functools.partial(contextvars.copy_context().run, func, *args, **kwargs)
+        return await loop.run_in_executor(None, call)
@@ -0,0 +1,246 @@
+"""
+Streaming bulk export of conversations and tickets.
+
+Rows are read through a server-side cursor (``yield_per``), encoded as
+NDJSON or CSV and written out in chunks of about ``EXPORT_CHUNK_BYTES``,
+so an export holds one batch of rows and one output chunk at a time no
+matter how many rows it covers. The generators are synchronous: served
+from a ``StreamingResponse`` each chunk is produced in the threadpool,
+leaving the event loop free for other requests, and the compression
+middleware compresses the chunks as they go out.
+
+NDJSON writes one conversation per line with its messages nested; CSV
+writes one row per message, repeating the conversation's columns.
+Conversations without messages appear once, with empty message columns.
+Archived conversations are not included.
+"""
+
+import csv
+import io
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+from itertools import chain, groupby
+from operator import itemgetter
+from typing import Any, Callable, Iterable, Iterator, Mapping, Optional, Sequence
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from models.chat import Conversation, Message
+from models.ticket import Ticket
+from utils.serialization import dumps, iter_json_object
+
+logger = logging.getLogger(__name__)
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+EXPORT_CHUNK_BYTES = int(os.getenv("EXPORT_CHUNK_BYTES", str(64 * 1024)))
+
+# One row per message, with its conversation's columns
+CONVERSATION_COLUMNS = (
+    Conversation.id.label("conversation_id"),
+    Conversation.created_at.label("conversation_created_at"),
+    Message.id.label("message_id"),
+    Message.timestamp,
+    Message.is_user,
+    Message.intent,
+    Message.agent,
+    Message.content,
+)
+CONVERSATION_CSV_FIELDS = tuple(column.key for column in CONVERSATION_COLUMNS)
+
+TICKET_COLUMNS = tuple(Ticket.__table__.c)
+TICKET_FIELDS = tuple(column.key for column in TICKET_COLUMNS)
+
+
+def _utc(value: Optional[datetime]) -> Optional[datetime]:
+    # Stored timestamps are naive UTC
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def conversation_query(since: Optional[datetime] = None, until: Optional[datetime] = None):
+    """
+    Conversations created in ``[since, until)`` joined to their messages.
+
+    Ordered by conversation then message id, which follows the primary key
+    and the ``conversation_id`` index, so the database streams the rows
+    without sorting them first.
+    """
+    statement = select(*CONVERSATION_COLUMNS).outerjoin(Message, Message.conversation_id == Conversation.id)
+    if since is not None:
+        statement = statement.where(Conversation.created_at >= _utc(since))
+    if until is not None:
+        statement = statement.where(Conversation.created_at < _utc(until))
+    return statement.order_by(Conversation.id, Message.id)
+
+
+def ticket_query(since: Optional[datetime] = None, until: Optional[datetime] = None, status: Optional[str] = None):
+    """Tickets created in ``[since, until)``, optionally with one status, by id"""
+    statement = select(*TICKET_COLUMNS)
+    if since is not None:
+        statement = statement.where(Ticket.created_at >= _utc(since))
+    if until is not None:
+        statement = statement.where(Ticket.created_at < _utc(until))
+    if status is not None:
+        statement = statement.where(Ticket.status == status)
+    return statement.order_by(Ticket.id)
+
+
+def stream_rows(session_factories: Iterable[Callable[[], Session]], statement, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[Mapping[str, Any]]:
+    """
+    Yield a query's rows from each database in turn.
+
+    Each database is read with its own session and a server-side cursor
+    fetching ``batch_size`` rows at a time; the session is closed once its
+    rows are exhausted or the consumer stops early.
+    """
+    for session_factory in session_factories:
+        with session_factory() as db:
+            result = db.execute(statement.execution_options(yield_per=batch_size))
+            yield from result.mappings()
+
+
+def _chunked(pieces: Iterable[bytes], chunk_bytes: int) -> Iterator[bytes]:
+    """Join small encoded pieces into chunks of about ``chunk_bytes``"""
+    buffer = []
+    size = 0
+    for piece in pieces:
+        buffer.append(piece)
+        size += len(piece)
+        if size >= chunk_bytes:
+            yield b"".join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+def _conversation_lines(rows: Iterable[Mapping[str, Any]]) -> Iterator[bytes]:
+    for conversation_id, group in groupby(rows, key=itemgetter("conversation_id")):
+        first = next(group)
+        head = {"id": conversation_id, "created_at": first["conversation_created_at"]}
+        messages = (
+            {
+                "id": row["message_id"],
+                "content": row["content"],
+                "conversation_id": conversation_id,
+                "timestamp": row["timestamp"],
+                "is_user": row["is_user"],
+                "intent": row["intent"],
+                "agent": row["agent"],
+            }
+            for row in chain((first,), group)
+            if row["message_id"] is not None
+        )
+        # Streamed item by item, so a long history is never held whole
+        yield from iter_json_object(head, "messages", messages)
+        yield b"\n"
+
+
+def _ndjson_lines(rows: Iterable[Mapping[str, Any]]) -> Iterator[bytes]:
+    for row in rows:
+        yield dumps(dict(row)) + b"\n"
+
+
+def _csv_value(value: Any) -> Any:
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _csv_chunks(fields: Sequence[str], rows: Iterable[Mapping[str, Any]], chunk_bytes: int) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    for row in rows:
+        writer.writerow([_csv_value(row[field]) for field in fields])
+        if buffer.tell() >= chunk_bytes:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def export_conversations(rows: Iterable[Mapping[str, Any]], format: str = "ndjson", chunk_bytes: int = EXPORT_CHUNK_BYTES) -> Iterator[bytes]:
+    """
+    Encode ``conversation_query`` rows for download.
+
+    Args:
+        rows: Rows ordered by conversation, e.g. from ``stream_rows``
+        format: ``ndjson`` (a conversation per line) or ``csv`` (a message per row)
+        chunk_bytes: Approximate size of the yielded chunks
+    """
+    if format == "csv":
+        return _csv_chunks(CONVERSATION_CSV_FIELDS, rows, chunk_bytes)
+    return _chunked(_conversation_lines(rows), chunk_bytes)
+
+
+def export_tickets(rows: Iterable[Mapping[str, Any]], format: str = "ndjson", chunk_bytes: int = EXPORT_CHUNK_BYTES) -> Iterator[bytes]:
+    """Encode ``ticket_query`` rows for download, a ticket per line or row"""
+    if format == "csv":
+        return _csv_chunks(TICKET_FIELDS, rows, chunk_bytes)
+    return _chunked(_ndjson_lines(rows), chunk_bytes)
+
+
+class ExportLimiter:
+    """
+    Bounds the exports running at once.
+
+    An export keeps a pooled connection for as long as it streams, so
+    unbounded concurrent exports could starve regular requests of
+    connections.
+
+    Args:
+        limit: Exports allowed to run at once
+    """
+
+    def __init__(self, limit: Optional[int] = None):
+        self.limit = limit or int(os.getenv("EXPORT_MAX_CONCURRENT", "2"))
+        self._semaphore = threading.BoundedSemaphore(self.limit)
+        self._lock = threading.Lock()
+        self.active = 0
+        self.started = 0
+        self.rejected = 0
+
+    def acquire(self) -> Optional[Callable[[], None]]:
+        """
+        Take a slot without waiting.
+
+        Returns:
+            Optional[Callable[[], None]]: Releases the slot (only the first
+            call has an effect), or None if all slots are taken
+        """
+        if not self._semaphore.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            return None
+        with self._lock:
+            self.active += 1
+            self.started += 1
+        released = []
+
+        def release() -> None:
+            with self._lock:
+                if released:
+                    return
+                released.append(True)
+                self.active -= 1
+            self._semaphore.release()
+
+        return release
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"limit": self.limit, "active": self.active, "started": self.started, "rejected": self.rejected}
+
+
+def release_after(chunks: Iterable[bytes], release: Callable[[], None]) -> Iterator[bytes]:
+    """Yield the chunks, calling ``release`` when they end or the consumer stops"""
+    try:
+        yield from chunks
+    finally:
+        release()
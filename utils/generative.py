@@ -0,0 +1,296 @@
+"""
+Optional LLM-generated answers for the FAQ, ticket and account agents.
+
+Prompts are rendered from the compiled ``PromptTemplates`` and grounded in the FAQ data:
+the few FAQ entries most relevant to the message are retrieved from a small
+in-memory index and passed as reference context, which keeps prompts short
+and answers consistent with the static ones. Completions are streamed
+through the shared ``LLMGateway`` with a per-intent token budget and a cap
+on concurrent generations. Any failure returns None so agents fall back to
+their static answers.
+
+Enable with ``GENERATIVE_RESPONSES=true`` (requires ``OPENAI_API_KEY``).
+"""
+
+import asyncio
+import json
+import logging
+import math
+import os
+import re
+from collections import OrderedDict, defaultdict
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from utils.compat import aclosing
+from utils.llm_gateway import get_llm_gateway, parse_limits
+from utils.prompt_templates import CompiledPrompt, PromptTemplates
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Default completion token budget per intent
+DEFAULT_TOKEN_BUDGETS: Dict[str, int] = {
+    "faq": 200,
+    "help": 200,
+    "product": 200,
+    "account": 200,
+    "order": 150,
+    "complaint": 150,
+    "other": 150,
+    "urgent": 120,
+}
+DEFAULT_TOKEN_BUDGET = 150
+
+# FAQ entries that are conversational rather than reference material
+NON_REFERENCE_FAQS = {"greeting", "farewell", "default"}
+
+GROUNDING_INSTRUCTIONS = (
+    "Use the reference information below when it is relevant and do not "
+    "contradict it. If it does not cover the question, say so briefly and "
+    "offer to create a support ticket."
+)
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = {
+    "a", "an", "and", "are", "can", "do", "does", "for", "how", "i", "in", "is",
+    "it", "me", "my", "of", "on", "or", "the", "to", "what", "when", "where",
+    "with", "you", "your",
+}
+
+
+def _tokenize(text: str) -> List[str]:
+    return [token for token in _TOKEN_RE.findall(text.lower()) if token not in _STOPWORDS]
+
+
+class FAQIndex:
+    """
+    Inverted index over FAQ entries with TF-IDF scoring.
+
+    Each entry is indexed by the words of its key (e.g. ``business_hours``)
+    and its answer; key words count double since they name the topic.
+    """
+
+    def __init__(self, faqs: Dict[str, str]):
+        self.faqs = {key: answer for key, answer in faqs.items() if key not in NON_REFERENCE_FAQS}
+        self._postings: Dict[str, Dict[str, float]] = defaultdict(dict)
+        for key, answer in self.faqs.items():
+            counts: Dict[str, float] = defaultdict(float)
+            for token in _tokenize(key.replace("_", " ")):
+                counts[token] += 2.0
+            for token in _tokenize(answer):
+                counts[token] += 1.0
+            for token, count in counts.items():
+                self._postings[token][key] = count
+
+        total = max(len(self.faqs), 1)
+        self._idf = {token: math.log(1 + total / len(postings)) for token, postings in self._postings.items()}
+
+    def search(self, query: str, k: int = 2) -> List[Tuple[str, str]]:
+        """
+        Find the FAQ entries most relevant to a query.
+
+        Args:
+            query: The user's message
+            k: Maximum number of entries to return
+
+        Returns:
+            List[Tuple[str, str]]: (key, answer) pairs, best match first
+        """
+        scores: Dict[str, float] = defaultdict(float)
+        for token in set(_tokenize(query)):
+            idf = self._idf.get(token)
+            if idf is None:
+                continue
+            for key, count in self._postings[token].items():
+                scores[key] += idf * (1 + math.log(count))
+        best = sorted(scores, key=scores.get, reverse=True)[:k]
+        # Drop weak matches that would only pad the prompt
+        return [(key, self.faqs[key]) for key in best if scores[key] >= scores[best[0]] / 2]
+
+
+def load_faqs(path: str = "data/faqs.json") -> Dict[str, str]:
+    """Load the FAQ data used for grounding, or an empty dict"""
+    try:
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                return json.load(f)
+    except Exception as e:
+        logger.warning(f"Error loading FAQs for grounding: {str(e)}")
+    return {}
+
+
+class GenerativeResponder:
+    """
+    Renders prompts, retrieves FAQ context and streams completions.
+    """
+
+    def __init__(
+        self,
+        gateway,
+        faq_index: FAQIndex,
+        model: str = "gpt-3.5-turbo",
+        max_concurrency: int = 8,
+        timeout: float = 15.0,
+        context_size: int = 2,
+        token_budgets: Optional[Dict[str, int]] = None,
+        prefix_cache_size: int = 256,
+    ):
+        self.gateway = gateway
+        self.faq_index = faq_index
+        self.model = model
+        self.timeout = timeout
+        self.context_size = context_size
+        self.token_budgets = {**DEFAULT_TOKEN_BUDGETS, **(token_budgets or {})}
+        self.prefix_cache_size = prefix_cache_size
+        self.max_concurrency = max_concurrency
+        # Created on first use: before Python 3.10 it binds to the loop current at creation
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._prefix_cache: "OrderedDict[Tuple[str, ...], str]" = OrderedDict()
+
+    @classmethod
+    def from_env(cls) -> Optional["GenerativeResponder"]:
+        """
+        Build a responder from environment variables.
+
+        Returns:
+            Optional[GenerativeResponder]: The responder, or None if disabled
+        """
+        if os.getenv("GENERATIVE_RESPONSES", "false").lower() not in ("1", "true", "yes"):
+            return None
+        gateway = get_llm_gateway()
+        if gateway is None:
+            logger.warning("GENERATIVE_RESPONSES is enabled but OpenAI is not configured")
+            return None
+        return cls(
+            gateway,
+            FAQIndex(load_faqs()),
+            model=os.getenv("GENERATIVE_MODEL", "gpt-3.5-turbo"),
+            max_concurrency=int(os.getenv("GENERATIVE_MAX_CONCURRENCY", "8")),
+            timeout=float(os.getenv("GENERATIVE_TIMEOUT", "15")),
+            context_size=int(os.getenv("GENERATIVE_CONTEXT_SIZE", "2")),
+            token_budgets=parse_limits(os.getenv("GENERATIVE_MAX_TOKENS", "")),
+        )
+
+    def token_budget(self, intent: str) -> int:
+        """Maximum completion tokens for an intent"""
+        return self.token_budgets.get(intent, DEFAULT_TOKEN_BUDGET)
+
+    def _system_prompt(self, template: CompiledPrompt, context_keys: Tuple[str, ...]) -> str:
+        """
+        Template prefix, grounding instructions and reference context,
+        cached per (template, context).
+
+        The same few FAQ combinations come up again and again, so the
+        rendered prefix is reused; it is also byte-identical across calls
+        and starts with the template's static prefix, which lets the
+        provider's prompt caching apply.
+        """
+        cache_key = (template.name,) + context_keys
+        prompt = self._prefix_cache.get(cache_key)
+        if prompt is not None:
+            self._prefix_cache.move_to_end(cache_key)
+            return prompt
+
+        prompt = template.prefix
+        if context_keys:
+            reference = "\n".join(f"- {key.replace('_', ' ')}: {self.faq_index.faqs[key]}" for key in context_keys)
+            prompt = f"{prompt}\n\n{GROUNDING_INSTRUCTIONS}\n\nReference information:\n{reference}"
+        self._prefix_cache[cache_key] = prompt
+        if len(self._prefix_cache) > self.prefix_cache_size:
+            self._prefix_cache.popitem(last=False)
+        return prompt
+
+    def build_messages(self, message: str, intent: str, kind: str) -> List[Dict[str, str]]:
+        """
+        Render the chat messages for a request.
+
+        Args:
+            message: The user's message
+            intent: The classified intent
+            kind: Which template to use: ``faq``, ``ticket`` or ``account``
+
+        Returns:
+            List[Dict[str, str]]: System and user messages
+        """
+        if kind == "ticket":
+            template = PromptTemplates.compiled("ticket_creation")
+            user_prompt = template.render_suffix(message=message, priority="urgent" if intent == "urgent" else "standard")
+            context_keys: Tuple[str, ...] = ()
+        else:
+            if kind == "account":
+                template = PromptTemplates.compiled("account_query")
+                user_prompt = template.render_suffix(message=message)
+            else:
+                template = PromptTemplates.compiled("faq_response")
+                user_prompt = template.render_suffix(message=message, intent=intent)
+            context_keys = tuple(key for key, _ in self.faq_index.search(message, self.context_size))
+        return [
+            {"role": "system", "content": self._system_prompt(template, context_keys)},
+            {"role": "user", "content": user_prompt},
+        ]
+
+    async def stream(self, message: str, intent: str, kind: str = "faq") -> AsyncIterator[str]:
+        """
+        Stream a generated answer.
+
+        Yields:
+            str: Content deltas in order
+        """
+        messages = self.build_messages(message, intent, kind)
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            async for delta in self.gateway.stream_chat_completion(
+                self.model,
+                messages,
+                max_tokens=self.token_budget(intent),
+                temperature=0.3,
+            ):
+                yield delta
+
+    async def _collect(self, message: str, intent: str, kind: str) -> str:
+        # aclosing releases the concurrency slot promptly if we time out mid-stream
+        async with aclosing(self.stream(message, intent, kind)) as deltas:
+            parts = [delta async for delta in deltas]
+        return "".join(parts).strip()
+
+    async def respond(self, message: str, intent: str, kind: str = "faq") -> Optional[str]:
+        """
+        Generate a complete answer.
+
+        Args:
+            message: The user's message
+            intent: The classified intent
+            kind: Which template to use: ``faq``, ``ticket`` or ``account``
+
+        Returns:
+            Optional[str]: The answer, or None if generation failed
+        """
+        try:
+            answer = await asyncio.wait_for(self._collect(message, intent, kind), self.timeout)
+        except Exception as e:
+            logger.error(f"Error generating {kind} response: {str(e)}")
+            return None
+        return answer or None
+
+
+_responder: Optional[GenerativeResponder] = None
+_responder_loaded = False
+
+
+def get_generative_responder() -> Optional[GenerativeResponder]:
+    """
+    The process-wide responder shared by all agents.
+
+    Returns:
+        Optional[GenerativeResponder]: The responder, or None if disabled
+    """
+    global _responder, _responder_loaded
+    if not _responder_loaded:
+        _responder = GenerativeResponder.from_env()
+        _responder_loaded = True
+    return _responder
@@ -0,0 +1,295 @@
+"""
+HTTP caching and response compression.
+
+``conditional_headers`` and ``is_not_modified`` implement ETag and
+Last-Modified validation for API reads. ``CompressionMiddleware``
+negotiates brotli (when the ``brotli`` package is installed) or gzip from
+``Accept-Encoding`` and compresses text responses above a size threshold,
+including streamed ones. ``CachedStaticFiles`` serves fingerprinted asset
+URLs (``/static/style.css?v=<hash>``) with a long ``max-age``;
+``static_url`` builds those URLs for templates.
+"""
+
+import hashlib
+import logging
+import os
+import zlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.staticfiles import StaticFiles
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# brotli is optional
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/x-ndjson", "application/javascript", "image/svg+xml")
+
+
+def conditional_headers(etag: str, last_modified: Optional[datetime] = None) -> Dict[str, str]:
+    """
+    Validator headers for a cacheable API response.
+
+    ``no-cache`` lets the browser keep the response but makes it revalidate
+    each time, which costs a 304 instead of the full body.
+
+    Args:
+        etag: The entity tag, including quotes
+        last_modified: When the resource last changed (naive values are UTC)
+
+    Returns:
+        Dict[str, str]: ETag, Last-Modified and Cache-Control headers
+    """
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if last_modified is not None:
+        if last_modified.tzinfo is None:
+            last_modified = last_modified.replace(tzinfo=timezone.utc)
+        headers["Last-Modified"] = format_datetime(last_modified.astimezone(timezone.utc), usegmt=True)
+    return headers
+
+
+def is_not_modified(request_headers, etag: str, last_modified: Optional[datetime] = None) -> bool:
+    """
+    Whether a conditional GET can be answered with 304 Not Modified.
+
+    If-None-Match takes precedence over If-Modified-Since, as in RFC 9110.
+    """
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match is not None:
+        # Weak comparison: compression may have weakened our tag
+        ours = etag[2:] if etag.startswith("W/") else etag
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or any((tag[2:] if tag.startswith("W/") else tag) == ours for tag in tags)
+
+    if_modified_since = request_headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if last_modified.tzinfo is None:
+            last_modified = last_modified.replace(tzinfo=timezone.utc)
+        # HTTP dates have one-second resolution
+        return last_modified.replace(microsecond=0) <= since
+    return False
+
+
+class _GzipCompressor:
+    def __init__(self, level: int):
+        # wbits=31 writes a gzip header and trailer
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        # Sync flush so each streamed chunk reaches the client promptly
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_FINISH)
+
+
+class _BrotliCompressor:
+    def __init__(self, quality: int):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compressor.process(data) + self._compressor.finish()
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """
+    Pick the best supported encoding from an Accept-Encoding header.
+
+    Returns:
+        Optional[str]: ``br``, ``gzip`` or None
+    """
+    weights: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        parts = item.strip().split(";")
+        coding = parts[0].strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in parts[1:]:
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        weights[coding] = quality
+
+    candidates = (["br"] if BROTLI_AVAILABLE else []) + ["gzip"]
+    best, best_quality = None, 0.0
+    for coding in candidates:
+        quality = weights.get(coding, weights.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+class CompressionMiddleware:
+    """
+    Compress HTTP responses with brotli or gzip.
+
+    Responses that are small, already encoded or not text-like are passed
+    through untouched.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: Optional[int] = None, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size if minimum_size is not None else int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await _CompressionResponder(self, encoding)(scope, receive, send)
+
+
+class _CompressionResponder:
+    def __init__(self, middleware: CompressionMiddleware, encoding: str):
+        self.middleware = middleware
+        self.encoding = encoding
+        self.send = None
+        self.start_message: Message = {}
+        self.compressor = None
+        self.passthrough = False
+        self.started = False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        self.send = send
+        await self.middleware.app(scope, receive, self.send_compressed)
+
+    def _new_compressor(self):
+        if self.encoding == "br":
+            return _BrotliCompressor(self.middleware.brotli_quality)
+        return _GzipCompressor(self.middleware.gzip_level)
+
+    def _start_compressed(self, length: Optional[int]) -> None:
+        headers = MutableHeaders(raw=self.start_message["headers"])
+        headers["Content-Encoding"] = self.encoding
+        headers.add_vary_header("Accept-Encoding")
+        if length is None:
+            del headers["Content-Length"]
+        else:
+            headers["Content-Length"] = str(length)
+        # A strong ETag names the identity bytes, so weaken it
+        etag = headers.get("etag")
+        if etag and not etag.startswith("W/"):
+            headers["ETag"] = f"W/{etag}"
+
+    async def send_compressed(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            headers = Headers(raw=message["headers"])
+            content_type = headers.get("content-type", "")
+            self.passthrough = (
+                "content-encoding" in headers
+                or not content_type.startswith(COMPRESSIBLE_TYPES)
+            )
+            return
+
+        if message["type"] != "http.response.body":
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if not self.started:
+            self.started = True
+            if self.passthrough or (not more_body and len(body) < self.middleware.minimum_size):
+                self.passthrough = True
+                await self.send(self.start_message)
+                await self.send(message)
+                return
+
+            self.compressor = self._new_compressor()
+            if more_body:
+                self._start_compressed(None)
+                message["body"] = self.compressor.compress(body)
+            else:
+                message["body"] = self.compressor.finish(body)
+                self._start_compressed(len(message["body"]))
+            await self.send(self.start_message)
+            await self.send(message)
+            return
+
+        if not self.passthrough:
+            message["body"] = self.compressor.compress(body) if more_body else self.compressor.finish(body)
+        await self.send(message)
+
+
+class CachedStaticFiles(StaticFiles):
+    """
+    Static files with long-lived caching for fingerprinted URLs.
+
+    Requests carrying a ``v`` query parameter (as produced by
+    ``static_url``) are cached for a year as immutable; plain URLs get a
+    short max-age and are revalidated through the ETag StaticFiles sets.
+    """
+
+    def __init__(self, *args, max_age: int = 31536000, default_max_age: int = 300, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.max_age = max_age
+        self.default_max_age = default_max_age
+
+    async def get_response(self, path: str, scope: Scope):
+        response = await super().get_response(path, scope)
+        if response.status_code in (200, 304):
+            if b"v=" in scope.get("query_string", b""):
+                response.headers["Cache-Control"] = f"public, max-age={self.max_age}, immutable"
+            else:
+                response.headers["Cache-Control"] = f"public, max-age={self.default_max_age}"
+        return response
+
+
+_fingerprints: Dict[str, Tuple[float, str]] = {}
+
+
+def static_url(path: str, directory: str = "static", prefix: str = "/static") -> str:
+    """
+    URL of a static asset with a content fingerprint.
+
+    The fingerprint changes whenever the file changes, so browsers can
+    cache the URL indefinitely.
+
+    Args:
+        path: Path of the asset inside the static directory
+        directory: The static directory on disk
+        prefix: The URL prefix the directory is mounted at
+
+    Returns:
+        str: e.g. ``/static/style.css?v=1a2b3c4d5e``
+    """
+    path = path.lstrip("/")
+    full_path = os.path.join(directory, path)
+    try:
+        mtime = os.path.getmtime(full_path)
+    except OSError:
+        return f"{prefix}/{path}"
+
+    cached = _fingerprints.get(full_path)
+    if cached is None or cached[0] != mtime:
+        with open(full_path, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()[:10]
+        cached = (mtime, digest)
+        _fingerprints[full_path] = cached
+    return f"{prefix}/{path}?v={cached[1]}"
@@ -0,0 +1,195 @@
+"""
+Idempotency keys and duplicate suppression for the chat API.
+
+A request is identified by its ``Idempotency-Key`` header or, when the
+client sends none, by a hash of the client, conversation and message
+content. Both are scoped to the client, so one client can never be
+handed another's response. Messages that start a new conversation are
+only deduplicated by an explicit key: two people behind the same address
+sending the same opening message must get separate conversations. The
+first request with a given key runs the pipeline; identical
+requests arriving while it is in flight wait for the same result
+(single-flight), and later ones within the TTL get the stored response
+without touching the agents or the database.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_monotonic = time.monotonic
+
+
+class IdempotencyConflict(Exception):
+    """
+    Raised when an idempotency key is reused for a different request.
+    """
+
+    def __init__(self, key: str):
+        super().__init__("Idempotency key was already used for a different request")
+        self.key = key
+
+
+class IdempotencyStore:
+    """
+    In-memory TTL store of completed responses plus in-flight requests.
+
+    Explicit keys are kept for ``ttl`` seconds. Content hashes are only
+    kept for ``content_window`` seconds, since a user may legitimately send
+    the same short message ("yes", "thanks") again later.
+    """
+
+    def __init__(
+        self,
+        ttl: Optional[float] = None,
+        content_window: Optional[float] = None,
+        max_entries: Optional[int] = None,
+    ):
+        self.ttl = ttl or float(os.getenv("IDEMPOTENCY_TTL", "300"))
+        self.content_window = content_window if content_window is not None else float(os.getenv("IDEMPOTENCY_CONTENT_WINDOW", "10"))
+        self.max_entries = max_entries or int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "10000"))
+        # key -> (expires_at, fingerprint, result), in insertion order
+        self._completed: "OrderedDict[str, Tuple[float, str, Any]]" = OrderedDict()
+        # key -> (fingerprint, future)
+        self._in_flight: Dict[str, Tuple[str, asyncio.Future]] = {}
+        self.replays = 0
+        self.coalesced = 0
+
+    @classmethod
+    def from_env(cls) -> Optional["IdempotencyStore"]:
+        """
+        Build a store from environment variables.
+
+        Returns:
+            Optional[IdempotencyStore]: The store, or None if disabled
+        """
+        if os.getenv("IDEMPOTENCY_ENABLED", "true").lower() in ("0", "false", "no"):
+            return None
+        return cls()
+
+    @staticmethod
+    def fingerprint(conversation_id: Optional[int], content: str, tenant: Optional[str] = None) -> str:
+        """Hash identifying the request body"""
+        scope = f"{conversation_id}" if tenant is None else f"{tenant}\x00{conversation_id}"
+        return hashlib.sha256(f"{scope}\x00{content}".encode("utf-8")).hexdigest()
+
+    def key_for(
+        self,
+        idempotency_key: Optional[str],
+        client: Optional[str],
+        conversation_id: Optional[int],
+        content: str,
+        tenant: Optional[str] = None,
+    ) -> Tuple[Optional[str], str, float]:
+        """
+        Derive the deduplication key for a request.
+
+        Args:
+            idempotency_key: The client's Idempotency-Key header, if any
+            client: The client address, used to scope keys and content hashes
+            conversation_id: The conversation the message belongs to
+            content: The message content
+            tenant: The tenant the message is for
+
+        Returns:
+            Tuple[Optional[str], str, float]: The key (None if duplicates
+            should not be suppressed), the request fingerprint and the TTL
+        """
+        fingerprint = self.fingerprint(conversation_id, content, tenant)
+        if idempotency_key:
+            return f"key:{client}:{idempotency_key}", fingerprint, self.ttl
+        if self.content_window <= 0 or conversation_id is None:
+            return None, fingerprint, 0.0
+        return f"hash:{client}:{fingerprint}", fingerprint, self.content_window
+
+    def _lookup(self, key: str, fingerprint: str, now: float):
+        entry = self._completed.get(key)
+        if entry is None:
+            return None
+        expires_at, stored_fingerprint, result = entry
+        if expires_at <= now:
+            del self._completed[key]
+            return None
+        if stored_fingerprint != fingerprint:
+            raise IdempotencyConflict(key)
+        return entry
+
+    def _store(self, key: str, fingerprint: str, ttl: float, result: Any, now: float) -> None:
+        self._completed.pop(key, None)
+        self._completed[key] = (now + ttl, fingerprint, result)
+        # Entries are in insertion order, so expired ones collect at the front
+        while self._completed:
+            oldest_key, (expires_at, _, _) = next(iter(self._completed.items()))
+            if expires_at > now and len(self._completed) <= self.max_entries:
+                break
+            del self._completed[oldest_key]
+
+    async def run(
+        self,
+        key: str,
+        fingerprint: str,
+        ttl: float,
+        handler: Callable[[], Awaitable[Any]],
+    ) -> Tuple[Any, bool]:
+        """
+        Run ``handler`` once per key and share its result.
+
+        Failed requests are not stored, so a client can retry them with
+        the same key.
+
+        Args:
+            key: The deduplication key from ``key_for``
+            fingerprint: The request fingerprint from ``key_for``
+            ttl: Seconds to keep the result
+            handler: Coroutine function producing the response
+
+        Returns:
+            Tuple[Any, bool]: The response and whether it was replayed
+
+        Raises:
+            IdempotencyConflict: If the key was used for a different request
+        """
+        entry = self._lookup(key, fingerprint, _monotonic())
+        if entry is not None:
+            self.replays += 1
+            logger.info(f"Replaying stored response for duplicate request {key}")
+            return entry[2], True
+
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            if in_flight[0] != fingerprint:
+                raise IdempotencyConflict(key)
+            self.coalesced += 1
+            logger.info(f"Waiting for in-flight duplicate request {key}")
+            return await asyncio.shield(in_flight[1]), True
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = (fingerprint, future)
+        try:
+            result = await handler()
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark retrieved so an unawaited failure is not logged by asyncio
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            self._store(key, fingerprint, ttl, result, _monotonic())
+            return result, False
+        finally:
+            del self._in_flight[key]
+
+    def stats(self) -> Dict[str, int]:
+        """Counters of suppressed duplicates"""
+        return {
+            "stored": len(self._completed),
+            "in_flight": len(self._in_flight),
+            "replays": self.replays,
+            "coalesced": self.coalesced,
+        }
@@ -0,0 +1,290 @@
+"""
+Shared gateway for all OpenAI calls.
+
+One pooled ``httpx.AsyncClient`` (keep-alive, optional HTTP/2) backs a single
+``AsyncOpenAI`` client that every agent uses, instead of each agent opening
+its own connections. Calls are capped per model with a semaphore so a burst
+of traffic cannot open an unbounded number of upstream requests, and
+transient failures (connection errors, timeouts, 429 and 5xx) are retried
+with exponential backoff and full jitter.
+
+Set ``OPENAI_BASE_URL`` to point the gateway at a local mock server, or
+pass an ``httpx`` transport (e.g. ``httpx.MockTransport``) to serve the
+calls in-process.
+"""
+
+import asyncio
+import logging
+import os
+import random
+import time
+from collections import defaultdict
+from typing import AsyncIterator, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from utils.tokenizer import count_message_tokens
+
+# OpenAI (and httpx, which it depends on) is optional
+try:
+    import httpx
+    from openai import AsyncOpenAI, APIConnectionError, APIStatusError
+    OPENAI_AVAILABLE = True
+except ImportError:
+    OPENAI_AVAILABLE = False
+
+# HTTP/2 needs the h2 package
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+def parse_limits(value: str) -> Dict[str, int]:
+    """Parse ``"gpt-4=4,gpt-3.5-turbo=16"`` into a dict"""
+    limits = {}
+    for item in value.split(","):
+        if "=" not in item:
+            continue
+        model, limit = item.split("=", 1)
+        limits[model.strip()] = int(limit)
+    return limits
+
+
+class LLMGateway:
+    """
+    Pooled, concurrency-limited access to the OpenAI API.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        base_url: Optional[str] = None,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        http2: bool = True,
+        timeout: float = 30.0,
+        connect_timeout: float = 5.0,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+        default_concurrency: int = 16,
+        model_concurrency: Optional[Dict[str, int]] = None,
+        transport: Optional["httpx.AsyncBaseTransport"] = None,
+    ):
+        if not OPENAI_AVAILABLE:
+            raise RuntimeError("The openai package is required for the LLM gateway")
+
+        self.api_key = api_key
+        self.base_url = base_url
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.http2 = http2 and HTTP2_AVAILABLE
+        if http2 and not HTTP2_AVAILABLE:
+            logger.info("h2 is not installed, LLM gateway falls back to HTTP/1.1")
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.default_concurrency = default_concurrency
+        self.model_concurrency = dict(model_concurrency or {})
+        self.transport = transport
+
+        self._http_client = None
+        self._client = None
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._stats = defaultdict(lambda: {"requests": 0, "retries": 0, "errors": 0, "in_flight": 0, "total_ms": 0.0, "input_tokens": 0})
+
+    @classmethod
+    def from_env(cls) -> Optional["LLMGateway"]:
+        """
+        Build a gateway from environment variables.
+
+        Returns:
+            Optional[LLMGateway]: The gateway, or None if OpenAI is not configured
+        """
+        if not OPENAI_AVAILABLE or not os.getenv("OPENAI_API_KEY"):
+            return None
+        return cls(
+            base_url=os.getenv("OPENAI_BASE_URL") or None,
+            max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", "100")),
+            max_keepalive_connections=int(os.getenv("LLM_MAX_KEEPALIVE", "20")),
+            keepalive_expiry=float(os.getenv("LLM_KEEPALIVE_EXPIRY", "30")),
+            http2=os.getenv("LLM_HTTP2", "true").lower() not in ("0", "false", "no"),
+            timeout=float(os.getenv("LLM_TIMEOUT", "30")),
+            connect_timeout=float(os.getenv("LLM_CONNECT_TIMEOUT", "5")),
+            max_retries=int(os.getenv("LLM_MAX_RETRIES", "3")),
+            default_concurrency=int(os.getenv("LLM_DEFAULT_CONCURRENCY", "16")),
+            model_concurrency=parse_limits(os.getenv("LLM_MODEL_CONCURRENCY", "")),
+        )
+
+    @property
+    def client(self) -> "AsyncOpenAI":
+        """The shared OpenAI client, created on first use"""
+        if self._client is None:
+            self._http_client = httpx.AsyncClient(
+                limits=self.limits, timeout=self.timeout, http2=self.http2, transport=self.transport
+            )
+            # Retries are handled here so they respect the model's concurrency slot
+            self._client = AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=self.base_url,
+                http_client=self._http_client,
+                max_retries=0,
+            )
+            logger.info(f"LLM gateway connected (http2={self.http2}, max_connections={self.limits.max_connections})")
+        return self._client
+
+    def _semaphore(self, model: str) -> asyncio.Semaphore:
+        semaphore = self._semaphores.get(model)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.model_concurrency.get(model, self.default_concurrency))
+            self._semaphores[model] = semaphore
+        return semaphore
+
+    def _is_retryable(self, error: Exception) -> bool:
+        # APITimeoutError is a subclass of APIConnectionError
+        if isinstance(error, APIConnectionError):
+            return True
+        return isinstance(error, APIStatusError) and error.status_code in RETRYABLE_STATUS_CODES
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        """Full-jitter exponential backoff, honouring Retry-After when given"""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        response = getattr(error, "response", None)
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        if retry_after:
+            try:
+                delay = max(delay, min(float(retry_after), self.backoff_max))
+            except ValueError:
+                pass
+        return delay
+
+    def _account_input(self, model: str, messages: List[Dict[str, str]], stats: Dict) -> None:
+        input_tokens = count_message_tokens(messages, model)
+        stats["input_tokens"] += input_tokens
+        logger.info(f"LLM request to {model}: {input_tokens} input tokens")
+
+    async def _create_with_retries(self, model: str, stats: Dict, **kwargs):
+        attempt = 0
+        while True:
+            try:
+                stats["requests"] += 1
+                return await self.client.chat.completions.create(model=model, **kwargs)
+            except Exception as e:
+                if attempt >= self.max_retries or not self._is_retryable(e):
+                    stats["errors"] += 1
+                    raise
+                delay = self._backoff(attempt, e)
+                logger.warning(f"LLM call to {model} failed ({type(e).__name__}), retrying in {delay:.2f}s")
+                stats["retries"] += 1
+                attempt += 1
+                await asyncio.sleep(delay)
+
+    async def chat_completion(self, model: str, messages: List[Dict[str, str]], **kwargs):
+        """
+        Create a chat completion through the shared client.
+
+        Args:
+            model: The model name
+            messages: The chat messages
+            **kwargs: Further arguments for ``chat.completions.create``
+
+        Returns:
+            The OpenAI chat completion response
+
+        Raises:
+            openai.OpenAIError: If the call fails after all retries
+        """
+        stats = self._stats[model]
+        self._account_input(model, messages, stats)
+        async with self._semaphore(model):
+            stats["in_flight"] += 1
+            started = time.perf_counter()
+            try:
+                return await self._create_with_retries(model, stats, messages=messages, **kwargs)
+            finally:
+                stats["in_flight"] -= 1
+                stats["total_ms"] += (time.perf_counter() - started) * 1000
+
+    async def stream_chat_completion(self, model: str, messages: List[Dict[str, str]], **kwargs) -> AsyncIterator[str]:
+        """
+        Stream a chat completion as text deltas.
+
+        The model's concurrency slot is held until the stream is exhausted.
+        Only opening the stream is retried; a failure mid-stream is raised.
+
+        Args:
+            model: The model name
+            messages: The chat messages
+            **kwargs: Further arguments for ``chat.completions.create``
+
+        Yields:
+            str: Content deltas in order
+        """
+        stats = self._stats[model]
+        self._account_input(model, messages, stats)
+        async with self._semaphore(model):
+            stats["in_flight"] += 1
+            started = time.perf_counter()
+            try:
+                stream = await self._create_with_retries(model, stats, messages=messages, stream=True, **kwargs)
+                async for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+            finally:
+                stats["in_flight"] -= 1
+                stats["total_ms"] += (time.perf_counter() - started) * 1000
+
+    def stats(self) -> Dict[str, Dict]:
+        """Per-model request, retry and error counters"""
+        report = {}
+        for model, stats in self._stats.items():
+            calls = stats["requests"] - stats["retries"]
+            report[model] = {
+                "requests": stats["requests"],
+                "retries": stats["retries"],
+                "errors": stats["errors"],
+                "in_flight": stats["in_flight"],
+                "input_tokens": stats["input_tokens"],
+                "concurrency_limit": self.model_concurrency.get(model, self.default_concurrency),
+                "mean_latency_ms": round(stats["total_ms"] / calls, 3) if calls else 0.0,
+            }
+        return report
+
+    async def aclose(self) -> None:
+        """Close pooled connections"""
+        if self._http_client is not None:
+            await self._http_client.aclose()
+        self._http_client = None
+        self._client = None
+
+
+_gateway: Optional[LLMGateway] = None
+_gateway_loaded = False
+
+
+def get_llm_gateway() -> Optional[LLMGateway]:
+    """
+    The process-wide gateway shared by all agents.
+
+    Returns:
+        Optional[LLMGateway]: The gateway, or None if OpenAI is not configured
+    """
+    global _gateway, _gateway_loaded
+    if not _gateway_loaded:
+        _gateway = LLMGateway.from_env()
+        _gateway_loaded = True
+    return _gateway
@@ -0,0 +1,189 @@
+"""
+MinHash signatures and an LSH index for near-duplicate text.
+
+A message is reduced to its shingles (word tokens and bigrams from the
+shared preprocessing) and each shingle is hashed once. The signature
+keeps, for each of ``num_perm`` hash functions, the smallest hash over
+the shingles. The share of equal positions in two signatures estimates
+the Jaccard similarity of the shingle sets. A hasher can leave out
+identifier tokens (anything containing a digit: order numbers, ids,
+amounts), so two reports that differ only in those hash alike; callers
+compare ``MinHasher.identifiers`` separately.
+
+The index splits signatures into ``bands`` of ``rows`` values and files
+each key under one bucket per band. A query only compares candidates
+sharing at least one band bucket, so its cost does not grow with the
+number of indexed texts. With the defaults (16 bands of 4 rows) pairs
+above ~0.5 similarity are almost always candidates and pairs below ~0.3
+rarely are.
+"""
+
+import random
+import struct
+import zlib
+from collections import defaultdict
+from typing import Dict, FrozenSet, Hashable, List, Optional, Sequence, Set, Tuple, Union
+
+from utils.preprocessing import ProcessedMessage
+
+# numpy is optional; signatures are identical with or without it
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+_MASK64 = (1 << 64) - 1
+
+# Below this many shingles the pure-Python loop is as fast as numpy
+_NUMPY_MIN_SHINGLES = 16
+
+Signature = Tuple[int, ...]
+
+
+class MinHasher:
+    """
+    Computes MinHash signatures with multiply-shift hash functions.
+
+    Args:
+        num_perm: Number of hash functions (signature length)
+        seed: Seed of the hash function parameters; signatures are only comparable for equal seeds
+        skip_identifiers: Leave identifier tokens out of the shingles
+    """
+
+    def __init__(self, num_perm: int = 64, seed: int = 1, skip_identifiers: bool = False):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self.skip_identifiers = skip_identifiers
+        # h(x) = ((a * x + b) mod 2^64) >> 32 with odd a
+        self._a = [rng.getrandbits(64) | 1 for _ in range(num_perm)]
+        self._b = [rng.getrandbits(64) for _ in range(num_perm)]
+        if NUMPY_AVAILABLE:
+            self._a_array = np.array(self._a, dtype=np.uint64)[:, None]
+            self._b_array = np.array(self._b, dtype=np.uint64)[:, None]
+
+    @staticmethod
+    def is_identifier(token: str) -> bool:
+        return any(char.isdigit() for char in token)
+
+    @staticmethod
+    def identifiers(message: Union[str, ProcessedMessage]) -> FrozenSet[str]:
+        """Identifier tokens of a message (tokens containing a digit)"""
+        return frozenset(token for token in ProcessedMessage.of(message).token_set if MinHasher.is_identifier(token))
+
+    @staticmethod
+    def shingles(message: Union[str, ProcessedMessage], skip_identifiers: bool = False) -> Set[str]:
+        """Word tokens and bigrams of a message, optionally without identifier tokens"""
+        message = ProcessedMessage.of(message)
+        if not skip_identifiers:
+            return set(message.token_set).union(message.bigrams)
+        tokens = [token for token in message.tokens if not MinHasher.is_identifier(token)]
+        return set(tokens).union(f"{left} {right}" for left, right in zip(tokens, tokens[1:]))
+
+    def signature(self, message: Union[str, ProcessedMessage]) -> Signature:
+        """
+        MinHash signature of a message.
+
+        Returns:
+            Signature: ``num_perm`` 32-bit values (all 0xFFFFFFFF for an empty message)
+        """
+        hashes = [zlib.crc32(shingle.encode("utf-8")) for shingle in self.shingles(message, self.skip_identifiers)]
+        if not hashes:
+            return (0xFFFFFFFF,) * self.num_perm
+        if NUMPY_AVAILABLE and len(hashes) >= _NUMPY_MIN_SHINGLES:
+            values = np.array(hashes, dtype=np.uint64)[None, :]
+            permuted = (self._a_array * values + self._b_array) >> np.uint64(32)
+            return tuple(int(value) for value in permuted.min(axis=1))
+        return tuple(
+            min(((a * value + b) & _MASK64) >> 32 for value in hashes)
+            for a, b in zip(self._a, self._b)
+        )
+
+    @staticmethod
+    def is_empty(signature: Signature) -> bool:
+        """Whether a signature is that of a message without shingles"""
+        return all(value == 0xFFFFFFFF for value in signature)
+
+    @staticmethod
+    def similarity(left: Sequence[int], right: Sequence[int]) -> float:
+        """Estimated Jaccard similarity of two signatures"""
+        return sum(1 for a, b in zip(left, right) if a == b) / len(left)
+
+    def to_bytes(self, signature: Signature) -> bytes:
+        return struct.pack(f"<{self.num_perm}I", *signature)
+
+    def from_bytes(self, data: bytes) -> Optional[Signature]:
+        """Decode a stored signature (None if it was made with another length)"""
+        if len(data) != 4 * self.num_perm:
+            return None
+        return struct.unpack(f"<{self.num_perm}I", data)
+
+
+class LSHIndex:
+    """
+    Banded locality-sensitive hashing over MinHash signatures.
+
+    Args:
+        num_perm: Signature length
+        bands: Number of bands; must divide ``num_perm``
+    """
+
+    def __init__(self, num_perm: int = 64, bands: int = 16):
+        if num_perm % bands:
+            raise ValueError(f"{bands} bands do not divide {num_perm} hash values")
+        self.bands = bands
+        self.rows = num_perm // bands
+        self._buckets: List[Dict[Tuple[int, ...], Set[Hashable]]] = [defaultdict(set) for _ in range(bands)]
+        self._signatures: Dict[Hashable, Signature] = {}
+
+    def _band_keys(self, signature: Signature):
+        rows = self.rows
+        return [tuple(signature[band * rows:(band + 1) * rows]) for band in range(self.bands)]
+
+    def add(self, key: Hashable, signature: Signature) -> None:
+        """Index a signature under ``key`` (replacing any previous one)"""
+        self.remove(key)
+        self._signatures[key] = signature
+        for buckets, band_key in zip(self._buckets, self._band_keys(signature)):
+            buckets[band_key].add(key)
+
+    def remove(self, key: Hashable) -> None:
+        signature = self._signatures.pop(key, None)
+        if signature is None:
+            return
+        for buckets, band_key in zip(self._buckets, self._band_keys(signature)):
+            bucket = buckets.get(band_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del buckets[band_key]
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._signatures
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def query(self, signature: Signature, threshold: float = 0.0) -> List[Tuple[Hashable, float]]:
+        """
+        Indexed keys similar to a signature.
+
+        Args:
+            signature: The signature to look up
+            threshold: Minimum estimated similarity
+
+        Returns:
+            List[Tuple[Hashable, float]]: (key, similarity) pairs, most similar first
+        """
+        candidates: Set[Hashable] = set()
+        for buckets, band_key in zip(self._buckets, self._band_keys(signature)):
+            bucket = buckets.get(band_key)
+            if bucket:
+                candidates.update(bucket)
+        matches = []
+        for key in candidates:
+            score = MinHasher.similarity(signature, self._signatures[key])
+            if score >= threshold:
+                matches.append((key, score))
+        matches.sort(key=lambda match: match[1], reverse=True)
+        return matches
@@ -0,0 +1,169 @@
+"""
+Coalescing of outgoing notifications into per-recipient digests.
+
+Notifications for the same recipient and type that arrive within a
+window are delivered as one digest instead of one email or SMS each, so
+a burst of complaints costs one send rather than dozens. Urgent types
+and SLA breach alerts bypass the window. Collapsed types (``ticket_created`` by default) are
+summarised as a count with the latest few entries instead of being
+listed in full.
+"""
+
+import asyncio
+import logging
+import os
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_IMMEDIATE_TYPES = ("urgent", "high", "sla_breach")
+DEFAULT_COLLAPSED_TYPES = ("ticket_created",)
+
+# Entries shown in a collapsed digest
+COLLAPSED_PREVIEW = 3
+
+# deliver(recipient, notification_type, message)
+Deliver = Callable[[str, str, str], Awaitable[Any]]
+
+
+def _types(value: Optional[str], default: Tuple[str, ...]) -> Tuple[str, ...]:
+    if value is None:
+        return default
+    return tuple(name.strip() for name in value.split(",") if name.strip())
+
+
+class NotificationCoalescer:
+    """
+    Groups notifications by (recipient, type) and delivers each group once per window.
+
+    Args:
+        deliver: Coroutine function sending one message to a recipient
+        window: Seconds a group collects notifications before it is sent
+        max_batch: A group is sent early once it holds this many notifications
+        immediate_types: Types delivered at once, without coalescing
+        collapsed_types: Types summarised by count in their digest
+    """
+
+    def __init__(
+        self,
+        deliver: Deliver,
+        window: float = 30.0,
+        max_batch: int = 50,
+        immediate_types: Tuple[str, ...] = DEFAULT_IMMEDIATE_TYPES,
+        collapsed_types: Tuple[str, ...] = DEFAULT_COLLAPSED_TYPES,
+    ):
+        self.deliver = deliver
+        self.window = window
+        self.max_batch = max_batch
+        self.immediate_types = immediate_types
+        self.collapsed_types = collapsed_types
+        self._pending: Dict[Tuple[str, str], List[str]] = {}
+        self._timers: Dict[Tuple[str, str], asyncio.Task] = {}
+        # Notifications received, sends made and notifications covered by those sends, per type
+        self.received: Counter = Counter()
+        self.delivered: Counter = Counter()
+        self.covered: Counter = Counter()
+
+    @classmethod
+    def from_env(cls, deliver: Deliver) -> Optional["NotificationCoalescer"]:
+        """Build a coalescer from NOTIFY_* variables (None when NOTIFY_COALESCE_WINDOW is 0)"""
+        window = float(os.getenv("NOTIFY_COALESCE_WINDOW", "30"))
+        if window <= 0:
+            return None
+        return cls(
+            deliver,
+            window=window,
+            max_batch=int(os.getenv("NOTIFY_DIGEST_MAX", "50")),
+            immediate_types=_types(os.getenv("NOTIFY_IMMEDIATE_TYPES"), DEFAULT_IMMEDIATE_TYPES),
+            collapsed_types=_types(os.getenv("NOTIFY_COLLAPSED_TYPES"), DEFAULT_COLLAPSED_TYPES),
+        )
+
+    async def submit(self, recipient: str, notification_type: str, message: str) -> None:
+        """
+        Queue a notification, or deliver it at once if its type is urgent.
+
+        Args:
+            recipient: The recipient address/number
+            notification_type: The type of notification
+            message: The notification message
+        """
+        self.received[notification_type] += 1
+        if notification_type in self.immediate_types:
+            await self._send(recipient, notification_type, [message])
+            return
+
+        key = (recipient, notification_type)
+        group = self._pending.setdefault(key, [])
+        group.append(message)
+        if len(group) >= self.max_batch:
+            await self._flush_group(key)
+        elif key not in self._timers:
+            self._timers[key] = asyncio.create_task(self._flush_later(key))
+
+    def digest(self, notification_type: str, messages: List[str]) -> str:
+        """The text sent for a group of notifications"""
+        if len(messages) == 1:
+            return messages[0]
+        if notification_type in self.collapsed_types:
+            latest = "; ".join(messages[-COLLAPSED_PREVIEW:])
+            return f"{len(messages)} {notification_type} notifications (latest: {latest})"
+        lines = "\n".join(f"- {message}" for message in messages)
+        return f"{len(messages)} {notification_type} notifications:\n{lines}"
+
+    async def _send(self, recipient: str, notification_type: str, messages: List[str]) -> None:
+        self.delivered[notification_type] += 1
+        self.covered[notification_type] += len(messages)
+        try:
+            await self.deliver(recipient, notification_type, self.digest(notification_type, messages))
+        except Exception as e:
+            logger.error(f"Delivering {len(messages)} {notification_type} notification(s) to {recipient} failed: {str(e)}")
+
+    async def _flush_later(self, key: Tuple[str, str]) -> None:
+        await asyncio.sleep(self.window)
+        self._timers.pop(key, None)
+        await self._flush_group(key)
+
+    async def _flush_group(self, key: Tuple[str, str]) -> None:
+        timer = self._timers.pop(key, None)
+        if timer is not None and timer is not asyncio.current_task():
+            timer.cancel()
+        messages = self._pending.pop(key, None)
+        if messages:
+            await self._send(key[0], key[1], messages)
+
+    async def flush(self) -> None:
+        """Deliver every pending group now"""
+        for key in list(self._pending):
+            await self._flush_group(key)
+
+    async def stop(self) -> None:
+        """Cancel the window timers and deliver what is pending"""
+        await self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Notifications received and sends made, per type.
+
+        Returns:
+            Dict[str, Any]: Counts, pending notifications and the reduction
+            ratio (share of sends saved among notifications already sent)
+        """
+        delivered = sum(self.delivered.values())
+        covered = sum(self.covered.values())
+        return {
+            "window_seconds": self.window,
+            "received": sum(self.received.values()),
+            "delivered": delivered,
+            "pending": sum(len(messages) for messages in self._pending.values()),
+            "reduction_ratio": round(1 - delivered / covered, 4) if covered else 0.0,
+            "by_type": {
+                notification_type: {
+                    "received": count,
+                    "delivered": self.delivered[notification_type],
+                    "reduction_ratio": round(1 - self.delivered[notification_type] / self.covered[notification_type], 4)
+                    if self.covered[notification_type] else 0.0,
+                }
+                for notification_type, count in self.received.items()
+            },
+        }
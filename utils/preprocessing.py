@@ -0,0 +1,89 @@
+"""
+Shared single-pass preprocessing of user messages.
+
+A message is normalized, case-folded and tokenized once when it enters
+the pipeline; the classifier, router and agents all read the resulting
+``ProcessedMessage`` instead of lowercasing and scanning the raw text
+again. Analyses that a stage derives from the message (such as the
+intents its rules match) can be memoized on it with ``derive`` so later
+stages reuse them too.
+"""
+
+import re
+import unicodedata
+from typing import Any, Callable, Dict, Union
+
+_TOKEN_RE = re.compile(r"[\w']+")
+
+
+class ProcessedMessage:
+    """
+    Read-only view of a message with its preprocessing results.
+
+    Attributes:
+        text: The message as received
+        normalized: NFKC-normalized text (full-width and compatibility characters folded)
+        folded: Case-folded normalized text, for case-insensitive keyword checks
+        tokens: Word tokens of the folded text, in order
+        token_set: The distinct tokens
+        bigrams: Adjacent token pairs joined by a space
+    """
+
+    __slots__ = ("text", "normalized", "folded", "tokens", "token_set", "bigrams", "_derived")
+
+    def __init__(self, text: str):
+        normalized = unicodedata.normalize("NFKC", text)
+        folded = normalized.casefold()
+        tokens = tuple(_TOKEN_RE.findall(folded))
+        set_field = object.__setattr__
+        set_field(self, "text", text)
+        set_field(self, "normalized", normalized)
+        set_field(self, "folded", folded)
+        set_field(self, "tokens", tokens)
+        set_field(self, "token_set", frozenset(tokens))
+        set_field(self, "bigrams", tuple(f"{left} {right}" for left, right in zip(tokens, tokens[1:])))
+        set_field(self, "_derived", {})
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError(f"{type(self).__name__} is read-only")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError(f"{type(self).__name__} is read-only")
+
+    def __reduce__(self):
+        # Rebuilt from the text (pickle, copy); memoized analyses are per process
+        return (type(self), (self.text,))
+
+    def __repr__(self) -> str:
+        return f"ProcessedMessage({self.text!r})"
+
+    @classmethod
+    def of(cls, message: Union[str, "ProcessedMessage"]) -> "ProcessedMessage":
+        """The message itself if already processed, otherwise a new ``ProcessedMessage``"""
+        return message if isinstance(message, cls) else cls(message)
+
+    def derive(self, key: str, compute: Callable[["ProcessedMessage"], Any]) -> Any:
+        """
+        Compute a value from this message once and memoize it.
+
+        Args:
+            key: Name of the analysis (e.g. "rule_matches")
+            compute: Called with this message the first time ``key`` is requested
+
+        Returns:
+            Any: The memoized value (treat it as read-only)
+        """
+        derived: Dict[str, Any] = self._derived
+        if key not in derived:
+            derived[key] = compute(self)
+        return derived[key]
+
+
+def preprocess(text: str) -> ProcessedMessage:
+    """Preprocess a message for the agent pipeline"""
+    return ProcessedMessage(text)
+
+
+def text_of(message: Union[str, ProcessedMessage]) -> str:
+    """The original text of a raw or processed message"""
+    return message.text if isinstance(message, ProcessedMessage) else message
@@ -0,0 +1,262 @@
+"""
+On-demand CPU and memory profiling for a running worker.
+
+CPU profiles come from a sampling profiler: a background thread records
+the stack of the profiled thread every few milliseconds and counts
+identical stacks. The result is in the "folded" format read by
+flamegraph.pl, speedscope and similar tools (``frame;frame;frame count``).
+Sampling sees where an async request spends its time across awaits,
+which cProfile attributes poorly, and its cost is confined to the
+profiled window.
+
+Request profiling is off unless ``PROFILING_ENABLED`` is set, in which
+case ``ProfilingMiddleware`` profiles every ``PROFILE_EVERY_N``-th
+request and requests sent with ``X-Profile: 1`` plus a valid admin token.
+When disabled the middleware is not installed at all.
+
+Memory profiling wraps ``tracemalloc``: take snapshots and diff them to
+see which lines keep allocating (for example a list that only grows).
+"""
+
+import hmac
+import itertools
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, deque
+from typing import Any, Dict, List, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+ADMIN_TOKEN_HEADER = "x-admin-token"
+PROFILE_HEADER = "x-profile"
+ADMIN_PATH_PREFIX = "/api/admin/"
+
+# Deepest stack recorded per sample
+MAX_STACK_DEPTH = 128
+
+
+def admin_token_valid(token: Optional[str]) -> bool:
+    """Whether a request carries the ADMIN_TOKEN (always False when none is configured)"""
+    expected = os.getenv("ADMIN_TOKEN")
+    return bool(expected and token and hmac.compare_digest(token, expected))
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def fold_stack(frame) -> str:
+    """A frame's stack as ``outer;...;inner``"""
+    labels = []
+    while frame is not None and len(labels) < MAX_STACK_DEPTH:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+class StackSampler:
+    """
+    Samples the stacks of one thread (or all threads) on a timer.
+
+    Args:
+        thread_id: Thread to sample; None samples every thread except the sampler
+        interval: Seconds between samples
+    """
+
+    def __init__(self, thread_id: Optional[int] = None, interval: Optional[float] = None):
+        self.thread_id = thread_id
+        self.interval = interval or float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.005"))
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.profile_id: Optional[int] = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self) -> None:
+        frames = sys._current_frames()
+        if self.thread_id is not None:
+            frame = frames.get(self.thread_id)
+            if frame is not None:
+                self.stacks[fold_stack(frame)] += 1
+        else:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            own = threading.get_ident()
+            for thread_id, frame in frames.items():
+                if thread_id != own:
+                    self.stacks[f"{names.get(thread_id, thread_id)};{fold_stack(frame)}"] += 1
+        self.samples += 1
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self) -> "StackSampler":
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> Counter:
+        """Stop sampling and return the folded stack counts"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.stacks
+
+    def folded(self) -> str:
+        """Stacks in flamegraph folded format, most frequent first"""
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+
+class ProfileStore:
+    """
+    The most recent request profiles, plus on-demand worker profiling.
+    """
+
+    def __init__(self, max_profiles: Optional[int] = None):
+        self.profiles: deque = deque(maxlen=max_profiles or int(os.getenv("PROFILE_MAX_STORED", "20")))
+        self._ids = itertools.count(1)
+        # One profile at a time keeps the overhead bounded
+        self._busy = threading.Lock()
+
+    def begin(self, thread_id: Optional[int] = None, interval: Optional[float] = None) -> Optional[StackSampler]:
+        """Start a sampler, or return None if another profile is running"""
+        if not self._busy.acquire(blocking=False):
+            return None
+        try:
+            sampler = StackSampler(thread_id, interval)
+            sampler.profile_id = next(self._ids)
+            return sampler.start()
+        except Exception:
+            self._busy.release()
+            raise
+
+    def end(self, sampler: StackSampler, **info) -> Dict[str, Any]:
+        """Stop a sampler and store its profile"""
+        try:
+            sampler.stop()
+        finally:
+            self._busy.release()
+        profile = {"id": sampler.profile_id, "samples": sampler.samples, "created_at": time.time(), **info, "folded": sampler.folded()}
+        self.profiles.append(profile)
+        return profile
+
+    def get(self, profile_id: int) -> Optional[Dict[str, Any]]:
+        return next((profile for profile in self.profiles if profile["id"] == profile_id), None)
+
+    def summaries(self) -> List[Dict[str, Any]]:
+        """Stored profiles without their stacks"""
+        return [{key: value for key, value in profile.items() if key != "folded"} for profile in reversed(self.profiles)]
+
+
+class ProfilingMiddleware:
+    """
+    Profile every Nth request and requests flagged by an admin.
+
+    The event-loop thread is sampled while the request runs, so stacks of
+    other requests served concurrently show up in its profile too. The
+    profile id is returned in the ``X-Profile-Id`` response header.
+    Admin endpoints are never profiled.
+    """
+
+    def __init__(self, app: ASGIApp, store: ProfileStore, every_n: Optional[int] = None):
+        self.app = app
+        self.store = store
+        self.every_n = every_n if every_n is not None else int(os.getenv("PROFILE_EVERY_N", "0"))
+        self._requests = itertools.count(1)
+
+    def _wanted(self, scope: Scope) -> bool:
+        if self.every_n and next(self._requests) % self.every_n == 0:
+            return True
+        headers = Headers(scope=scope)
+        return headers.get(PROFILE_HEADER) == "1" and admin_token_valid(headers.get(ADMIN_TOKEN_HEADER))
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"].startswith(ADMIN_PATH_PREFIX) or not self._wanted(scope):
+            await self.app(scope, receive, send)
+            return
+
+        sampler = self.store.begin(threading.get_ident())
+        if sampler is None:
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+
+        async def send_with_id(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                # The profile is stored once the response has been sent
+                MutableHeaders(scope=message).append("X-Profile-Id", str(sampler.profile_id))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            profile = self.store.end(
+                sampler,
+                method=scope["method"],
+                path=scope["path"],
+                duration_ms=round((time.perf_counter() - started) * 1000, 1),
+            )
+            logger.info(f"Profiled {scope['method']} {scope['path']} as profile #{profile['id']} ({profile['samples']} samples)")
+
+
+class MemoryTracker:
+    """
+    tracemalloc snapshots and diffs between them.
+    """
+
+    def __init__(self, frames: Optional[int] = None):
+        self.frames = frames or int(os.getenv("TRACEMALLOC_FRAMES", "10"))
+        self.snapshots: deque = deque(maxlen=2)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Start tracing if needed and take a snapshot"""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            logger.info(f"Started tracemalloc with {self.frames} frames")
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+        self.snapshots.append(snapshot)
+        current, peak = tracemalloc.get_traced_memory()
+        return {"snapshots": len(self.snapshots), "traced_bytes": current, "peak_bytes": peak}
+
+    def diff(self, limit: int = 20, group_by: str = "lineno") -> List[Dict[str, Any]]:
+        """
+        Largest allocation changes between the last two snapshots.
+
+        Args:
+            limit: Entries returned
+            group_by: "lineno", "filename" or "traceback"
+
+        Returns:
+            List[Dict[str, Any]]: Size and count changes, largest growth first
+        """
+        if len(self.snapshots) < 2:
+            return []
+        previous, latest = self.snapshots
+        return [
+            {
+                "size_diff": stat.size_diff,
+                "size": stat.size,
+                "count_diff": stat.count_diff,
+                "count": stat.count,
+                "traceback": [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback],
+            }
+            for stat in latest.compare_to(previous, group_by)[:limit]
+        ]
+
+    def stop(self) -> None:
+        """Stop tracing and drop the snapshots"""
+        self.snapshots.clear()
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
@@ -1,110 +1,232 @@
 """
 Utility functions for generating prompts for AI-based agents.
+
+Templates are compiled once at import: whitespace is normalised and each
+template is split into a static prefix (the instructions, identical for
+every request, so provider-side prompt caching can reuse it) and a short
+variable suffix holding the request's values. Each prefix has a token
+budget, checked by the tests and logged at startup (``check_budgets``) so
+prompt bloat shows up immediately. Prefixes are measured on first use, not
+at import, since tiktoken may download its encoding files.
 """
 
-class PromptTemplates:
+import logging
+import re
+import textwrap
+from typing import Dict, List, Optional
+
+from utils.tokenizer import count_tokens
+
+logger = logging.getLogger(__name__)
+
+_BLANK_LINES_RE = re.compile(r"\n{3,}")
+
+
+def normalize_whitespace(text: str) -> str:
     """
-    Class containing templates for various prompts used in the system.
+    Dedent a template, strip trailing spaces and collapse blank-line runs.
     """
-    
-    @staticmethod
-    def intent_classification_prompt(message: str) -> str:
+    lines = [line.rstrip() for line in textwrap.dedent(text).strip().splitlines()]
+    return _BLANK_LINES_RE.sub("\n\n", "\n".join(lines))
+
+
+class CompiledPrompt:
+    """
+    A template split into a static prefix and a variable suffix.
+    """
+
+    def __init__(self, name: str, prefix: str, suffix: str, max_prefix_tokens: Optional[int] = None):
+        self.name = name
+        self.prefix = normalize_whitespace(prefix)
+        self.suffix = normalize_whitespace(suffix)
+        self.max_prefix_tokens = max_prefix_tokens
+        self._prefix_tokens: Optional[int] = None
+
+    @property
+    def prefix_tokens(self) -> int:
+        """Token count of the static prefix, measured on first access"""
+        if self._prefix_tokens is None:
+            self._prefix_tokens = count_tokens(self.prefix)
+        return self._prefix_tokens
+
+    @property
+    def over_budget(self) -> bool:
+        return self.max_prefix_tokens is not None and self.prefix_tokens > self.max_prefix_tokens
+
+    def render_suffix(self, **values) -> str:
+        """Fill in the variable part of the prompt"""
+        return self.suffix.format(**values)
+
+    def render(self, **values) -> str:
+        """The full prompt as a single string"""
+        return f"{self.prefix}\n\n{self.render_suffix(**values)}"
+
+    def messages(self, **values) -> List[Dict[str, str]]:
         """
-        Generate a prompt for intent classification.
-        
-        Args:
-            message: The user's message
-            
+        Chat messages with the prefix as the system message.
+
         Returns:
-            str: The prompt for intent classification
+            List[Dict[str, str]]: System and user messages
         """
-        return f"""
+        return [
+            {"role": "system", "content": self.prefix},
+            {"role": "user", "content": self.render_suffix(**values)},
+        ]
+
+
+# Compiled templates by name
+PROMPTS: Dict[str, CompiledPrompt] = {
+    "intent_classification": CompiledPrompt(
+        "intent_classification",
+        prefix="""
         You are an intent classifier for a customer support system.
-        Classify the following user message into exactly one of these categories:
+        Classify the user message into exactly one of these categories:
         - greeting: General greetings
         - farewell: Saying goodbye
         - help: Asking for general help
-        - account: Questions about user accounts
+        - account: Questions about user accounts, login, passwords
         - order: Order-related inquiries
         - product: Product-related inquiries
-        - complaint: Customer complaints
+        - complaint: Customer complaints about products/service
         - urgent: Urgent issues requiring immediate attention
         - faq: General questions
         - other: None of the above
-        
+
         Respond with ONLY the category name, nothing else.
-        
+        """,
+        suffix='User message: "{message}"',
+        max_prefix_tokens=150,
+    ),
+    "faq_response": CompiledPrompt(
+        "faq_response",
+        prefix="""
+        You are a helpful customer support assistant answering a user's question.
+        Please provide a concise, helpful, and friendly response to this question.
+        Keep your answer under 150 words and focus on being informative and accurate.
+        """,
+        suffix="""
+        The question has been classified as a '{intent}' intent.
         User message: "{message}"
+        """,
+        max_prefix_tokens=100,
+    ),
+    "ticket_creation": CompiledPrompt(
+        "ticket_creation",
+        prefix="""
+        You are creating a support ticket for a customer issue.
+        Generate a brief summary of the issue (max 50 characters) to use as the ticket subject.
+        Then provide a detailed description of the issue based on the information provided.
+
+        Format your response as:
+        Subject: [Your subject here]
+        Description: [Your description here]
+        """,
+        suffix="""
+        Priority: {priority}
+        Customer message: "{message}"
+        """,
+        max_prefix_tokens=100,
+    ),
+    "account_query": CompiledPrompt(
+        "account_query",
+        prefix="""
+        You are a customer support assistant handling an account-related query.
+        Provide a helpful response about their account. Since this is a demo,
+        do not request or expose any real personal information. Instead, use
+        placeholder/mock data where appropriate.
+
+        Be professional, concise, and empathetic in your response.
+        """,
+        suffix='User query: "{message}"',
+        max_prefix_tokens=100,
+    ),
+}
+
+
+def check_budgets() -> List[CompiledPrompt]:
+    """
+    Log a warning for each prompt whose prefix exceeds its token budget.
+
+    Returns:
+        List[CompiledPrompt]: The prompts over budget
+    """
+    over = [prompt for prompt in PROMPTS.values() if prompt.over_budget]
+    for prompt in over:
+        logger.warning(
+            f"Prompt '{prompt.name}' prefix is {prompt.prefix_tokens} tokens, over its budget of {prompt.max_prefix_tokens}"
+        )
+    return over
+
+
+class PromptTemplates:
+    """
+    Class containing templates for various prompts used in the system.
+    """
+
+    @staticmethod
+    def compiled(name: str) -> CompiledPrompt:
         """
-    
+        Get a compiled template by name.
+
+        Args:
+            name: The template name, e.g. ``faq_response``
+
+        Returns:
+            CompiledPrompt: The compiled template
+        """
+        return PROMPTS[name]
+
+    @staticmethod
+    def intent_classification_prompt(message: str) -> str:
+        """
+        Generate a prompt for intent classification.
+
+        Args:
+            message: The user's message
+
+        Returns:
+            str: The prompt for intent classification
+        """
+        return PROMPTS["intent_classification"].render(message=message)
+
     @staticmethod
     def faq_response_prompt(message: str, intent: str) -> str:
         """
         Generate a prompt for FAQ response generation.
-        
+
         Args:
             message: The user's message
             intent: The classified intent
-            
+
         Returns:
             str: The prompt for FAQ response generation
         """
-        return f"""
-        You are a helpful customer support assistant. The user has asked a question
-        that has been classified as a '{intent}' intent.
-        
-        User message: "{message}"
-        
-        Please provide a concise, helpful, and friendly response to this question.
-        Keep your answer under 150 words and focus on being informative and accurate.
-        """
-    
+        return PROMPTS["faq_response"].render(message=message, intent=intent)
+
     @staticmethod
     def ticket_creation_prompt(message: str, intent: str) -> str:
         """
         Generate a prompt for ticket creation response.
-        
+
         Args:
             message: The user's message
             intent: The classified intent
-            
+
         Returns:
             str: The prompt for ticket creation response
         """
         priority = "urgent" if intent == "urgent" else "standard"
-        
-        return f"""
-        You are creating a support ticket for a customer issue with {priority} priority.
-        
-        Customer message: "{message}"
-        
-        Generate a brief summary of the issue (max 50 characters) to use as the ticket subject.
-        Then provide a detailed description of the issue based on the information provided.
-        
-        Format your response as:
-        Subject: [Your subject here]
-        Description: [Your description here]
-        """
-    
+        return PROMPTS["ticket_creation"].render(message=message, priority=priority)
+
     @staticmethod
     def account_query_prompt(message: str) -> str:
         """
         Generate a prompt for account query response.
-        
+
         Args:
             message: The user's message
-            
+
         Returns:
             str: The prompt for account query response
         """
-        return f"""
-        You are a customer support assistant handling an account-related query.
-        
-        User query: "{message}"
-        
-        Provide a helpful response about their account. Since this is a demo,
-        do not request or expose any real personal information. Instead, use
-        placeholder/mock data where appropriate.
-        
-        Be professional, concise, and empathetic in your response.
-        """
+        return PROMPTS["account_query"].render(message=message)
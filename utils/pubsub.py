@@ -0,0 +1,249 @@
+"""
+In-process publish/subscribe for pushing server events to clients.
+
+Events (new messages, ticket status changes, notifications) are published
+to topics such as ``conversation:42`` or ``tickets`` and fanned out to every
+subscriber, typically one per WebSocket connection. Each event is encoded
+to JSON once, however many subscribers receive it, and each subscriber has
+a bounded queue so a slow client drops its oldest events instead of
+growing memory without limit.
+
+With several worker processes, set ``PUBSUB_BACKEND=sqlite``: events are
+also written to a shared SQLite table that every worker polls, a local
+stand-in for Redis pub/sub.
+"""
+
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from typing import Any, Dict, Optional, Set
+
+from utils.serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """
+    A subscriber's queue of encoded events on one topic.
+
+    Use as an async iterator, and call ``close`` (or use ``async with``)
+    when the client goes away.
+    """
+
+    def __init__(self, broker: "EventBroker", topic: str, max_queue: int):
+        self.broker = broker
+        self.topic = topic
+        self._events = deque(maxlen=max_queue)
+        self._ready = asyncio.Event()
+        self.dropped = 0
+        self.closed = False
+
+    def _deliver(self, payload: str) -> None:
+        if len(self._events) == self._events.maxlen:
+            self.dropped += 1
+        self._events.append(payload)
+        self._ready.set()
+
+    async def get(self) -> str:
+        """Wait for the next event as a JSON string"""
+        while not self._events:
+            self._ready.clear()
+            await self._ready.wait()
+        return self._events.popleft()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> str:
+        if self.closed:
+            raise StopAsyncIteration
+        return await self.get()
+
+    def close(self) -> None:
+        """Stop receiving events"""
+        if not self.closed:
+            self.closed = True
+            self.broker._unsubscribe(self)
+
+    async def __aenter__(self) -> "Subscription":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.close()
+
+
+class EventBroker:
+    """
+    Topic-based fan-out to subscribers in this process.
+    """
+
+    def __init__(self, max_queue: Optional[int] = None, relay: Optional["SQLiteEventRelay"] = None):
+        self.max_queue = max_queue or int(os.getenv("PUBSUB_MAX_QUEUE", "100"))
+        self.relay = relay
+        self._topics: Dict[str, Set[Subscription]] = defaultdict(set)
+        self.published = 0
+
+    @classmethod
+    def from_env(cls) -> "EventBroker":
+        """Build a broker, with the SQLite relay if PUBSUB_BACKEND=sqlite"""
+        relay = None
+        if os.getenv("PUBSUB_BACKEND", "memory").lower() == "sqlite":
+            relay = SQLiteEventRelay(os.getenv("PUBSUB_SQLITE_PATH", "pubsub.db"))
+        return cls(relay=relay)
+
+    def subscribe(self, topic: str) -> Subscription:
+        """
+        Subscribe to a topic.
+
+        Args:
+            topic: e.g. ``conversation:42``
+
+        Returns:
+            Subscription: The subscriber's event queue
+        """
+        subscription = Subscription(self, topic, self.max_queue)
+        self._topics[topic].add(subscription)
+        return subscription
+
+    def _unsubscribe(self, subscription: Subscription) -> None:
+        subscribers = self._topics.get(subscription.topic)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._topics[subscription.topic]
+
+    def deliver(self, topic: str, payload: str) -> int:
+        """
+        Hand an encoded event to local subscribers.
+
+        Returns:
+            int: Number of subscribers reached
+        """
+        subscribers = self._topics.get(topic)
+        if not subscribers:
+            return 0
+        for subscription in tuple(subscribers):
+            subscription._deliver(payload)
+        return len(subscribers)
+
+    def publish(self, topic: str, event: Dict[str, Any]) -> int:
+        """
+        Publish an event. Must be called from the event loop thread.
+
+        Args:
+            topic: The topic to publish to
+            event: A JSON-serializable dict, conventionally with a ``type``
+
+        Returns:
+            int: Number of local subscribers reached
+        """
+        payload = dumps(event).decode("utf-8")
+        self.published += 1
+        if self.relay:
+            self.relay.publish(topic, payload)
+        return self.deliver(topic, payload)
+
+    def subscriber_count(self, topic: Optional[str] = None) -> int:
+        """Subscribers on one topic, or on all topics"""
+        if topic is not None:
+            return len(self._topics.get(topic, ()))
+        return sum(len(subscribers) for subscribers in self._topics.values())
+
+    async def start(self) -> None:
+        """Start relaying events from other workers, if configured"""
+        if self.relay:
+            self.relay.start(asyncio.get_running_loop(), self)
+
+    async def stop(self) -> None:
+        if self.relay:
+            self.relay.stop()
+
+
+class SQLiteEventRelay:
+    """
+    Shares events between worker processes through a SQLite table.
+
+    Published events are appended by a background thread; the same thread
+    polls for rows written by other workers and hands them to the local
+    broker on the event loop. Old rows are pruned after ``retention``
+    seconds.
+    """
+
+    def __init__(self, path: str, poll_interval: Optional[float] = None, retention: float = 60.0):
+        self.path = path
+        self.poll_interval = poll_interval or float(os.getenv("PUBSUB_POLL_INTERVAL", "0.1"))
+        self.retention = retention
+        self.origin = uuid.uuid4().hex
+        self._outbox = deque()
+        self._stop = threading.Event()
+        self._thread = None
+
+        conn = self._connect()
+        try:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS pubsub_events ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, origin TEXT NOT NULL, topic TEXT NOT NULL, "
+                "payload TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def publish(self, topic: str, payload: str) -> None:
+        """Queue an event for the other workers"""
+        self._outbox.append((topic, payload))
+
+    def start(self, loop: asyncio.AbstractEventLoop, broker: EventBroker) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, args=(loop, broker), name="pubsub-relay", daemon=True)
+            self._thread.start()
+            logger.info(f"Relaying events through {self.path}")
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+    def _run(self, loop: asyncio.AbstractEventLoop, broker: EventBroker) -> None:
+        conn = self._connect()
+        last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM pubsub_events").fetchone()[0]
+        last_prune = time.time()
+        while not self._stop.is_set():
+            try:
+                now = time.time()
+                if self._outbox:
+                    rows = []
+                    while self._outbox:
+                        topic, payload = self._outbox.popleft()
+                        rows.append((self.origin, topic, payload, now))
+                    conn.executemany(
+                        "INSERT INTO pubsub_events (origin, topic, payload, created_at) VALUES (?, ?, ?, ?)", rows
+                    )
+
+                for row_id, origin, topic, payload in conn.execute(
+                    "SELECT id, origin, topic, payload FROM pubsub_events WHERE id > ? ORDER BY id", (last_id,)
+                ).fetchall():
+                    last_id = row_id
+                    # Our own events were already delivered locally
+                    if origin != self.origin:
+                        loop.call_soon_threadsafe(broker.deliver, topic, payload)
+
+                if now - last_prune > self.retention:
+                    conn.execute("DELETE FROM pubsub_events WHERE created_at < ?", (now - self.retention,))
+                    last_prune = now
+            except Exception as e:
+                logger.error(f"Event relay error: {str(e)}")
+            self._stop.wait(self.poll_interval)
+        conn.close()
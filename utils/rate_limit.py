@@ -0,0 +1,323 @@
+"""
+Token-bucket rate limiting for the chat API.
+
+Buckets are keyed by client IP and by conversation id. The default store
+keeps buckets in memory, split across lock-striped shards; a SQLite-backed
+store can be used instead when several workers must share one budget.
+
+Limiting is off unless ``RATE_LIMIT_ENABLED`` is set. Behind a reverse
+proxy or load balancer every request comes from the proxy's address, so
+list the proxies in ``RATE_LIMIT_TRUSTED_PROXIES`` (addresses or
+networks, comma separated); the client is then taken from
+``X-Forwarded-For``.
+"""
+
+import ipaddress
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from utils.compat import to_thread
+
+logger = logging.getLogger(__name__)
+
+_monotonic = time.monotonic
+
+
+class RateLimitExceeded(Exception):
+    """
+    Raised when a caller has run out of tokens.
+    """
+
+    def __init__(self, scope: str, retry_after: float):
+        super().__init__(f"Rate limit exceeded for {scope}")
+        self.scope = scope
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self) -> str:
+        """Retry-After value in whole seconds"""
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+class BucketStore(ABC):
+    """
+    Storage for token buckets.
+    """
+
+    # Whether consume may wait on I/O and must be kept off the event loop
+    blocking = False
+
+    @abstractmethod
+    def consume_all(self, buckets: Sequence[Tuple[str, float, float]], cost: float = 1.0) -> Tuple[Optional[int], float]:
+        """
+        Take ``cost`` tokens from every bucket, or from none of them.
+
+        Args:
+            buckets: ``(key, rate, capacity)`` of each bucket, with the refill
+                rate in tokens per second and the capacity (burst size)
+            cost: Number of tokens to take from each bucket
+
+        Returns:
+            Tuple[Optional[int], float]: ``(None, 0.0)`` if the tokens were
+            taken, otherwise the position of the first bucket short of tokens
+            and the number of seconds until it has enough
+        """
+        pass
+
+    def consume(self, key: str, rate: float, capacity: float, cost: float = 1.0) -> float:
+        """
+        Take ``cost`` tokens from the bucket for ``key``.
+
+        Returns:
+            float: 0.0 if the tokens were taken, otherwise the number of
+            seconds until enough tokens will be available
+        """
+        return self.consume_all([(key, rate, capacity)], cost)[1]
+
+
+class MemoryBucketStore(BucketStore):
+    """
+    In-process bucket store split into lock-striped shards.
+
+    Each bucket is a ``[tokens, last_refill]`` list and each shard an LRU:
+    when a shard is full, a new key replaces the bucket used least
+    recently, which is usually one idle long enough to have refilled
+    completely (indistinguishable from a missing one). Memory stays bounded
+    by the number of active keys and eviction is O(1) even under a flood of
+    new keys.
+    """
+
+    def __init__(self, shards: int = 16, max_keys_per_shard: int = 4096):
+        # Round up to a power of two so the shard can be picked with a mask
+        shard_count = 1 << max(0, (shards - 1).bit_length())
+        self._mask = shard_count - 1
+        self._stripes = [(OrderedDict(), threading.Lock()) for _ in range(shard_count)]
+        self.max_keys_per_shard = max_keys_per_shard
+
+    def consume_all(self, buckets: Sequence[Tuple[str, float, float]], cost: float = 1.0) -> Tuple[Optional[int], float]:
+        now = _monotonic()
+        stripes = [hash(key) & self._mask for key, _, _ in buckets]
+        # Locked in stripe order so two requests never wait on each other
+        locks = [self._stripes[index][1] for index in sorted(set(stripes))]
+        for lock in locks:
+            lock.acquire()
+        try:
+            levels = []
+            for (key, rate, capacity), index in zip(buckets, stripes):
+                shard = self._stripes[index][0]
+                bucket = shard.get(key)
+                if bucket is None:
+                    if len(shard) >= self.max_keys_per_shard:
+                        shard.popitem(last=False)
+                    bucket = shard[key] = [capacity, now]
+                else:
+                    shard.move_to_end(key)
+                    bucket[0] = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+                    bucket[1] = now
+                levels.append(bucket)
+
+            for position, ((_, rate, _), bucket) in enumerate(zip(buckets, levels)):
+                if bucket[0] < cost:
+                    return position, (cost - bucket[0]) / rate
+            for bucket in levels:
+                bucket[0] -= cost
+            return None, 0.0
+        finally:
+            for lock in locks:
+                lock.release()
+
+    def __len__(self) -> int:
+        return sum(len(shard) for shard, _ in self._stripes)
+
+
+class SQLiteBucketStore(BucketStore):
+    """
+    Bucket store shared between worker processes through a SQLite file.
+
+    Acts as a local stand-in for a Redis-backed limiter: every consume is a
+    short ``BEGIN IMMEDIATE`` transaction, so workers see one shared budget.
+    A consume can wait up to the busy timeout for another worker's lock, so
+    ``RateLimiter.acheck`` runs it in a thread.
+    """
+
+    blocking = True
+
+    def __init__(self, path: str, sweep_every: int = 1000):
+        self.path = path
+        self.sweep_every = sweep_every
+        self._local = threading.local()
+        self._operations = 0
+
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_limit_buckets ("
+                "key TEXT PRIMARY KEY, tokens REAL NOT NULL, "
+                "updated_at REAL NOT NULL, expires_at REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            self._local.conn = conn
+        return conn
+
+    def consume_all(self, buckets: Sequence[Tuple[str, float, float]], cost: float = 1.0) -> Tuple[Optional[int], float]:
+        # Wall-clock time so that all processes agree on refill progress
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            levels = []
+            for key, rate, capacity in buckets:
+                row = conn.execute(
+                    "SELECT tokens, updated_at FROM rate_limit_buckets WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    levels.append(capacity)
+                else:
+                    levels.append(min(capacity, row[0] + (now - row[1]) * rate))
+
+            short = None
+            wait = 0.0
+            for position, ((_, rate, _), tokens) in enumerate(zip(buckets, levels)):
+                if tokens < cost:
+                    short, wait = position, (cost - tokens) / rate
+                    break
+            if short is None:
+                levels = [tokens - cost for tokens in levels]
+
+            conn.executemany(
+                "INSERT INTO rate_limit_buckets (key, tokens, updated_at, expires_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, "
+                "updated_at = excluded.updated_at, expires_at = excluded.expires_at",
+                [(key, tokens, now, now + capacity / rate) for (key, rate, capacity), tokens in zip(buckets, levels)],
+            )
+
+            self._operations += 1
+            if self._operations % self.sweep_every == 0:
+                conn.execute("DELETE FROM rate_limit_buckets WHERE expires_at < ?", (now,))
+
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return short, wait
+
+
+class RateLimiter:
+    """
+    Applies per-IP and per-conversation token-bucket limits.
+    """
+
+    def __init__(
+        self,
+        store: Optional[BucketStore] = None,
+        limits: Optional[Dict[str, Tuple[float, float]]] = None,
+        trusted_proxies: Optional[str] = None,
+    ):
+        self.store = store or MemoryBucketStore()
+        proxies = trusted_proxies if trusted_proxies is not None else os.getenv("RATE_LIMIT_TRUSTED_PROXIES", "")
+        self.trusted_proxies = [ipaddress.ip_network(proxy.strip(), strict=False) for proxy in proxies.split(",") if proxy.strip()]
+        # scope -> (tokens per second, burst capacity)
+        self.limits = limits or {
+            "ip": (
+                float(os.getenv("RATE_LIMIT_IP_RATE", "2")),
+                float(os.getenv("RATE_LIMIT_IP_BURST", "20")),
+            ),
+            "conversation": (
+                float(os.getenv("RATE_LIMIT_CONVERSATION_RATE", "0.5")),
+                float(os.getenv("RATE_LIMIT_CONVERSATION_BURST", "5")),
+            ),
+        }
+
+    def _trusted(self, address: str) -> bool:
+        try:
+            ip = ipaddress.ip_address(address)
+        except ValueError:
+            return False
+        return any(ip in network for network in self.trusted_proxies)
+
+    def client_ip(self, peer: Optional[str], forwarded_for: Optional[str] = None) -> Optional[str]:
+        """
+        The address to limit a request by.
+
+        When the direct peer is a trusted proxy, ``X-Forwarded-For`` is read
+        from the right, skipping further trusted proxies; the first other
+        address is the client. Entries left of it could be forged by the
+        client, so they are ignored.
+
+        Args:
+            peer: Address of the direct peer
+            forwarded_for: The ``X-Forwarded-For`` header, if any
+
+        Returns:
+            Optional[str]: The client address
+        """
+        if not peer or not forwarded_for or not self._trusted(peer):
+            return peer
+        for address in reversed([address.strip() for address in forwarded_for.split(",") if address.strip()]):
+            if not self._trusted(address):
+                return address
+        return peer
+
+    def check(self, client_ip: Optional[str] = None, conversation_id: Optional[int] = None) -> None:
+        """
+        Take one token from each applicable bucket, or from none if any is empty.
+
+        Args:
+            client_ip: The caller's IP address
+            conversation_id: The conversation the message belongs to
+
+        Raises:
+            RateLimitExceeded: If any bucket is empty
+        """
+        scopes: List[str] = []
+        buckets = []
+        if client_ip:
+            scopes.append("ip")
+            buckets.append((f"ip:{client_ip}", *self.limits["ip"]))
+        if conversation_id is not None:
+            scopes.append("conversation")
+            buckets.append((f"conversation:{conversation_id}", *self.limits["conversation"]))
+        if not buckets:
+            return
+
+        short, wait = self.store.consume_all(buckets)
+        if short is not None:
+            raise RateLimitExceeded(scopes[short], wait)
+
+    async def acheck(self, client_ip: Optional[str] = None, conversation_id: Optional[int] = None) -> None:
+        """Like ``check``, off the event loop when the store may block"""
+        if self.store.blocking:
+            await to_thread(self.check, client_ip, conversation_id)
+        else:
+            self.check(client_ip, conversation_id)
+
+    @classmethod
+    def from_env(cls) -> Optional["RateLimiter"]:
+        """
+        Build a rate limiter from environment configuration.
+
+        Returns:
+            Optional[RateLimiter]: The limiter, or None if rate limiting is disabled
+        """
+        # Opt-in: keyed by client address, it needs RATE_LIMIT_TRUSTED_PROXIES behind a proxy
+        if os.getenv("RATE_LIMIT_ENABLED", "false").lower() not in ("1", "true", "yes"):
+            return None
+
+        backend = os.getenv("RATE_LIMIT_BACKEND", "memory").lower()
+        if backend == "sqlite":
+            path = os.getenv("RATE_LIMIT_SQLITE_PATH", "./rate_limits.db")
+            logger.info(f"Using shared SQLite rate limit store at {path}")
+            return cls(SQLiteBucketStore(path))
+        return cls(MemoryBucketStore())
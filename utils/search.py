@@ -0,0 +1,266 @@
+"""
+Full-text search over messages and tickets.
+
+On SQLite, FTS5 external-content tables index ``messages.content`` and
+``tickets.subject``/``tickets.description``. Triggers on the base tables
+keep the indexes in sync on every insert, update and delete, so there is
+no separate indexing job; the text itself is stored only once. Results are
+ranked with BM25. Other databases fall back to a ``LIKE`` scan.
+
+Usage:
+    python -m utils.search --rebuild    # re-index everything from the base tables
+    python -m utils.search --optimize   # merge index segments after bulk loads
+"""
+
+import argparse
+import logging
+import os
+import re
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import Boolean, DateTime, Float, Integer, String, Text, inspect, or_, select, text
+from sqlalchemy.exc import OperationalError
+
+from models.chat import Message
+from models.ticket import Ticket
+
+logger = logging.getLogger(__name__)
+
+SEARCH_TYPES = ("messages", "tickets")
+
+# Longest query accepted, in terms
+MAX_QUERY_TERMS = 16
+
+# Only the newest matches are ranked, which bounds the cost of common terms
+SEARCH_RANK_WINDOW = int(os.getenv("SEARCH_RANK_WINDOW", "2000"))
+
+_TERM_RE = re.compile(r"\w+", re.UNICODE)
+
+# FTS table, base table, indexed columns and BM25 column weights
+_INDEXES = {
+    "messages": ("messages_fts", "messages", ("content",), (1.0,)),
+    "tickets": ("tickets_fts", "tickets", ("subject", "description"), (3.0, 1.0)),
+}
+
+# Base table columns returned with each hit, and the column snippets are taken from
+_RESULT_COLUMNS = {
+    "messages": (("id", "conversation_id", "is_user", "timestamp"), 0),
+    "tickets": (("id", "subject", "status", "priority", "created_at"), 1),
+}
+
+
+def _search_sql(search_type: str) -> str:
+    fts, table, _, weights = _INDEXES[search_type]
+    columns, snippet_column = _RESULT_COLUMNS[search_type]
+    bm25 = f"bm25({fts}, {', '.join(str(weight) for weight in weights)})"
+    # Lowest rowid among the newest matches; FTS5 walks rowids in descending order and stops early
+    window = f"SELECT COALESCE(MIN(rowid), 0) FROM (SELECT rowid FROM {fts} WHERE {fts} MATCH :match ORDER BY rowid DESC LIMIT :window)"
+    # Rank the window, then build snippets for the requested page only
+    # (CROSS JOIN keeps SQLite from driving the outer query by a second full MATCH)
+    page = (
+        f"SELECT rowid, {bm25} AS score FROM {fts} WHERE {fts} MATCH :match AND rowid >= ({window}) "
+        f"ORDER BY score LIMIT :limit OFFSET :offset"
+    )
+    return (
+        f"SELECT {', '.join(f'b.{column}' for column in columns)}, "
+        f"snippet({fts}, {snippet_column}, :mark_start, :mark_end, '…', 12) AS snippet, p.score "
+        f"FROM ({page}) p CROSS JOIN {fts} CROSS JOIN {table} b "
+        f"WHERE {fts}.rowid = p.rowid AND b.id = p.rowid AND {fts} MATCH :match ORDER BY p.score"
+    )
+
+
+_SEARCH_SQL = {search_type: _search_sql(search_type) for search_type in _INDEXES}
+
+# Whether there are more matches than the rank window holds
+_OVERFLOW_SQL = {
+    search_type: f"SELECT COUNT(*) > :window FROM (SELECT rowid FROM {fts} WHERE {fts} MATCH :match LIMIT :window + 1)"
+    for search_type, (fts, _, _, _) in _INDEXES.items()
+}
+
+_RESULT_TYPES = {
+    "messages": {"id": Integer, "conversation_id": Integer, "is_user": Boolean, "timestamp": DateTime, "snippet": Text, "score": Float},
+    "tickets": {"id": Integer, "subject": String, "status": String, "priority": String, "created_at": DateTime, "snippet": Text, "score": Float},
+}
+
+
+def match_expression(query: str) -> Optional[str]:
+    """
+    Turn free text into an FTS5 query.
+
+    Every term must match, after stemming ("refunds" finds "refund").
+    FTS5 operators in the input are treated as plain words.
+
+    Returns:
+        Optional[str]: The MATCH expression, or None if the query has no terms
+    """
+    terms = _TERM_RE.findall(query)[:MAX_QUERY_TERMS]
+    if not terms:
+        return None
+    return " ".join(f'"{term}"' for term in terms)
+
+
+def _trigger_sql(fts: str, table: str, columns) -> List[str]:
+    column_list = ", ".join(columns)
+    new_values = ", ".join(f"new.{column}" for column in columns)
+    old_values = ", ".join(f"old.{column}" for column in columns)
+    insert_new = f"INSERT INTO {fts}(rowid, {column_list}) VALUES (new.id, {new_values});"
+    delete_old = f"INSERT INTO {fts}({fts}, rowid, {column_list}) VALUES ('delete', old.id, {old_values});"
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN {insert_new} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN {delete_old} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {column_list} ON {table} BEGIN {delete_old} {insert_new} END",
+    ]
+
+
+class SearchIndex:
+    """
+    Creates, maintains and queries the full-text indexes.
+    """
+
+    def __init__(self, bind, rank_window: Optional[int] = None):
+        self.bind = bind
+        self.rank_window = rank_window or SEARCH_RANK_WINDOW
+        self.fts_enabled = bind.dialect.name == "sqlite"
+
+    def ensure(self) -> None:
+        """
+        Create the FTS tables and triggers if missing.
+
+        Indexes created for an existing database are filled from the base
+        tables once; afterwards the triggers keep them current.
+        """
+        if not self.fts_enabled:
+            return
+        existing = set(inspect(self.bind).get_table_names())
+        try:
+            with self.bind.begin() as conn:
+                for fts, table, columns, _ in _INDEXES.values():
+                    created = fts not in existing
+                    conn.exec_driver_sql(
+                        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+                        f"{', '.join(columns)}, content='{table}', content_rowid='id', "
+                        f"tokenize='porter unicode61 remove_diacritics 2')"
+                    )
+                    for statement in _trigger_sql(fts, table, columns):
+                        conn.exec_driver_sql(statement)
+                    if created:
+                        logger.info(f"Building full-text index {fts}")
+                        conn.exec_driver_sql(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+        except OperationalError as e:
+            # e.g. SQLite compiled without FTS5
+            logger.warning(f"Full-text search unavailable, falling back to LIKE: {str(e)}")
+            self.fts_enabled = False
+
+    def rebuild(self) -> None:
+        """Re-index every row from the base tables"""
+        with self.bind.begin() as conn:
+            for fts, _, _, _ in _INDEXES.values():
+                conn.exec_driver_sql(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+    def optimize(self) -> None:
+        """Merge index segments into one (after large bulk inserts)"""
+        with self.bind.begin() as conn:
+            for fts, _, _, _ in _INDEXES.values():
+                conn.exec_driver_sql(f"INSERT INTO {fts}({fts}) VALUES ('optimize')")
+
+    def search(
+        self,
+        db,
+        query: str,
+        search_type: str = "messages",
+        limit: int = 20,
+        offset: int = 0,
+        mark: tuple = ("[", "]"),
+    ) -> Dict[str, Any]:
+        """
+        Find messages or tickets matching a query, best matches first.
+
+        Ranking considers the newest ``rank_window`` matches, so a very
+        common term costs the same as a selective one. Pages end at the
+        window: ``has_more`` is false on its last page, and ``truncated``
+        then says whether older matches were left out (the query should be
+        narrowed to reach them).
+
+        Args:
+            db: A database session
+            query: Free text entered by the user
+            search_type: "messages" or "tickets"
+            limit: Page size
+            offset: Results to skip
+            mark: Strings placed around matched terms in snippets
+
+        Returns:
+            Dict[str, Any]: The page of results, whether more exist and
+            whether matches beyond the rank window were left out. With FTS5
+            each result has a BM25 ``score`` (lower is better).
+        """
+        match = match_expression(query)
+        if match is None:
+            return {"results": [], "has_more": False, "truncated": False}
+
+        if not self.fts_enabled:
+            results = self._like_search(db, query, search_type, limit + 1, offset)
+            return {"results": results[:limit], "has_more": len(results) > limit, "truncated": False}
+
+        results = []
+        if offset < self.rank_window:
+            # One extra row tells whether there is a next page without counting all matches
+            rows = db.execute(
+                text(_SEARCH_SQL[search_type]).columns(**_RESULT_TYPES[search_type]),
+                {"match": match, "mark_start": mark[0], "mark_end": mark[1], "window": self.rank_window,
+                 "limit": limit + 1, "offset": offset},
+            ).mappings()
+            results = [dict(row) for row in rows]
+        has_more = len(results) > limit
+        # Only the last reachable page needs to know; the check reads at most one window of rowids
+        truncated = not has_more and bool(db.execute(
+            text(_OVERFLOW_SQL[search_type]), {"match": match, "window": self.rank_window}
+        ).scalar())
+        return {"results": results[:limit], "has_more": has_more, "truncated": truncated}
+
+    @staticmethod
+    def _like_search(db, query: str, search_type: str, limit: int, offset: int) -> List[Dict[str, Any]]:
+        # Wildcards in the query match literally
+        escaped = query.strip().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        pattern = f"%{escaped}%"
+        if search_type == "tickets":
+            statement = (
+                select(Ticket.id, Ticket.subject, Ticket.status, Ticket.priority, Ticket.created_at,
+                       Ticket.description.label("snippet"))
+                .where(or_(Ticket.subject.ilike(pattern, escape="\\"), Ticket.description.ilike(pattern, escape="\\")))
+                .order_by(Ticket.id.desc())
+            )
+        else:
+            statement = (
+                select(Message.id, Message.conversation_id, Message.is_user, Message.timestamp,
+                       Message.content.label("snippet"))
+                .where(Message.content.ilike(pattern, escape="\\"))
+                .order_by(Message.id.desc())
+            )
+        return [dict(row) for row in db.execute(statement.limit(limit).offset(offset)).mappings()]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Maintain the full-text search indexes")
+    parser.add_argument("--rebuild", action="store_true", help="Re-index all messages and tickets")
+    parser.add_argument("--optimize", action="store_true", help="Merge index segments")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    from database import engine, ensure_schema
+    ensure_schema(engine)
+    index = SearchIndex(engine)
+    index.ensure()
+    if not index.fts_enabled:
+        logger.error("Full-text indexes are only supported on SQLite")
+        return
+    if args.rebuild:
+        index.rebuild()
+        logger.info("Rebuilt full-text indexes")
+    if args.optimize:
+        index.optimize()
+        logger.info("Optimized full-text indexes")
+
+
+if __name__ == "__main__":
+    main()
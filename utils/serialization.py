@@ -0,0 +1,95 @@
+"""
+Fast JSON serialization for API responses.
+
+Rows are turned into plain dicts and encoded straight to bytes, skipping
+the per-message Pydantic models and FastAPI's second validation pass.
+orjson is used when installed; otherwise the standard library encoder is
+used with the same compact output. Large collections can be streamed as
+chunked JSON so the whole payload is never held in memory.
+"""
+
+import json
+import logging
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, Iterator
+
+from starlette.responses import JSONResponse
+
+# orjson is optional
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Columns returned for each message by the API
+MESSAGE_FIELDS = ("id", "content", "conversation_id", "timestamp", "is_user")
+
+
+def _default(obj: Any):
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(obj: Any) -> bytes:
+    """
+    Encode an object as compact JSON bytes.
+
+    Datetimes are written in ISO 8601 format, like Pydantic does.
+    """
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj, default=_default)
+    return json.dumps(obj, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response rendered with ``dumps``.
+
+    Return it from an endpoint to bypass ``response_model`` validation;
+    the content must already have the documented shape.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def message_to_dict(message) -> Dict[str, Any]:
+    """
+    Plain dict for a message ORM object or row.
+    """
+    return {field: getattr(message, field) for field in MESSAGE_FIELDS}
+
+
+def iter_json_object(head: Dict[str, Any], field: str, items: Iterable[Dict[str, Any]], batch_size: int = 256) -> Iterator[bytes]:
+    """
+    Stream a JSON object whose ``field`` is a large array.
+
+    Args:
+        head: The object's other fields
+        field: Name of the array field, written last
+        items: The array items, consumed lazily
+        batch_size: Items encoded per chunk
+
+    Yields:
+        bytes: Chunks that concatenate to ``{**head, field: [...items]}``
+    """
+    encoded_head = dumps(head)
+    separator = b"," if len(encoded_head) > 2 else b""
+    yield encoded_head[:-1] + separator + dumps(field) + b":["
+
+    first = True
+    batch = []
+    for item in items:
+        batch.append(dumps(item))
+        if len(batch) >= batch_size:
+            yield (b"" if first else b",") + b",".join(batch)
+            first = False
+            batch = []
+    if batch:
+        yield (b"" if first else b",") + b",".join(batch)
+    yield b"]}"
+
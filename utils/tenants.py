@@ -0,0 +1,217 @@
+"""
+Per-tenant support content, loaded on first use and kept in an LRU.
+
+Each brand (tenant) has a directory under ``TENANT_DIR`` (default
+``data/tenants/<tenant>``) holding any of:
+
+- ``faqs.json``: FAQ answers, replacing the global ones
+- ``account_templates.json`` / ``ticket_templates.json``: response
+  templates, merged over the global ones
+- ``intent_patterns.json``: ``{intent: [regex, ...]}`` classifier rules,
+  replacing the global rules of the same intent
+
+A tenant's files are read and its patterns compiled the first time a
+request names it. The compiled ``TenantBundle`` is shared by all
+requests for that tenant and kept in an LRU bounded by the approximate
+memory its content takes (``TENANT_CACHE_MAX_BYTES``), so a worker can
+serve thousands of tenants without loading them all at startup.
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Pattern
+
+from utils.compat import to_thread
+
+logger = logging.getLogger(__name__)
+
+TENANT_KEY_PATTERN = r"^[a-z0-9][a-z0-9_-]{0,63}$"
+_TENANT_KEY_RE = re.compile(TENANT_KEY_PATTERN)
+
+# Rough in-memory cost of parsed and compiled content per byte of JSON
+MEMORY_PER_SOURCE_BYTE = 4
+BUNDLE_OVERHEAD_BYTES = 2048
+
+
+class UnknownTenant(KeyError):
+    """Raised for a tenant key without a content directory"""
+
+
+class TenantBundle:
+    """
+    A tenant's compiled content. Fields a tenant does not define are None,
+    meaning the global content applies.
+    """
+
+    def __init__(
+        self,
+        key: str,
+        faqs: Optional[Dict[str, str]] = None,
+        account_templates: Optional[Dict[str, str]] = None,
+        ticket_templates: Optional[Dict[str, str]] = None,
+        intent_patterns: Optional[Dict[str, List[Pattern]]] = None,
+        size: int = BUNDLE_OVERHEAD_BYTES,
+    ):
+        self.key = key
+        self.faqs = faqs
+        self.account_templates = account_templates
+        self.ticket_templates = ticket_templates
+        self.intent_patterns = intent_patterns
+        self.size = size
+        self._derived: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def derive(self, name: str, compute: Callable[["TenantBundle"], Any]) -> Any:
+        """
+        Build an object from this tenant's content once (e.g. a tenant's
+        classifier) and share it for as long as the bundle is cached.
+        """
+        value = self._derived.get(name)
+        if value is None:
+            with self._lock:
+                value = self._derived.get(name)
+                if value is None:
+                    value = self._derived[name] = compute(self)
+        return value
+
+    def __repr__(self) -> str:
+        return f"<TenantBundle(key='{self.key}', size={self.size})>"
+
+
+def _read_json(path: str) -> Optional[Any]:
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_bundle(directory: str, key: str) -> TenantBundle:
+    """
+    Read and compile a tenant's content.
+
+    Raises:
+        ValueError: If a file is not valid JSON or a pattern does not compile
+    """
+    size = BUNDLE_OVERHEAD_BYTES
+    content = {}
+    for name in ("faqs", "account_templates", "ticket_templates", "intent_patterns"):
+        path = os.path.join(directory, f"{name}.json")
+        try:
+            content[name] = _read_json(path)
+        except ValueError as e:
+            raise ValueError(f"Invalid {name}.json for tenant '{key}': {str(e)}") from e
+        if content[name] is not None:
+            size += os.path.getsize(path) * MEMORY_PER_SOURCE_BYTE
+
+    intent_patterns = None
+    if content["intent_patterns"] is not None:
+        try:
+            intent_patterns = {
+                intent: [re.compile(pattern, re.IGNORECASE) for pattern in patterns]
+                for intent, patterns in content["intent_patterns"].items()
+            }
+        except re.error as e:
+            raise ValueError(f"Invalid intent pattern for tenant '{key}': {str(e)}") from e
+
+    return TenantBundle(
+        key,
+        faqs=content["faqs"],
+        account_templates=content["account_templates"],
+        ticket_templates=content["ticket_templates"],
+        intent_patterns=intent_patterns,
+        size=size,
+    )
+
+
+class TenantRegistry:
+    """
+    LRU of compiled tenant bundles, bounded by their approximate size.
+
+    Args:
+        root: Directory holding one subdirectory per tenant
+        max_bytes: Approximate memory the cached bundles may take
+    """
+
+    def __init__(self, root: Optional[str] = None, max_bytes: Optional[int] = None):
+        self.root = root or os.getenv("TENANT_DIR", "data/tenants")
+        self.max_bytes = max_bytes or int(os.getenv("TENANT_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+        self._bundles: "OrderedDict[str, TenantBundle]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+
+    def _directory(self, key: str) -> str:
+        if not _TENANT_KEY_RE.match(key):
+            raise UnknownTenant(key)
+        directory = os.path.join(self.root, key)
+        if not os.path.isdir(directory):
+            raise UnknownTenant(key)
+        return directory
+
+    def _cached(self, key: str) -> Optional[TenantBundle]:
+        with self._lock:
+            bundle = self._bundles.get(key)
+            if bundle is not None:
+                self._bundles.move_to_end(key)
+                self.hits += 1
+            return bundle
+
+    def get(self, key: str) -> TenantBundle:
+        """
+        A tenant's bundle, loading it on first use.
+
+        Raises:
+            UnknownTenant: If the tenant has no content directory
+        """
+        bundle = self._cached(key)
+        if bundle is not None:
+            return bundle
+
+        bundle = load_bundle(self._directory(key), key)
+        with self._lock:
+            # Another thread may have loaded it meanwhile
+            existing = self._bundles.get(key)
+            if existing is not None:
+                return existing
+            self._bundles[key] = bundle
+            self._bytes += bundle.size
+            self.loads += 1
+            while self._bytes > self.max_bytes and len(self._bundles) > 1:
+                _, evicted = self._bundles.popitem(last=False)
+                self._bytes -= evicted.size
+                self.evictions += 1
+        logger.info(f"Loaded content for tenant '{key}' (~{bundle.size} bytes)")
+        return bundle
+
+    async def aget(self, key: str) -> TenantBundle:
+        """Like ``get``, reading files off the event loop on a cache miss"""
+        bundle = self._cached(key)
+        if bundle is not None:
+            return bundle
+        return await to_thread(self.get, key)
+
+    def invalidate(self, key: Optional[str] = None) -> None:
+        """Drop one tenant's bundle (after its files changed), or all of them"""
+        with self._lock:
+            keys = [key] if key is not None else list(self._bundles)
+            for name in keys:
+                bundle = self._bundles.pop(name, None)
+                if bundle is not None:
+                    self._bytes -= bundle.size
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "cached": len(self._bundles),
+                "cached_bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "loads": self.loads,
+                "evictions": self.evictions,
+            }
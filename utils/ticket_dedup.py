@@ -0,0 +1,263 @@
+"""
+Near-duplicate detection for support tickets.
+
+During an outage many customers report the same problem. Each active
+ticket's text (subject and description) has a MinHash signature kept in
+an in-memory LSH index and persisted in ``ticket_signatures``. A new
+ticket that is similar enough to an active one is attached to it: the
+existing ticket's ``duplicate_count`` goes up (and its priority, if the
+new report is more urgent) and the report is stored in ``ticket_reports``
+instead of a new ticket being created and announced.
+
+Identifier tokens (order numbers, account ids, anything with a digit)
+are left out of the signatures and compared on their own: two reports
+naming different identifiers are never merged, however alike the rest of
+their text is, so "refund order #1001" and "refund order #2002" stay
+separate tickets.
+"""
+
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, FrozenSet, Hashable, List, Optional, Tuple
+
+from sqlalchemy import select
+
+from models.ticket import Ticket, TicketReport, TicketSignature
+from utils.compat import to_thread
+from utils.minhash import LSHIndex, MinHasher, Signature
+from utils.ticket_queue import ACTIVE_STATUSES, PRIORITY_LEVELS
+
+logger = logging.getLogger(__name__)
+
+
+def ticket_text(subject: str, description: str) -> str:
+    return f"{subject}\n{description}"
+
+
+def identifiers_conflict(left: FrozenSet[str], right: FrozenSet[str]) -> bool:
+    """Whether two reports name different identifiers, e.g. two order numbers"""
+    return bool(left) and bool(right) and left.isdisjoint(right)
+
+
+class TicketDeduplicator:
+    """
+    LSH index over the active tickets.
+
+    Args:
+        writer: The ``DatabaseWriter`` used to store signatures and attach duplicates
+        session_factory: Session factory for reads
+        threshold: Minimum estimated similarity for a ticket to count as a duplicate
+        num_perm: Signature length
+        bands: LSH bands
+    """
+
+    def __init__(self, writer, session_factory, threshold: Optional[float] = None, num_perm: int = 64, bands: int = 16):
+        self.writer = writer
+        self.session_factory = session_factory
+        self.threshold = threshold or float(os.getenv("TICKET_DEDUP_THRESHOLD", "0.8"))
+        self.hasher = MinHasher(num_perm, skip_identifiers=True)
+        self.index = LSHIndex(num_perm, bands)
+        self._identifiers: Dict[int, FrozenSet[str]] = {}
+        self.duplicates = 0
+
+    @classmethod
+    def from_env(cls, writer, session_factory) -> Optional["TicketDeduplicator"]:
+        """
+        Build a deduplicator from environment variables.
+
+        Returns:
+            Optional[TicketDeduplicator]: The deduplicator, or None if disabled
+        """
+        if os.getenv("TICKET_DEDUP_ENABLED", "true").lower() in ("0", "false", "no"):
+            return None
+        return cls(writer, session_factory)
+
+    def signature(self, subject: str, description: str) -> Signature:
+        return self.hasher.signature(ticket_text(subject, description))
+
+    def identifiers(self, subject: str, description: str) -> FrozenSet[str]:
+        return self.hasher.identifiers(ticket_text(subject, description))
+
+    def match(self, signature: Signature, identifiers: FrozenSet[str] = frozenset()) -> Optional[Tuple[int, float]]:
+        """
+        The most similar active ticket not naming other identifiers.
+
+        Returns:
+            Optional[Tuple[int, float]]: (ticket id, similarity), or None if nothing is similar enough
+        """
+        if self.hasher.is_empty(signature):
+            # Nothing but identifiers (or nothing at all) to compare
+            return None
+        for ticket_id, similarity in self.index.query(signature, self.threshold):
+            if not identifiers_conflict(identifiers, self._identifiers.get(ticket_id, frozenset())):
+                return ticket_id, similarity
+        return None
+
+    def signature_row(self, ticket_id: int, signature: Signature, identifiers: FrozenSet[str]) -> TicketSignature:
+        """Row persisting a ticket's signature and identifiers"""
+        return TicketSignature(ticket_id=ticket_id, signature=self.hasher.to_bytes(signature), identifiers=" ".join(sorted(identifiers)))
+
+    def _index(self, ticket_id: int, signature: Signature, identifiers: FrozenSet[str]) -> None:
+        if self.hasher.is_empty(signature):
+            return
+        self.index.add(ticket_id, signature)
+        self._identifiers[ticket_id] = identifiers
+
+    def _forget(self, ticket_id: int) -> None:
+        self.index.remove(ticket_id)
+        self._identifiers.pop(ticket_id, None)
+
+    def track(self, ticket: Ticket, signature: Optional[Signature] = None, identifiers: Optional[FrozenSet[str]] = None) -> None:
+        """Index an active ticket, or drop it from the index once it is resolved or closed"""
+        if ticket.status not in ACTIVE_STATUSES:
+            self._forget(ticket.id)
+            return
+        if ticket.id not in self.index:
+            self._index(
+                ticket.id,
+                signature or self.signature(ticket.subject, ticket.description),
+                identifiers if identifiers is not None else self.identifiers(ticket.subject, ticket.description)
+            )
+
+    @staticmethod
+    def attach_job(ticket_id: int, report):
+        """Write job: store a duplicate report on an active ticket (None if it is no longer active)"""
+        def job(session) -> Optional[Ticket]:
+            ticket = session.get(Ticket, ticket_id, populate_existing=True, with_for_update=True)
+            if ticket is None or ticket.status not in ACTIVE_STATUSES:
+                return None
+            session.add(TicketReport(ticket_id=ticket_id, subject=report.subject, description=report.description, priority=report.priority))
+            ticket.duplicate_count = (ticket.duplicate_count or 0) + 1
+            if PRIORITY_LEVELS.get(report.priority, 1) > PRIORITY_LEVELS.get(ticket.priority, 1):
+                ticket.priority = report.priority
+            session.flush()
+            session.refresh(ticket)
+            return ticket
+        return job
+
+    async def attach(self, report, signature: Signature, identifiers: FrozenSet[str]) -> Optional[Tuple[Ticket, float]]:
+        """
+        Attach a new report to a similar active ticket, if there is one.
+
+        Args:
+            report: The new report (``subject``, ``description`` and ``priority``)
+            signature: Signature of the new report
+            identifiers: Identifiers named in the new report
+
+        Returns:
+            Optional[Tuple[Ticket, float]]: The updated ticket and the similarity, or None to create a new ticket
+        """
+        while True:
+            match = self.match(signature, identifiers)
+            if match is None:
+                return None
+            ticket_id, similarity = match
+            ticket = await self.writer.run(self.attach_job(ticket_id, report))
+            if ticket is not None:
+                self.duplicates += 1
+                logger.info(f"Attached a duplicate report to ticket #{ticket.id} (similarity {similarity:.2f})")
+                return ticket, similarity
+            # Resolved or closed elsewhere
+            self._forget(ticket_id)
+
+    def _read_active(self) -> List[Tuple[int, str, str, Optional[bytes], Optional[str]]]:
+        with self.session_factory() as db:
+            return db.execute(
+                select(Ticket.id, Ticket.subject, Ticket.description, TicketSignature.signature, TicketSignature.identifiers)
+                .outerjoin(TicketSignature, TicketSignature.ticket_id == Ticket.id)
+                .where(Ticket.status.in_(ACTIVE_STATUSES))
+            ).all()
+
+    async def load(self) -> None:
+        """Build the index from the active tickets, computing and storing missing signatures"""
+        rows = await to_thread(self._read_active)
+        missing = {}
+        for ticket_id, subject, description, data, stored_identifiers in rows:
+            # Signatures stored without identifiers still hash them, so they are recomputed
+            signature = self.hasher.from_bytes(data) if data is not None and stored_identifiers is not None else None
+            if signature is None:
+                identifiers = self.identifiers(subject, description)
+                signature = self.signature(subject, description)
+                missing[ticket_id] = (signature, identifiers)
+            else:
+                identifiers = frozenset(stored_identifiers.split())
+            self._index(ticket_id, signature, identifiers)
+
+        if missing:
+            def job(session) -> None:
+                for ticket_id, (signature, identifiers) in missing.items():
+                    session.merge(self.signature_row(ticket_id, signature, identifiers))
+            await self.writer.run(job)
+        logger.info(f"Indexed {len(rows)} active tickets for duplicate detection ({len(missing)} new signatures)")
+
+    def stats(self) -> dict:
+        return {"indexed": len(self.index), "duplicates_attached": self.duplicates, "threshold": self.threshold}
+
+
+class IncidentIndex:
+    """
+    In-memory LSH index of recent incidents, matched the same way as tickets.
+
+    For ticket stores without a database. An incident expires ``ttl``
+    seconds after its last report, so a report long after an outage opens
+    a new ticket instead of joining a stale one, and the index only holds
+    incidents that are still being reported.
+
+    Args:
+        threshold: Minimum estimated similarity for a report to join an incident
+        ttl: Seconds an incident stays open after its last report
+        clock: Time source, in seconds
+    """
+
+    def __init__(self, threshold: float, ttl: float, clock: Callable[[], float] = time.monotonic):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.clock = clock
+        self.index = LSHIndex()
+        self._identifiers: Dict[Hashable, FrozenSet[str]] = {}
+        # Keys by expiry, soonest first
+        self._expiry: "OrderedDict[Hashable, float]" = OrderedDict()
+
+    def _expire(self) -> None:
+        now = self.clock()
+        while self._expiry:
+            key, expires = next(iter(self._expiry.items()))
+            if expires > now:
+                break
+            self._expiry.popitem(last=False)
+            self.index.remove(key)
+            self._identifiers.pop(key, None)
+
+    def match(self, signature: Signature, identifiers: FrozenSet[str] = frozenset()) -> Optional[Tuple[Hashable, float]]:
+        """
+        The most similar open incident not naming other identifiers.
+
+        Returns:
+            Optional[Tuple[Hashable, float]]: (key, similarity), or None if nothing is similar enough
+        """
+        self._expire()
+        if MinHasher.is_empty(signature):
+            return None
+        for key, similarity in self.index.query(signature, self.threshold):
+            if not identifiers_conflict(identifiers, self._identifiers.get(key, frozenset())):
+                return key, similarity
+        return None
+
+    def add(self, key: Hashable, signature: Signature, identifiers: FrozenSet[str]) -> None:
+        """Open an incident"""
+        if MinHasher.is_empty(signature):
+            return
+        self.index.add(key, signature)
+        self._identifiers[key] = identifiers
+        self.touch(key)
+
+    def touch(self, key: Hashable) -> None:
+        """Keep an incident open for another ``ttl`` seconds after a report"""
+        if key in self.index:
+            self._expiry[key] = self.clock() + self.ttl
+            self._expiry.move_to_end(key)
+
+    def __len__(self) -> int:
+        return len(self.index)
@@ -0,0 +1,271 @@
+"""
+Priority queue and scheduler for support tickets.
+
+Unassigned open tickets are mirrored in an in-memory heap ordered by
+priority with aging: each priority level is worth a fixed amount of
+waiting time, so an old low-priority ticket eventually outranks a new
+high-priority one. Because every ticket ages at the same rate the order
+never changes over time, and the heap key can be computed once.
+
+Workers claim tickets with a conditional UPDATE (``status = 'open' AND
+assigned_to IS NULL``), so two workers - or two processes with their own
+heaps - can never get the same ticket. SLA breaches are detected by a
+background timer using the ``(status, priority, created_at)`` index.
+"""
+
+import asyncio
+import heapq
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import select, update
+
+from models.ticket import Ticket
+from utils.compat import to_thread
+from utils.llm_gateway import parse_limits
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_LEVELS = {"low": 0, "medium": 1, "high": 2, "urgent": 3}
+
+# Hours until a ticket that is still open or in progress breaches its SLA
+DEFAULT_SLA_HOURS = {"urgent": 1, "high": 4, "medium": 24, "low": 72}
+
+# Statuses that count against the SLA
+ACTIVE_STATUSES = ("open", "in_progress")
+
+
+def _utcnow() -> datetime:
+    # SQLite's CURRENT_TIMESTAMP is naive UTC
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _epoch(value: Optional[datetime]) -> float:
+    if value is None:
+        return _utcnow().replace(tzinfo=timezone.utc).timestamp()
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+class TicketQueue:
+    """
+    Heap mirror of the unassigned open tickets plus the SLA timer.
+
+    Args:
+        writer: The ``DatabaseWriter`` used for claims and SLA updates
+        session_factory: Session factory for reads
+        aging_hours: Waiting time worth one priority level
+        sla_hours: SLA per priority, in hours
+        check_interval: Seconds between SLA checks and heap resyncs
+        on_breach: Coroutine function called with each breached ticket
+    """
+
+    def __init__(
+        self,
+        writer,
+        session_factory,
+        aging_hours: Optional[float] = None,
+        sla_hours: Optional[Dict[str, float]] = None,
+        check_interval: Optional[float] = None,
+        on_breach: Optional[Callable[[Ticket], Awaitable[None]]] = None,
+    ):
+        self.writer = writer
+        self.session_factory = session_factory
+        self.aging_seconds = 3600 * (aging_hours or float(os.getenv("TICKET_AGING_HOURS", "4")))
+        self.sla_hours = dict(DEFAULT_SLA_HOURS)
+        self.sla_hours.update(sla_hours or parse_limits(os.getenv("TICKET_SLA_HOURS", "")))
+        self.check_interval = check_interval or float(os.getenv("TICKET_SLA_CHECK_INTERVAL", "60"))
+        self.on_breach = on_breach
+        # (key, ticket id) with lazy deletion: ids no longer in _queued are skipped
+        self._heap: List[Tuple[float, int]] = []
+        self._queued: Set[int] = set()
+        # Tickets queued while a reload is reading the database
+        self._added_during_load: Dict[int, Tuple[float, int]] = {}
+        self._timer = None
+        self.claims = 0
+        self.claim_conflicts = 0
+        self.breaches = 0
+
+    def _key(self, priority: str, created_at: Optional[datetime]) -> float:
+        """Effective enqueue time: older and higher-priority tickets come first"""
+        return _epoch(created_at) - PRIORITY_LEVELS.get(priority, 1) * self.aging_seconds
+
+    def add(self, ticket: Ticket) -> None:
+        """Queue a ticket if it is open and unassigned (otherwise drop it from the queue)"""
+        if ticket.status != "open" or ticket.assigned_to:
+            self.discard(ticket.id)
+            return
+        if ticket.id not in self._queued:
+            entry = (self._key(ticket.priority, ticket.created_at), ticket.id)
+            self._queued.add(ticket.id)
+            heapq.heappush(self._heap, entry)
+            self._added_during_load[ticket.id] = entry
+
+    def discard(self, ticket_id: int) -> None:
+        """Remove a ticket from the queue"""
+        self._queued.discard(ticket_id)
+
+    def __len__(self) -> int:
+        return len(self._queued)
+
+    def peek(self, limit: int = 20) -> List[int]:
+        """Ids of the next tickets to be claimed, in order"""
+        keys = {ticket_id: key for key, ticket_id in self._heap if ticket_id in self._queued}
+        return heapq.nsmallest(limit, keys, key=keys.get)
+
+    def _read_open(self) -> List[Tuple[float, int]]:
+        with self.session_factory() as db:
+            rows = db.execute(
+                select(Ticket.id, Ticket.priority, Ticket.created_at)
+                .where(Ticket.status == "open", Ticket.assigned_to.is_(None))
+            ).all()
+        return [(self._key(priority, created_at), ticket_id) for ticket_id, priority, created_at in rows]
+
+    async def load(self) -> None:
+        """Rebuild the heap from the database (other processes may have added or claimed tickets)"""
+        self._added_during_load = {}
+        entries = await to_thread(self._read_open)
+        entries.extend(entry for ticket_id, entry in self._added_during_load.items() if ticket_id in self._queued)
+        heapq.heapify(entries)
+        self._heap = entries
+        self._queued = {ticket_id for _, ticket_id in entries}
+
+    def _pop(self) -> Optional[int]:
+        while self._heap:
+            _, ticket_id = heapq.heappop(self._heap)
+            if ticket_id in self._queued:
+                self._queued.discard(ticket_id)
+                return ticket_id
+        return None
+
+    @staticmethod
+    def _claim_job(ticket_id: int, worker: str):
+        """Write job: assign a ticket if nobody else has"""
+        def job(session) -> Optional[Ticket]:
+            result = session.execute(
+                update(Ticket)
+                .where(Ticket.id == ticket_id, Ticket.status == "open", Ticket.assigned_to.is_(None))
+                .values(status="in_progress", assigned_to=worker, claimed_at=_utcnow())
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount != 1:
+                return None
+            return session.get(Ticket, ticket_id, populate_existing=True)
+        return job
+
+    async def claim_next(self, worker: str) -> Optional[Ticket]:
+        """
+        Assign the highest-ranked open ticket to a worker.
+
+        Args:
+            worker: Name of the support agent claiming work
+
+        Returns:
+            Optional[Ticket]: The claimed ticket, or None if the queue is empty
+        """
+        resynced = False
+        while True:
+            ticket_id = self._pop()
+            if ticket_id is None:
+                if resynced:
+                    return None
+                # Tickets may have been created by another process
+                await self.load()
+                resynced = True
+                continue
+
+            ticket = await self.writer.run(self._claim_job(ticket_id, worker))
+            if ticket is not None:
+                self.claims += 1
+                logger.info(f"Ticket #{ticket.id} claimed by {worker}")
+                return ticket
+            # Claimed elsewhere or no longer open
+            self.claim_conflicts += 1
+
+    def _breach_job(self, now: datetime):
+        """Write job: mark active tickets past their SLA"""
+        def job(session) -> List[Ticket]:
+            breached = []
+            for priority, hours in self.sla_hours.items():
+                for status in ACTIVE_STATUSES:
+                    # Equality on status and priority plus a range on created_at uses the composite index
+                    breached.extend(session.execute(
+                        select(Ticket).where(
+                            Ticket.status == status,
+                            Ticket.priority == priority,
+                            Ticket.created_at < now - timedelta(hours=hours),
+                            Ticket.sla_breached_at.is_(None),
+                        )
+                    ).scalars())
+            for ticket in breached:
+                ticket.sla_breached_at = now
+            session.flush()
+            for ticket in breached:
+                session.refresh(ticket)
+            return breached
+        return job
+
+    async def check_sla(self, notify: bool = True) -> List[Ticket]:
+        """
+        Mark tickets that have breached their SLA and report them.
+
+        Args:
+            notify: Whether to log and call ``on_breach`` for each ticket
+
+        Returns:
+            List[Ticket]: Tickets newly found in breach
+        """
+        breached = await self.writer.run(self._breach_job(_utcnow()))
+        if not notify:
+            return breached
+        for ticket in breached:
+            self.breaches += 1
+            logger.warning(f"Ticket #{ticket.id} ({ticket.priority}) breached its {self.sla_hours[ticket.priority]}h SLA")
+            if self.on_breach:
+                try:
+                    await self.on_breach(ticket)
+                except Exception as e:
+                    logger.error(f"SLA breach handler failed: {str(e)}")
+        return breached
+
+    async def _run_timer(self) -> None:
+        while True:
+            await asyncio.sleep(self.check_interval)
+            try:
+                await self.check_sla()
+                await self.load()
+            except Exception as e:
+                logger.error(f"Ticket scheduler error: {str(e)}")
+
+    async def start(self) -> None:
+        """Load the queue and start the SLA timer"""
+        # Tickets already past their SLA (e.g. on the first start after an
+        # upgrade) are marked without an alert each, which would be a storm
+        breached = await self.check_sla(notify=False)
+        if breached:
+            logger.warning(f"{len(breached)} active tickets were already past their SLA at startup; marked without alerts")
+        await self.load()
+        if self._timer is None:
+            self._timer = asyncio.create_task(self._run_timer())
+
+    async def stop(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            try:
+                await self._timer
+            except asyncio.CancelledError:
+                pass
+            self._timer = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth and scheduler counters"""
+        return {
+            "queued": len(self._queued),
+            "claims": self.claims,
+            "claim_conflicts": self.claim_conflicts,
+            "sla_breaches": self.breaches,
+            "sla_hours": self.sla_hours,
+        }
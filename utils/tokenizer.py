@@ -0,0 +1,83 @@
+"""
+Local token counting for prompts.
+
+Uses tiktoken when it is installed (exact counts for OpenAI models) and
+falls back to a regex approximation (roughly one token per short word
+or punctuation mark), which is enough for logging and budget checks.
+"""
+
+import logging
+import math
+import re
+from functools import lru_cache
+from typing import Dict, List
+
+# tiktoken is optional
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Per-message framing overhead of the chat format
+MESSAGE_OVERHEAD_TOKENS = 4
+REPLY_PRIMING_TOKENS = 3
+
+_APPROX_TOKEN_RE = re.compile(r"[A-Za-z]+|\d+|[^\sA-Za-z\d]")
+
+
+def _load_encoding(model: str):
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        # Unknown model names use the current chat encoding
+        return tiktoken.get_encoding("cl100k_base")
+
+
+@lru_cache(maxsize=16)
+def _encoding(model: str):
+    if not TIKTOKEN_AVAILABLE:
+        return None
+    try:
+        return _load_encoding(model)
+    except Exception as e:
+        # e.g. the encoding files cannot be downloaded
+        logger.warning(f"tiktoken unavailable, approximating token counts: {str(e)}")
+        return None
+
+
+def count_tokens(text: str, model: str = "gpt-3.5-turbo") -> int:
+    """
+    Count the tokens in a piece of text.
+
+    Args:
+        text: The text to measure
+        model: The model whose tokenizer should be used
+
+    Returns:
+        int: The token count (approximate without tiktoken)
+    """
+    encoding = _encoding(model)
+    if encoding is not None:
+        return len(encoding.encode(text))
+    # Common words are one token; long or rare ones split into several
+    return sum(math.ceil(len(piece) / 6) if piece.isalpha() else 1 for piece in _APPROX_TOKEN_RE.findall(text))
+
+
+def count_message_tokens(messages: List[Dict[str, str]], model: str = "gpt-3.5-turbo") -> int:
+    """
+    Count the input tokens of a chat request.
+
+    Args:
+        messages: The chat messages
+        model: The model whose tokenizer should be used
+
+    Returns:
+        int: The token count including chat framing
+    """
+    total = REPLY_PRIMING_TOKENS
+    for message in messages:
+        total += MESSAGE_OVERHEAD_TOKENS + count_tokens(message.get("content") or "", model)
+    return total